@@ -0,0 +1,41 @@
+""" Time `import genson` in fresh interpreters.
+
+    usage: python benchmarks/import_time.py [repeats] [max_seconds]
+
+    Exits with an error if the median import time exceeds max_seconds, or if
+    importing genson loads numpy or pyparsing.
+"""
+import os
+import sys
+import subprocess
+
+SCRIPT = """
+import sys, time
+start = time.time()
+import genson
+elapsed = time.time() - start
+print elapsed, ' '.join(m for m in ('numpy', 'pyparsing') if m in sys.modules)
+"""
+
+
+def time_import(repeats):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+
+    times = []
+    for _ in xrange(repeats):
+        out = subprocess.check_output([sys.executable, '-c', SCRIPT], env=env)
+        fields = out.split()
+        times.append(float(fields[0]))
+        if len(fields) > 1:
+            raise SystemExit("import genson loaded %s" % ', '.join(fields[1:]))
+    return sorted(times)[len(times) // 2]
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    median = time_import(repeats)
+    print "import genson: %.1f ms (median of %d)" % (median * 1000, repeats)
+
+    if len(sys.argv) > 2 and median > float(sys.argv[2]):
+        raise SystemExit("import took longer than %s s" % sys.argv[2])
@@ -0,0 +1,43 @@
+""" Memory and evaluation throughput of documents with many expressions.
+
+    usage: python benchmarks/nodes.py [members]
+"""
+import sys
+import time
+import genson
+from genson.util import walk
+
+
+def make_document(members):
+    return '{"x": uniform(0, 1), "y": <1, 2, 3>, %s}' % ', '.join(
+        '"m%d": {"a": root.x * %d + root.y ^ 2, "b": -this.a / 3 + sin(this.a)}'
+        % (i, i) for i in xrange(members))
+
+
+def node_bytes(tree):
+    count = 0
+    size = 0
+    for node in walk(tree):
+        if hasattr(node, '__genson_eval__'):
+            count += 1
+            size += sys.getsizeof(node)
+            if hasattr(node, '__dict__'):
+                size += sys.getsizeof(node.__dict__)
+    return count, size
+
+
+if __name__ == '__main__':
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    doc = make_document(members)
+
+    start = time.time()
+    gen = genson.loads(doc, backend='recursive')
+    print "parse: %.2f s" % (time.time() - start)
+
+    count, size = node_bytes(gen.genson_dict)
+    print "nodes: %d, %.1f bytes each" % (count, float(size) / count)
+
+    start = time.time()
+    samples = len(list(gen))
+    elapsed = time.time() - start
+    print "evaluate: %.0f expressions/s" % (samples * count / elapsed)
@@ -0,0 +1,274 @@
+""" Throughput and peak memory of the parse, compile, resolve, enumerate and
+    dump stages, on synthetic documents.
+
+    usage: python benchmarks/suite.py [--scale S] [--backend B]
+                                      [--repeats N] [--save FILE]
+                                      [--compare FILE] [--tolerance T]
+                                      [--only NAME,...]
+
+    Each stage runs in a forked process, so that its peak memory (the growth
+    of the maximum resident set size) is measured on its own, and the best
+    of N (default 3) runs is kept.  --save writes
+    the results to a JSON file; --compare reports the change against such a
+    baseline and exits with an error if the throughput of a stage dropped,
+    or its peak memory grew, by more than the tolerance (default 0.25).
+"""
+import os
+import sys
+import json
+import time
+import resource
+import cPickle as pickle
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import genson
+from genson.util import resolve, genson_dumps
+
+
+def deep_document(scale):
+    # dicts nested 50 levels deep, with a grid and a reference at each level
+    depth = 50
+    doc = '"leaf": <1, 2>'
+    for i in xrange(depth):
+        doc = '"v": <%d, %d>, "r": root.v, "d": {%s}' % (i, i + 1, doc)
+    return '{%s}' % doc, 400 * scale
+
+
+def wide_grid_document(scale):
+    # three grid axes with many values each
+    values = ', '.join(str(i) for i in xrange(200))
+    return ('{"a": <%s>, "b": <%s>, "c": <1, 2, 3>, "d": this.a + this.b}'
+            % (values, values)), 20000 * scale
+
+
+def reference_document(scale):
+    # a chain of references across nested dicts
+    members = ['"x": <1, 2, 3>']
+    for i in xrange(500):
+        members.append('"m%d": {"a": root.x, "b": this.a, "c": parent.x}' % i)
+    return '{%s}' % ', '.join(members), 100 * scale
+
+
+def expression_document(scale):
+    members = ['"x": uniform(0, 1)', '"y": <1, 2, 3>']
+    for i in xrange(500):
+        members.append('"e%d": this.x * %d + this.y ^ 2 - sin(this.x) / 3'
+                       % (i, i + 1))
+    return '{%s}' % ', '.join(members), 30 * scale
+
+
+def splat_document(scale):
+    # tuple keys splatting tuples and grids of tuples
+    keys = ', '.join('"k%d"' % i for i in xrange(50))
+    values = ', '.join(str(i) for i in xrange(50))
+    members = ['(%s): (%s)' % (keys.replace('"k', '"s%d_' % j), values)
+               for j in xrange(20)]
+    members.append('(%s): <(%s), (%s)>' % (keys, values, values))
+    return '{%s}' % ', '.join(members), 150 * scale
+
+
+def constant_document(scale):
+    # large constant blocks next to one swept grid, for incremental mode
+    blocks = ['"c%d": {"v": [1, 2, %d], "s": "x", "o": {"p": [%d]}}'
+              % (i, i, i) for i in xrange(300)]
+    values = ', '.join(str(i) for i in xrange(200))
+    return ('{"a": <%s>, "b": this.a * 2, %s}' % (values, ', '.join(blocks)),
+            1000 * scale)
+
+
+documents = [('deep', deep_document),
+             ('wide_grid', wide_grid_document),
+             ('references', reference_document),
+             ('expressions', expression_document),
+             ('splats', splat_document),
+             ('constant_blocks', constant_document)]
+
+
+def parse(doc, samples, backend):
+    genson.GENSONParser(backend).parse_string(doc)
+    return len(doc), 'bytes'
+
+
+def compile_plan(tree, samples):
+    for _ in xrange(10):
+        genson.JSONGenerator(tree)
+    return 10, 'documents'
+
+
+def resolve_samples(tree, samples):
+    # the reference implementation, which the plan must match
+    for _ in xrange(samples):
+        resolve(tree, [])
+    return samples, 'samples'
+
+
+def enumerate_samples(tree, samples):
+    gen = genson.JSONGenerator(tree)
+    count = 0
+    for _ in xrange(samples):
+        try:
+            gen.next()
+        except StopIteration:
+            gen.reset()
+        count += 1
+    return count, 'samples'
+
+
+def enumerate_incremental(tree, samples):
+    gen = genson.JSONGenerator(tree, incremental=True)
+    count = 0
+    for _ in xrange(samples):
+        try:
+            gen.next()
+        except StopIteration:
+            gen.reset()
+        count += 1
+    return count, 'samples'
+
+
+def dump(tree, samples):
+    size = 0
+    for _ in xrange(10):
+        size += len(genson_dumps(tree))
+    return size, 'bytes'
+
+
+stages = [('compile', compile_plan),
+          ('resolve', resolve_samples),
+          ('enumerate', enumerate_samples),
+          ('incremental', enumerate_incremental),
+          ('dump', dump)]
+
+
+# the shortest time each stage is measured for
+MIN_SECONDS = 0.1
+
+# growth of the peak resident set size below which memory is not compared
+MEMORY_NOISE_KB = 4096
+
+
+def max_rss():
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def in_child(f):
+    """ Run f in a forked process, returning its result along with the
+        growth of the peak resident set size while it ran
+    """
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        start = max_rss()
+        try:
+            result = f()
+            message = (result, max_rss() - start)
+        except Exception, e:
+            message = e
+        with os.fdopen(write_end, 'wb') as out:
+            pickle.dump(message, out, pickle.HIGHEST_PROTOCOL)
+        os._exit(0)
+
+    os.close(write_end)
+    with os.fdopen(read_end, 'rb') as source:
+        message = pickle.load(source)
+    os.waitpid(pid, 0)
+    if isinstance(message, Exception):
+        raise message
+    return message
+
+
+def timed(f, *args):
+    """ Call f until at least MIN_SECONDS have passed; f returns the amount
+        of work it did, and its unit
+    """
+    amount = 0
+    start = time.time()
+    while True:
+        result = f(*args)
+        amount += result[0]
+        elapsed = time.time() - start
+        if elapsed >= MIN_SECONDS:
+            return elapsed, (amount, result[1])
+
+
+def run(scale, backend, repeats, only=None):
+    results = {}
+    for name, make in documents:
+        if only and name not in only:
+            continue
+        doc, samples = make(scale)
+
+        tree = genson.GENSONParser(backend).parse_string(doc)
+        results['%s/parse' % name] = best_of(
+            repeats, lambda: timed(parse, doc, samples, backend))
+        for stage, f in stages:
+            results['%s/%s' % (name, stage)] = best_of(
+                repeats, lambda: timed(f, tree, samples))
+    return results
+
+
+def best_of(repeats, f):
+    """ The highest throughput and lowest peak memory of several runs """
+    runs = []
+    for _ in xrange(repeats):
+        (elapsed, (amount, unit)), memory = in_child(f)
+        runs.append({'throughput': amount / max(elapsed, 1e-9),
+                     'unit': unit + '/s', 'seconds': elapsed,
+                     'peak_kb': memory})
+    best = max(runs, key=lambda r: r['throughput'])
+    best['peak_kb'] = min(r['peak_kb'] for r in runs)
+    return best
+
+
+def report(results, baseline=None, tolerance=0.25):
+    regressions = []
+    for key in sorted(results):
+        r = results[key]
+        line = '%-24s %14.1f %-11s %9.3f s %9d kB' % (
+            key, r['throughput'], r['unit'], r['seconds'], r['peak_kb'])
+        if baseline is not None and key in baseline:
+            b = baseline[key]
+            speed = r['throughput'] / b['throughput']
+            memory = float(r['peak_kb'] + MEMORY_NOISE_KB) / \
+                (b['peak_kb'] + MEMORY_NOISE_KB)
+            line += '   x%.2f speed, x%.2f memory' % (speed, memory)
+            if speed < 1 - tolerance or memory > 1 + tolerance:
+                line += '  REGRESSION'
+                regressions.append(key)
+        print line
+    return regressions
+
+
+def main():
+    parser = OptionParser(usage=__doc__.strip().split('\n\n')[1].strip())
+    parser.add_option('--scale', type='int', default=1)
+    parser.add_option('--backend', default='recursive')
+    parser.add_option('--repeats', type='int', default=3)
+    parser.add_option('--save')
+    parser.add_option('--compare')
+    parser.add_option('--tolerance', type='float', default=0.25)
+    parser.add_option('--only')
+    options, args = parser.parse_args()
+
+    only = options.only.split(',') if options.only else None
+    results = run(options.scale, options.backend, options.repeats, only)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+    regressions = report(results, baseline, options.tolerance)
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if regressions:
+        sys.exit("Regressions: %s" % ", ".join(regressions))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,55 @@
 from parser import *
 from functions import *
 from util import *
+from plan import Plan
+from references import GenSONReferenceError
+from batch import BatchState, resolve_batch, flatten_columns, materialize_rows
+from cache import ParseCache, get_parse_cache, set_parse_cache
+from streaming import split_documents
+from output import dump_samples
+from store import write_store, open_store, SampleStore
+from search import Search, SuccessiveHalving
+from philox import set_current_sample
+from profiling import Profile
+import binary
+from version import __version__
+import parallel
 import copy
+import time
+
+multiprocessing = lazy_import('multiprocessing')
 
 
 class JSONGenerator:
-    def __init__(self, genson_dict):
+    def __init__(self, genson_dict, incremental=False):
         self.genson_dict = genson_dict
+        self.incremental = incremental
 
         self.generators = []
         self.find_generators(genson_dict)
+        self.generators = link_designs(self.generators, genson_dict)
+        label_generators(genson_dict)
+        # the number of values each generator takes in the cross product
+        self.radices = [g.draws for g in self.generators]
+
+        self.plan = Plan(genson_dict)
+        self.parse_seconds = None
+        self.profile = None
 
         self.first_run = True
+        self.current = 0
+
+    def __getstate__(self):
+        # the compiled plan holds bound methods; rebuild it after unpickling
+        state = self.__dict__.copy()
+        del state['plan']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.plan = Plan(self.genson_dict)
+        if self.profile is not None:
+            self.profile.instrument(self.plan, self.genson_dict)
 
     def find_generators(self, d):
         if isdict(d):
@@ -28,43 +66,228 @@ class JSONGenerator:
     def __iter__(self):
         return self
 
-    def advance_generator_stack(self, cursor=0):
-
-        if cursor >= len(self.generators):
-            return False
-
-        if self.generators[cursor].advance():
-            return True
-        else:
-            self.generators[cursor].reset()
-            return self.advance_generator_stack(cursor + 1)
+    def advance_generator_stack(self):
+        """ Step the generators like an odometer, the first one turning
+            fastest; False once every combination has been produced
+        """
+        for g, radix in zip(self.generators, self.radices):
+            g.counter += 1
+            if g.counter < radix:
+                return True
+            g.reset()
+        return False
 
     def next(self):
 
         if self.first_run:
             self.first_run = False
-            return resolve(self.genson_dict)
+            return self.evaluate()
 
         if self.advance_generator_stack():
-            return resolve(self.genson_dict)
+            self.current += 1
+            return self.evaluate()
         else:
             self.first_run = True
+            self.current = 0
             raise StopIteration()
 
+    def evaluate(self):
+        """ Resolve the sample for the current state of the generators;
+            incrementally, sharing everything unchanged with the previous
+            sample, if this generator was created with incremental=True
+        """
+        set_current_sample(self.current)
+        if self.profile is not None:
+            return self.profile.sample(self.run_plan)
+        return self.run_plan()
+
+    def run_plan(self):
+        if self.incremental:
+            return self.plan.execute_incremental()
+        return self.plan.execute()
+
+    def enable_profiling(self):
+        """ Start recording evaluation statistics, and return the Profile
+            holding them (see Profile.report); without it, sampling is not
+            instrumented at all
+        """
+        if self.profile is None:
+            self.profile = Profile(self.parse_seconds)
+            self.profile.instrument(self.plan, self.genson_dict)
+        return self.profile
+
     def reset(self):
         for g in self.generators:
             g.reset()
+        self.first_run = True
+        self.current = 0
+
+    def total_count(self):
+        """ The number of samples in the cross product """
+        count = 1
+        for radix in self.radices:
+            count *= radix
+        return count
 
+    def __len__(self):
+        return self.total_count()
+
+    def seek(self, index):
+        """ Position the generator stack so that the next call to next()
+            returns sample number `index` of the cross product.
+
+            The index is decoded as a mixed-radix number over the draws of
+            each generator.  Random generators are moved to the point in
+            their stream they would have reached by serial iteration (cheaply
+            when moving forward within their current cycle), so the result is
+            identical to stepping through the preceding samples.  Generators
+            nested inside other generators or expressions are not part of the
+            stack and keep drawing from their streams in call order.
+        """
+        count = self.total_count()
+        if index < 0:
+            index += count
+        if index < 0 or index >= count:
+            raise IndexError("Sample index out of range: %s" % index)
+
+        counter_mode = get_rng_mode() == 'counter'
+        stride = 1
+        for g, radix in zip(self.generators, self.radices):
+            period = stride * radix
+            counter = (index // stride) % radix
+            if counter_mode:
+                # no stream to move: values only depend on the sample index
+                g.counter = counter
+                stride = period
+                continue
+            evaluations = index % period
+
+            drawn = self.current % period
+            if not self.first_run:
+                drawn += 1
+
+            if index // period == self.current // period and \
+               evaluations >= drawn:
+                g.counter = counter
+                g.skip(evaluations - drawn)
+            else:
+                g.seek(counter, evaluations)
+            stride = period
+
+        self.current = index
+        self.first_run = True
+
+    def sample_at(self, index):
+        self.seek(index)
+        return self.next()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.sample_at(i) for i in xrange(*index.indices(self.total_count()))]
+        return self.sample_at(index)
+
+    def shard(self, k, n, strategy='strided'):
+        """ Iterate over shard k of n of the cross product.
+
+            The 'strided' strategy yields samples k, k + n, k + 2n, ... and
+            the 'contiguous' strategy yields one block of consecutive
+            samples.  Concatenating all n shards (interleaving them, for the
+            strided strategy) reproduces serial iteration.
+        """
+        if not 0 <= k < n:
+            raise ValueError("Invalid shard %s of %s" % (k, n))
+
+        count = self.total_count()
+        if strategy == 'strided':
+            indices = xrange(k, count, n)
+        elif strategy == 'contiguous':
+            indices = xrange(k * count // n, (k + 1) * count // n)
+        else:
+            raise ValueError("Unknown shard strategy: %s" % strategy)
 
-def load(io):
-    s = "\n".join(io.readlines())
-    return loads(s)
+        for i in indices:
+            yield self.sample_at(i)
 
+    def batch(self, n, start=0, as_dicts=False):
+        """ Generate samples start .. start + n - 1 in one vectorized pass.
 
-def loads(genson_string):
-    parser = GENSONParser()
-    genson_dict = parser.parse_string(genson_string)
-    return JSONGenerator(genson_dict)
+            Each generator draws all of its values with a single call, and
+            expressions and functions are applied to whole columns.  The
+            result is an OrderedDict mapping each leaf key path (a tuple of
+            keys and sequence indices) to a NumPy array with one entry per
+            sample, or, with as_dicts=True, the list of resolved objects.
+            The iteration state of the generator is not affected.
+        """
+        stop = min(start + n, self.total_count())
+        state = BatchState(self.generators, start, max(start, stop))
+        result = self.plan.execute_batch(state)
+
+        if as_dicts:
+            return materialize_rows(result, state.size)
+        return flatten_columns(result, state.size)
+
+
+def load(io, backend='pyparsing'):
+    return loads(io.read(), backend)
+
+
+def iter_load(io, backend='pyparsing', chunk_size=65536):
+    """ Yield a JSONGenerator for each top-level document in a file of
+        concatenated or newline-delimited GenSON documents, reading it
+        incrementally
+    """
+    for genson_string in split_documents(io, chunk_size):
+        yield loads(genson_string, backend)
+
+
+def loads(genson_string, backend='pyparsing', incremental=False,
+          profile=False):
+    parser = GENSONParser(backend)
+    cache = get_parse_cache()
+    start = time.time()
+    if cache is None:
+        genson_dict = parser.parse_string(genson_string)
+    else:
+        genson_dict = cache.parse(genson_string, parser)
+
+    generator = JSONGenerator(genson_dict, incremental)
+    generator.parse_seconds = time.time() - start
+    if profile:
+        generator.enable_profiling()
+    return generator
+
+
+def parallel_iter(doc, workers=None, chunk_size=None):
+    """ Resolve every sample of a GenSON document with a pool of worker
+        processes, yielding them in the same order and with the same values
+        as serial iteration.
+
+        `doc` is a GenSON string or a JSONGenerator.  The parsed document is
+        shipped to each worker once, and the workers resolve contiguous
+        chunks of sample indices.
+    """
+    if not isinstance(doc, JSONGenerator):
+        doc = loads(doc)
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    count = len(doc)
+    if chunk_size is None:
+        chunk_size = max(1, min(1000, count // (4 * workers)))
+
+    pool = multiprocessing.Pool(workers, parallel.init_worker,
+                                (parallel.make_payload(doc), get_global_seed(),
+                                 get_rng_mode()))
+    try:
+        for chunk in pool.imap(parallel.resolve_chunk,
+                               parallel.make_chunks(count, chunk_size)):
+            for sample in chunk:
+                yield sample
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
 
 
 def dumps(generator, pretty_print=False):
@@ -72,5 +295,30 @@ def dumps(generator, pretty_print=False):
         return genson_dumps(generator, pretty_print)
     else:
         return genson_dumps(generator.genson_dict, pretty_print)
+
+
+def dump(generator, fp, pretty_print=False):
+    """ Write the document of a generator (or a document) as GenSON text
+        to the file-like object fp, piece by piece
+    """
+    if isdict(generator):
+        genson_dump(generator, fp, pretty_print)
+    else:
+        genson_dump(generator.genson_dict, fp, pretty_print)
+
+
+def to_bytes(generator):
+    """ The document of a generator (or a document) in a compact binary
+        encoding, which from_bytes decodes without parsing
+    """
+    if isdict(generator):
+        return binary.encode(generator)
+    else:
+        return binary.encode(generator.genson_dict)
+
+
+def from_bytes(data, incremental=False):
+    """ A JSONGenerator for a document encoded by to_bytes """
+    return JSONGenerator(binary.decode(data), incremental)
         
         
\ No newline at end of file
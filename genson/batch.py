@@ -0,0 +1,193 @@
+from util import resolve, isdict, istuple, isiterable, isgensonevaluable, \
+    is_constant, lazy_import, get_rng_mode
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+np = lazy_import('numpy')
+
+
+def make_column(values):
+    """ Build a column from a list of per-sample values, using a numeric
+        dtype when every value has the same kind of number, and an object
+        array otherwise
+    """
+    for kind in [(bool, np.bool_), (int, long, np.integer),
+                 (float, np.floating)]:
+        if all(isinstance(v, kind) and
+               (kind[0] is bool or not isinstance(v, (bool, np.bool_)))
+               for v in values):
+            return np.array(values)
+
+    column = np.empty(len(values), dtype=object)
+    for i, v in enumerate(values):
+        column[i] = v
+    return column
+
+
+def full_column(value, size):
+    return make_column([value] * size)
+
+
+def take(values, index):
+    """ Select among constant generator values with a counter (a scalar for
+        generators that are not part of the generator stack, or a column)
+    """
+    if not is_constant(values):
+        raise ValueError("Generator values containing other generators or "
+                         "expressions cannot be evaluated in batch mode")
+
+    # resolved, so that parsed lists (pyparsing results) become lists
+    if np.isscalar(index):
+        return resolve(values[index], [])
+    return make_column([resolve(v, []) for v in values])[index]
+
+
+class BatchState:
+    """ Per-sample generator state for a contiguous range of sample indices,
+        computed by mixed-radix decoding over the generator stack
+    """
+    def __init__(self, generators, start, stop):
+        indices = np.arange(start, stop, dtype=np.int64)
+        self.indices = indices
+        self.size = len(indices)
+        self.counters = {}
+        self.positions = {}
+
+        stride = 1
+        for g in generators:
+            period = stride * g.draws
+            self.counters[id(g)] = (indices // stride) % g.draws
+            self.positions[id(g)] = indices % period
+            stride = period
+
+    def counter(self, g):
+        return self.counters.get(id(g), g.counter)
+
+    def stream(self, g, draw):
+        """ Draw one raw value per sample from a generator's random stream.
+
+            draw(random_state, size) must consume the stream exactly as `size`
+            scalar evaluations would.  Generators in the stack draw from a
+            fresh copy of their stream at the positions serial iteration would
+            reach, other generators keep drawing from their own stream.
+            In 'counter' RNG mode, each value is computed from the sample
+            index instead.
+        """
+        if get_rng_mode() == 'counter':
+            return draw(g.random.at(self.indices), self.size)
+
+        positions = self.positions.get(id(g))
+        if positions is None:
+            return draw(g.random, self.size)
+        if self.size == 0:
+            return draw(g.fresh_stream(), 0)
+
+        lo = positions.min()
+        hi = positions.max()
+        random = g.fresh_stream()
+        for skipped in xrange(0, lo, 65536):
+            draw(random, min(65536, lo - skipped))
+        return draw(random, hi - lo + 1)[positions - lo]
+
+
+def resolve_batch(x, context, batch):
+    """ The batch counterpart of resolve(): leaves are columns holding one
+        value per sample (or plain constants), and containers keep the shape
+        of the document
+    """
+    if isinstance(x, np.ndarray):
+        return x
+    elif isgensonevaluable(x):
+        batch_eval = getattr(x, '__genson_batch__', None)
+        if not batch_eval:
+            raise ValueError("%s cannot be evaluated in batch mode" %
+                             x.__class__.__name__)
+        return batch_eval(context, batch)
+    elif isdict(x):
+        return_dict = OrderedDict()
+        context.append(return_dict)
+
+        for k, v in x.items():
+            val = resolve_batch(v, context, batch)
+            if istuple(k):
+                splat_batch(return_dict, k, val, batch)
+            else:
+                return_dict[k] = val
+
+        context.pop()
+        return return_dict
+    elif istuple(x):
+        return tuple([resolve_batch(v, context, batch) for v in x])
+    elif isiterable(x):
+        return [resolve_batch(v, context, batch) for v in x]
+    else:
+        return x
+
+
+def splat_batch(return_dict, keys, val, batch):
+    if isinstance(val, np.ndarray):
+        rows = [v if istuple(v) else (v,) * len(keys) for v in val]
+        for row in rows:
+            if len(row) != len(keys):
+                raise Exception("Invalid splat")
+        for i, splat_key in enumerate(keys):
+            return_dict[splat_key] = make_column([row[i] for row in rows])
+    elif istuple(val):
+        if len(keys) != len(val):
+            raise Exception("Invalid splat")
+        for (splat_key, splat_val) in zip(keys, val):
+            return_dict[splat_key] = splat_val
+    else:
+        for splat_key in keys:
+            return_dict[splat_key] = val
+
+
+def flatten_columns(x, size, path=(), columns=None):
+    """ Flatten a batch result into an OrderedDict mapping each leaf key path
+        (a tuple of dict keys and sequence indices) to a column, in the
+        order output.flatten_sample flattens samples (dict keys sorted)
+    """
+    if columns is None:
+        columns = OrderedDict()
+
+    if isinstance(x, np.ndarray):
+        columns[path] = x
+    elif isdict(x):
+        for k in sorted(x.keys()):
+            v = x[k]
+            flatten_columns(v, size, path + (k,), columns)
+    elif istuple(x) or isinstance(x, list):
+        for i, v in enumerate(x):
+            flatten_columns(v, size, path + (i,), columns)
+    else:
+        columns[path] = full_column(x, size)
+
+    return columns
+
+
+def row_builder(x):
+    if isinstance(x, np.ndarray):
+        values = x.tolist()
+        if x.dtype == object:
+            return lambda i: resolve(values[i], [])
+        return values.__getitem__
+    elif isdict(x):
+        items = [(k, row_builder(v)) for k, v in x.items()]
+        return lambda i: dict([(k, f(i)) for k, f in items])
+    elif istuple(x):
+        builders = [row_builder(v) for v in x]
+        return lambda i: tuple([f(i) for f in builders])
+    elif isinstance(x, list):
+        builders = [row_builder(v) for v in x]
+        return lambda i: [f(i) for f in builders]
+    else:
+        return lambda i: resolve(x, [])
+
+
+def materialize_rows(x, size):
+    """ Turn a batch result back into one resolved object per sample """
+    build = row_builder(x)
+    return [build(i) for i in xrange(size)]
@@ -0,0 +1,317 @@
+""" A compact binary encoding of parsed documents, which decodes without
+    parsing (see genson.to_bytes and genson.from_bytes).
+
+    The encoding is the magic bytes "GSNB" and a version byte, followed by
+    the document as tagged values.  Counts, lengths and integers are
+    variable-length (integers zigzag encoded); each string and reference
+    is stored once and later occurrences refer back to it.  Generators and
+    functions are stored as the call registry_call rebuilds them from (see
+    __genson_call__), so they decode with their parameters and seeds, and
+    with the functions registered in the decoding process.
+"""
+import sys
+import struct
+from util import isiterable
+from functions import registry_call
+from internal_ops import GenSONBinaryOp, GenSONUnaryOp
+from references import ScopedReference
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+MAGIC = 'GSNB'
+VERSION = 1
+
+NONE, TRUE, FALSE, INT, LONG, FLOAT, STRING, UNICODE, STRING_REF, LIST, \
+    TUPLE, ORDERED_DICT, DICT, REFERENCE, REFERENCE_REF, BINARY_OP, \
+    UNARY_OP, CALL = [chr(i) for i in xrange(18)]
+
+double = struct.Struct('<d')
+
+# operators are stored as one byte, their index here
+operators = ['+', '-', '*', '/', '**']
+operator_codes = dict([(op, chr(i)) for i, op in enumerate(operators)])
+
+
+class Encoder:
+    def __init__(self):
+        self.pieces = [MAGIC, chr(VERSION)]
+        self.strings = {}
+        self.references = {}
+        self.writers = {type(None): self.encode_constant,
+                        bool: self.encode_constant,
+                        int: self.encode_int,
+                        long: self.encode_int,
+                        float: self.encode_float,
+                        str: self.encode_string,
+                        unicode: self.encode_string,
+                        list: self.encode_list,
+                        tuple: self.encode_tuple,
+                        OrderedDict: self.encode_dict,
+                        dict: self.encode_dict,
+                        ScopedReference: self.encode_reference,
+                        GenSONBinaryOp: self.encode_binary_op,
+                        GenSONUnaryOp: self.encode_unary_op}
+
+    def getvalue(self):
+        return ''.join(self.pieces)
+
+    def encode(self, x):
+        try:
+            writer = self.writers[type(x)]
+        except KeyError:
+            writer = self.find_writer(x)
+        writer(x)
+
+    def find_writer(self, x):
+        # looked up on the type, as pyparsing results have every attribute
+        if hasattr(type(x), '__genson_call__'):
+            return self.encode_call
+        elif 'numpy' in sys.modules and \
+                isinstance(x, sys.modules['numpy'].generic):
+            return lambda x: self.encode(x.item())
+        for t in (float, str, unicode, tuple, OrderedDict, dict):
+            if isinstance(x, t):
+                return self.writers[t]
+        if isiterable(x):
+            return lambda x: self.encode_list(list(x))
+        raise TypeError("Cannot encode %r" % (x,))
+
+    def write_count(self, n):
+        if n < 0x80:
+            self.pieces.append(chr(n))
+            return
+        pieces = []
+        while n >= 0x80:
+            pieces.append(chr(n & 0x7f | 0x80))
+            n >>= 7
+        pieces.append(chr(n))
+        self.pieces.append(''.join(pieces))
+
+    def encode_constant(self, x):
+        self.pieces.append(NONE if x is None else TRUE if x else FALSE)
+
+    def encode_int(self, x):
+        if -2 ** 63 <= x < 2 ** 63:
+            self.pieces.append(INT)
+            self.write_count(x << 1 if x >= 0 else (-x << 1) - 1)
+        else:
+            self.pieces.append(LONG)
+            self.write_name(str(x))
+
+    def encode_float(self, x):
+        self.pieces.append(FLOAT + double.pack(x))
+
+    def encode_string(self, x):
+        index = self.strings.get((type(x), x))
+        if index is not None:
+            self.pieces.append(STRING_REF)
+            self.write_count(index)
+            return
+
+        self.strings[(type(x), x)] = len(self.strings)
+        if isinstance(x, unicode):
+            self.pieces.append(UNICODE)
+            x = x.encode('utf-8')
+        else:
+            self.pieces.append(STRING)
+        self.write_count(len(x))
+        self.pieces.append(x)
+
+    def write_name(self, name):
+        self.encode_string(str(name))
+
+    def encode_sequence(self, tag, x):
+        self.pieces.append(tag)
+        self.write_count(len(x))
+        for v in x:
+            self.encode(v)
+
+    def encode_list(self, x):
+        self.encode_sequence(LIST, x)
+
+    def encode_tuple(self, x):
+        self.encode_sequence(TUPLE, x)
+
+    def encode_dict(self, x):
+        self.pieces.append(ORDERED_DICT if isinstance(x, OrderedDict)
+                           else DICT)
+        self.write_count(len(x))
+        for k, v in x.items():
+            self.encode(k)
+            self.encode(v)
+
+    def encode_reference(self, x):
+        key = tuple(x.scope_list)
+        index = self.references.get(key)
+        if index is not None:
+            self.pieces.append(REFERENCE_REF)
+            self.write_count(index)
+            return
+
+        self.references[key] = len(self.references)
+        self.pieces.append(REFERENCE)
+        self.write_count(len(x.scope_list))
+        for name in x.scope_list:
+            self.write_name(name)
+
+    def encode_binary_op(self, x):
+        self.pieces.append(BINARY_OP + operator_codes[x.op])
+        self.encode(x.a)
+        self.encode(x.b)
+
+    def encode_unary_op(self, x):
+        self.pieces.append(UNARY_OP + operator_codes[x.op])
+        self.encode(x.a)
+
+    def encode_call(self, x):
+        name, args, kwargs = x.__genson_call__()
+        self.pieces.append(CALL)
+        self.write_name(name)
+        self.encode_sequence(TUPLE, args)
+        kwargs = list(kwargs)
+        self.write_count(len(kwargs))
+        for k, v in kwargs:
+            self.write_name(k)
+            self.encode(v)
+
+
+class Decoder:
+    def __init__(self, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not an encoded GenSON document")
+        version = ord(data[len(MAGIC)])
+        if version > VERSION:
+            raise ValueError("Unsupported encoding version %d (at most %d)"
+                             % (version, VERSION))
+        self.data = data
+        self.pos = len(MAGIC) + 1
+        self.strings = []
+        self.references = []
+        self.readers = {NONE: lambda: None,
+                        TRUE: lambda: True,
+                        FALSE: lambda: False,
+                        INT: self.read_int,
+                        LONG: self.read_long,
+                        FLOAT: self.read_float,
+                        STRING: self.read_string,
+                        UNICODE: self.read_unicode,
+                        STRING_REF: self.read_string_ref,
+                        LIST: lambda: list(self.read_sequence()),
+                        TUPLE: lambda: tuple(self.read_sequence()),
+                        ORDERED_DICT: lambda: OrderedDict(self.read_items()),
+                        DICT: lambda: dict(self.read_items()),
+                        REFERENCE: self.read_reference,
+                        REFERENCE_REF: self.read_reference_ref,
+                        BINARY_OP: self.read_binary_op,
+                        UNARY_OP: self.read_unary_op,
+                        CALL: self.read_call}
+
+    def decode(self):
+        try:
+            tag = self.data[self.pos]
+            self.pos += 1
+            return self.readers[tag]()
+        except (IndexError, KeyError, struct.error):
+            raise ValueError("Corrupt encoded GenSON document (at byte %d)"
+                             % self.pos)
+
+    def read_count(self):
+        data = self.data
+        n = ord(data[self.pos])
+        self.pos += 1
+        if n < 0x80:
+            return n
+        n &= 0x7f
+        shift = 7
+        while True:
+            byte = ord(data[self.pos])
+            self.pos += 1
+            n |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return n
+            shift += 7
+
+    def read_int(self):
+        n = self.read_count()
+        return -((n + 1) >> 1) if n & 1 else n >> 1
+
+    def read_long(self):
+        return long(self.decode())
+
+    def read_float(self):
+        value, = double.unpack_from(self.data, self.pos)
+        self.pos += double.size
+        return value
+
+    def read_bytes(self):
+        n = self.read_count()
+        value = self.data[self.pos:self.pos + n]
+        if len(value) < n:
+            raise IndexError(self.pos)
+        self.pos += n
+        return value
+
+    def read_string(self):
+        value = self.read_bytes()
+        self.strings.append(value)
+        return value
+
+    def read_unicode(self):
+        value = self.read_bytes().decode('utf-8')
+        self.strings.append(value)
+        return value
+
+    def read_string_ref(self):
+        return self.strings[self.read_count()]
+
+    def read_sequence(self):
+        return [self.decode() for _ in xrange(self.read_count())]
+
+    def read_items(self):
+        return [(self.decode(), self.decode())
+                for _ in xrange(self.read_count())]
+
+    def read_reference(self):
+        scope_list = [self.decode() for _ in xrange(self.read_count())]
+        self.references.append(scope_list)
+        return ScopedReference(list(scope_list))
+
+    def read_reference_ref(self):
+        return ScopedReference(list(self.references[self.read_count()]))
+
+    def read_operator(self):
+        op = operators[ord(self.data[self.pos])]
+        self.pos += 1
+        return op
+
+    def read_binary_op(self):
+        op = self.read_operator()
+        a = self.decode()
+        return GenSONBinaryOp(a, self.decode(), op)
+
+    def read_unary_op(self):
+        op = self.read_operator()
+        return GenSONUnaryOp(self.decode(), op)
+
+    def read_call(self):
+        name = self.decode()
+        args = self.decode()
+        kwargs = self.read_items()
+        return registry_call(name, args, kwargs)
+
+
+def encode(x):
+    """ The binary encoding of a document """
+    encoder = Encoder()
+    encoder.encode(x)
+    return encoder.getvalue()
+
+
+def decode(data):
+    """ The document encoded by encode(); raises ValueError if data is not
+        an encoded document
+    """
+    return Decoder(data).decode()
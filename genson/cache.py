@@ -0,0 +1,144 @@
+import os
+import sys
+import hashlib
+import tempfile
+import cPickle as pickle
+from cStringIO import StringIO
+
+from util import walk
+from functions import ParameterGenerator
+from version import __version__
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+# bump when the layout of parsed documents changes incompatibly
+CACHE_FORMAT = 3
+
+
+def dump_tree(tree):
+    """ Pickle a parsed document, leaving out the state of random streams """
+    buf = StringIO()
+    pickler = pickle.Pickler(buf, pickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = random_state_id
+    pickler.dump(tree)
+    return buf.getvalue()
+
+
+def random_state_id(obj):
+    # without numpy loaded there are no random streams to leave out
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(obj, numpy.random.RandomState):
+        return 'random'
+    return None
+
+
+def load_tree(data):
+    """ Unpickle a parsed document, seeding its generators as parsing would
+    """
+    unpickler = pickle.Unpickler(StringIO(data))
+    unpickler.persistent_load = lambda pid: None
+    tree = unpickler.load()
+
+    for node in walk(tree):
+        if isinstance(node, ParameterGenerator):
+            node.seed()
+    return tree
+
+
+class ParseCache:
+    """ A cache of parsed GenSON documents keyed by a hash of their text.
+
+        Parsed trees are kept pickled, in an in-process LRU of up to max_size
+        entries and, if cache_dir is set, as files shared between processes.
+        Every lookup returns a new, independent tree.
+    """
+    def __init__(self, max_size=128, cache_dir=None):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, genson_string, backend='pyparsing'):
+        h = hashlib.sha1()
+        h.update('%s:%s:%s\0' % (CACHE_FORMAT, __version__, backend))
+        if isinstance(genson_string, unicode):
+            genson_string = genson_string.encode('utf-8')
+        h.update(genson_string)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.gsonc')
+
+    def get(self, key):
+        data = self.entries.pop(key, None)
+        if data is not None:
+            self.hits += 1
+        elif self.cache_dir is not None and os.path.exists(self.path(key)):
+            with open(self.path(key), 'rb') as f:
+                data = f.read()
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            return None
+
+        self.remember(key, data)
+        return load_tree(data)
+
+    def put(self, key, tree):
+        try:
+            data = dump_tree(tree)
+        except (pickle.PicklingError, TypeError):
+            # e.g. a registered function that is a lambda; just don't cache
+            return
+
+        self.remember(key, data)
+        if self.cache_dir is not None:
+            self.write_file(key, data)
+
+    def remember(self, key, data):
+        self.entries[key] = data
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def write_file(self, key, data):
+        try:
+            os.makedirs(self.cache_dir)
+        except OSError:
+            if not os.path.isdir(self.cache_dir):
+                raise
+
+        # write to a temporary file first so readers never see partial data
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.rename(tmp_path, self.path(key))
+
+    def parse(self, genson_string, parser):
+        key = self.key(genson_string, getattr(parser, 'backend', 'pyparsing'))
+        tree = self.get(key)
+        if tree is None:
+            tree = parser.parse_string(genson_string)
+            self.put(key, tree)
+        return tree
+
+    def clear(self):
+        self.entries.clear()
+
+
+default_parse_cache = ParseCache(cache_dir=os.environ.get('GENSON_CACHE_DIR'))
+
+
+def set_parse_cache(cache):
+    """ Replace the cache used by genson.load()/loads(); None disables it """
+    global default_parse_cache
+    default_parse_cache = cache
+
+
+def get_parse_cache():
+    return default_parse_cache
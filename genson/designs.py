@@ -0,0 +1,100 @@
+""" Point sets in the unit hypercube for the design generators (see
+    DesignGenerator): an array of n points by dims coordinates in [0, 1)
+"""
+from util import lazy_import
+
+np = lazy_import('numpy')
+
+SOBOL_BITS = 30
+
+# primitive polynomials and initial direction numbers for dimensions 2, 3,
+# ... of the Sobol sequence, as (degree, coefficients, m values), from
+# Joe and Kuo, "Constructing Sobol sequences with better two-dimensional
+# projections", SIAM J. Sci. Comput. 30, 2008
+sobol_table = [
+    (1, 0, (1,)),
+    (2, 1, (1, 3)),
+    (3, 1, (1, 3, 1)),
+    (3, 2, (1, 1, 1)),
+    (4, 1, (1, 1, 3, 3)),
+    (4, 4, (1, 3, 5, 13)),
+    (5, 2, (1, 1, 5, 5, 17)),
+    (5, 4, (1, 1, 5, 5, 5)),
+    (5, 7, (1, 1, 7, 11, 19)),
+    (5, 11, (1, 1, 5, 1, 1)),
+    (5, 13, (1, 1, 1, 3, 11)),
+    (5, 14, (1, 3, 5, 5, 31)),
+    (6, 1, (1, 3, 3, 9, 7, 49)),
+    (6, 13, (1, 1, 1, 15, 21, 21)),
+    (6, 16, (1, 3, 1, 13, 27, 49)),
+    (6, 19, (1, 1, 1, 15, 7, 5)),
+    (6, 22, (1, 3, 1, 15, 13, 25)),
+    (6, 25, (1, 1, 5, 5, 19, 61)),
+    (7, 1, (1, 3, 7, 11, 23, 15, 103)),
+    (7, 4, (1, 3, 7, 13, 13, 15, 69)),
+]
+
+max_sobol_dims = len(sobol_table) + 1
+
+
+def direction_numbers(dim):
+    """ The SOBOL_BITS direction numbers of a Sobol dimension (from 0) """
+    if dim == 0:
+        m = [1] * SOBOL_BITS
+    else:
+        s, a, m = sobol_table[dim - 1]
+        m = list(m)
+        for i in xrange(s, SOBOL_BITS):
+            value = m[i - s] ^ (m[i - s] << s)
+            for k in xrange(1, s):
+                if (a >> (s - 1 - k)) & 1:
+                    value ^= m[i - k] << k
+            m.append(value)
+    return [m[i] << (SOBOL_BITS - 1 - i) for i in xrange(SOBOL_BITS)]
+
+
+def sobol_points(n, dims):
+    if dims > max_sobol_dims:
+        raise ValueError("Sobol designs have at most %s dimensions"
+                         % max_sobol_dims)
+    if n > 2 ** SOBOL_BITS:
+        raise ValueError("Sobol designs have at most 2^%s points"
+                         % SOBOL_BITS)
+
+    index = np.arange(n, dtype=np.int64)
+    points = np.zeros((n, dims), dtype=np.int64)
+    for d in xrange(dims):
+        for bit, v in enumerate(direction_numbers(d)):
+            points[:, d] ^= np.where((index >> bit) & 1, v, 0)
+    return points / float(2 ** SOBOL_BITS)
+
+
+def primes(count):
+    found = []
+    candidate = 2
+    while len(found) < count:
+        if all(candidate % p for p in found):
+            found.append(candidate)
+        candidate += 1
+    return found
+
+
+def halton_points(n, dims):
+    # the radical inverses of 1 .. n, skipping the origin
+    points = np.zeros((n, dims))
+    for d, base in enumerate(primes(dims)):
+        index = np.arange(1, n + 1, dtype=np.int64)
+        scale = 1.0
+        while index.any():
+            scale /= base
+            points[:, d] += (index % base) * scale
+            index //= base
+    return points
+
+
+def lhs_points(n, dims, random):
+    """ A Latin hypercube: each coordinate takes one value within each of n
+        equal strata, in random order
+    """
+    strata = np.argsort(random.random_sample((n, dims)), axis=0)
+    return (strata + random.random_sample((n, dims))) / float(n)
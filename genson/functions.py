@@ -1,16 +1,48 @@
-import numpy as np
-from util import resolve, genson_dumps, get_global_seed, assert_kwargs_consumed
+import sys
+from util import resolve, get_global_seed, get_rng_mode, \
+    assert_kwargs_consumed, lazy_import, isdict, istuple, isiterable, \
+    isgensonevaluable, genson_children, walk
+from philox import CounterStream
+from designs import sobol_points, halton_points, lhs_points
 from internal_ops import GenSONOperand
+from batch import resolve_batch, row_builder, make_column, take
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+np = lazy_import('numpy')
 
 registry = {}
+function_caches = {}
+registered_functions = {}   # name -> (fun, pure), see register_function
 
 
 class GenSONFunction(GenSONOperand):
-    def __init__(self, fun, name, args, kwargs):
+    __slots__ = ('name', 'fun', 'args', 'kwargs', 'pure')
+
+    def __init__(self, fun, name, args, kwargs, pure=True):
         self.name = name
         self.fun = fun
         self.args = args
         self.kwargs = kwargs
+        self.pure = pure
+
+    def __getstate__(self):
+        return dict([(name, getattr(self, name)) for name in self.__slots__])
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        # documents from the parse cache call the function registered now
+        if self.name in registered_functions:
+            self.fun, self.pure = registered_functions[self.name]
+
+    @property
+    def stochastic(self):
+        # an impure function may return a new value on every evaluation
+        return not self.pure
 
     def __genson_eval__(self, context):
         resolved_args = []
@@ -23,47 +55,231 @@ class GenSONFunction(GenSONOperand):
 
         return self.fun(*resolved_args, **resolved_kwargs)
 
-    def __genson_repr__(self, pretty_print=False, depth=0):
-        arg_list = genson_dumps(self.args, pretty_print, 0)
-        kwarg_list = ["%s=%s" % genson_dumps(x, pretty_print, depth)
-                      for x in self.kwargs.items()]
-        arg_str = ",".join(arg_list + tuple(kwarg_list))
+    def __genson_children__(self):
+        return tuple(self.args) + tuple(self.kwargs.values())
+
+    def __genson_batch__(self, context, batch):
+        args = [resolve_batch(a, context, batch) for a in self.args]
+        kwargs = dict([(k, resolve_batch(v, context, batch))
+                       for k, v in self.kwargs.items()])
+
+        if isinstance(self.fun, np.ufunc):
+            return self.fun(*args, **kwargs)
+
+        # not known to be vectorized: call once per sample
+        arg_rows = [row_builder(a) for a in args]
+        kwarg_rows = [(k, row_builder(v)) for k, v in kwargs.items()]
+        return make_column([self.fun(*[f(i) for f in arg_rows],
+                                     **dict([(k, f(i)) for k, f in kwarg_rows]))
+                            for i in xrange(batch.size)])
+
+    def __genson_call__(self):
+        return self.name, self.args, self.kwargs.items()
+
+    def __genson_write__(self, writer, depth=0):
+        writer.write_call(*self.__genson_call__() + (depth,))
+
+
+def cache_key(x):
+    """ A hashable key for a resolved argument, telling apart values of
+        different types that compare equal (such as 1, 1.0 and True)
+    """
+    if isinstance(x, dict):
+        return ('dict', tuple(sorted((cache_key(k), cache_key(v))
+                                     for k, v in x.items())))
+    elif isinstance(x, (list, tuple)):
+        return (type(x).__name__, tuple([cache_key(v) for v in x]))
+    elif 'numpy' in sys.modules and isinstance(x, np.ndarray):
+        x = np.ascontiguousarray(x)
+        return ('ndarray', x.dtype.str, x.shape, x.tostring())
+    return (type(x), x)
+
+
+class FunctionCache:
+    """ A registered function memoized on its resolved arguments, keeping
+        the cache_size most recently used results
+    """
+    def __init__(self, name, fun, cache_size):
+        self.name = name
+        self.fun = fun
+        self.cache_size = cache_size
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, *args, **kwargs):
+        key = (cache_key(args), cache_key(kwargs))
+        try:
+            result = self.results.pop(key)
+        except KeyError:
+            self.misses += 1
+            result = self.fun(*args, **kwargs)
+            if len(self.results) >= self.cache_size:
+                self.results.popitem(last=False)
+        else:
+            self.hits += 1
+        self.results[key] = result
+        return result
+
+    def __reduce__(self):
+        # unpickled documents share the cache of the registered function
+        return (get_function_cache, (self.name,))
+
+    def clear(self):
+        self.results.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'cache_size': self.cache_size, 'size': len(self.results)}
+
+
+def get_function_cache(name):
+    return function_caches[name]
+
+
+def register_function(name, fun, pure=True, cache_size=None):
+    """ Register a function callable from documents.
+
+        Pure functions (returning the same value for the same arguments,
+        without side effects) may be evaluated once for constant arguments,
+        or once per sample for repeated sub-expressions; impure ones are
+        evaluated wherever they occur, for every sample.  With cache_size,
+        the results of a pure function are memoized on its arguments
+        across samples (see function_cache_info).
+    """
+    if cache_size is not None:
+        if not pure:
+            raise ValueError("Cannot cache the impure function %s" % name)
+        fun = FunctionCache(name, fun, cache_size)
+        function_caches[name] = fun
+    else:
+        function_caches.pop(name, None)
+    registered_functions[name] = (fun, pure)
+
+    def wrapper(*args, **kwargs):
+        return GenSONFunction(fun, name, args, kwargs, pure)
+    registry[name] = wrapper
 
-        return "%s(%s)" % (self.name, arg_str)
 
+def function_cache_info(name):
+    """ The hits, misses, cache_size and current size of the cache of a
+        registered function
+    """
+    return function_caches[name].info()
 
-def register_function(name, fun):
+def register_numpy_function(name):
+    """ Register a NumPy function, which is looked up (importing NumPy)
+        when a document first uses it
+    """
     def wrapper(*args, **kwargs):
-        return GenSONFunction(fun, name, args, kwargs)
+        return GenSONFunction(getattr(np, name), name, args, kwargs)
     registry[name] = wrapper
 
-register_function('sin', np.sin)
-register_function('cos', np.cos)
-register_function('tan', np.tan)
+def registry_call(name, args=(), kwargs=()):
+    """ Instantiate the registered generator or function `name`; kwargs may
+        be a dict or a sequence of (name, value) pairs
+    """
+    generator_class = registry.get(name, None)
+    if generator_class is None:
+        raise Exception('Unknown generator class: %s' % name)
+
+    return generator_class(*args, **dict(kwargs))
+
+register_numpy_function('sin')
+register_numpy_function('cos')
+register_numpy_function('tan')
 
 
 class ParameterGenerator(GenSONOperand):
 
+    # whether evaluation draws from the random stream, so that the value can
+    # change with every evaluation rather than only when the counter moves
+    stochastic = True
+
+    __slots__ = ('draws', 'counter', 'random_seed', 'stream_seed', 'random',
+                 'initial_state', 'path')
+
     def __init__(self, draws=1, random_seed=None):
         self.draws = draws
         self.counter = 0
+        # the position of the generator within its document, which keys its
+        # stream in 'counter' RNG mode
+        self.path = ''
 
         self.random_seed = random_seed
         self.seed()
 
     def reset(self):
         self.counter = 0
-        self.seed()
+        seed = self.current_seed()
+        if seed is None or seed != self.stream_seed:
+            self.seed()
+            return
+
+        # rewind the stream to its seeded state, which is cheaper than
+        # seeding a new one
+        try:
+            stream = object.__getattribute__(self, 'random')
+        except AttributeError:
+            return      # the stream has not been created yet
+        # profiling wraps the stream, see profiling.CountingStream
+        if isinstance(getattr(stream, 'stream', stream), CounterStream):
+            stream.rewind()
+        else:
+            stream.set_state(self.initial_state)
 
     def seed(self, new_seed=None):
         if new_seed is not None:
-            seed = self.random_seed = new_seed
-        elif self.random_seed is None:
-            seed = get_global_seed()
-        else:
-            seed = self.random_seed
-
-        self.random = np.random.RandomState(seed=seed)
+            self.random_seed = new_seed
+
+        # the stream itself is created on first use, see __getattr__
+        self.stream_seed = self.current_seed()
+        try:
+            del self.random
+            del self.initial_state
+        except AttributeError:
+            pass
+
+    def __getattr__(self, name):
+        if name != 'random':
+            raise AttributeError(name)
+
+        if get_rng_mode() == 'counter':
+            self.random = CounterStream(self.stream_seed, self.path)
+            return self.random
+
+        self.random = np.random.RandomState(seed=self.stream_seed)
+        if self.stream_seed is not None:
+            self.initial_state = self.random.get_state()
+        return self.random
+
+    def __getstate__(self):
+        # read the slots directly, so that pickling does not create a
+        # random stream that has not been used yet
+        state = dict(getattr(self, '__dict__', {}))
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                try:
+                    state[name] = object.__getattribute__(self, name)
+                except AttributeError:
+                    pass
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def current_seed(self):
+        if self.random_seed is None:
+            return get_global_seed()
+        return self.random_seed
+
+    def fresh_stream(self):
+        """ A new random stream, seeded the way reset() seeds this generator
+        """
+        return np.random.RandomState(seed=self.current_seed())
 
     def advance(self):
         self.counter += 1
@@ -72,12 +288,49 @@ class ParameterGenerator(GenSONOperand):
 
         return True
 
+    def seek(self, counter, evaluations=0):
+        """ Jump to draw number `counter`, as if the generator had been
+            evaluated `evaluations` times since it was last reset
+        """
+        self.reset()
+        self.counter = counter
+        if get_rng_mode() == 'legacy':
+            self.skip(evaluations)
+
+    def skip(self, n):
+        """ Advance the random stream past n evaluations; deterministic
+            generators draw nothing
+        """
+        pass
+
     def __genson_eval__(self, context):
         raise NotImplementedError()
 
+    # the built-in generators define __genson_call__(), the name, arguments
+    # and keyword arguments (as (name, value) pairs) that registry_call
+    # builds them from, and are written as that call; other subclasses are
+    # written with __genson_repr__
+
+    def seed_kwargs(self, draws):
+        kwargs = [('draws', draws)]
+        if self.random_seed is not None:
+            kwargs.append(('random_seed', self.random_seed))
+        return kwargs
+
+
+def skip_draws(draw, n, chunk_size=65536):
+    """ Call a vectorized draw function for n values in bounded chunks """
+    while n > 0:
+        draw(min(n, chunk_size))
+        n -= chunk_size
+
 
 class GridGenerator(ParameterGenerator):
 
+    stochastic = False
+
+    __slots__ = ('values',)
+
     def __init__(self, *values, **kwargs):
         draws = kwargs.pop('draws', None)
         random_seed = kwargs.pop('random_seed', None)
@@ -94,29 +347,29 @@ class GridGenerator(ParameterGenerator):
     def __genson_eval__(self, context):
         return self.values[self.counter]
 
-    def __genson_repr__(self, pretty_print=False, depth=0):
-
-        vals = [str(x) for x in genson_dumps(self.values)]
-        val_str = ",".join(vals)
-        if self.draws is not None:
-            draws = ", draws=%s" % genson_dumps(self.draws)
-        else:
-            draws = ""
-        return "<%s%s>" % (val_str, draws)
-
-registry['grid'] = GridGenerator
+    def __genson_batch__(self, context, batch):
+        return take(self.values, batch.counter(self))
 
+    def __genson_children__(self):
+        return tuple(self.values)
 
-def genson_call_str(name, *args, **kwargs):
+    def __genson_call__(self):
+        return 'grid', self.values, [('draws', self.draws)]
 
-    g_args = genson_dumps(args)
-    g_kwargs = ["%s=%s" % genson_dumps(x)
-                for x in kwargs.items() if x[1] is not None]
+    def __genson_write__(self, writer, depth=0):
+        # the shorthand only takes values, drawing each once
+        if self.draws != len(self.values):
+            writer.write_call(*self.__genson_call__() + (depth,))
+            return
+        writer.write('<')
+        writer.write_elements(self.values, depth)
+        writer.write('>')
 
-    return "%s(%s)" % (name, ",".join(g_args + tuple(g_kwargs)))
+registry['grid'] = GridGenerator
 
 
 class GaussianRandomGenerator(ParameterGenerator):
+    __slots__ = ('mean', 'stdev')
 
     def __init__(self, mean, stdev, draws=1, random_seed=None):
         ParameterGenerator.__init__(self, draws=draws, random_seed=random_seed)
@@ -127,15 +380,31 @@ class GaussianRandomGenerator(ParameterGenerator):
         return self.random.normal(resolve(self.mean, context),
                                   resolve(self.stdev, context))
 
-    def __genson_repr__(self, pretty_print=False, depth=0):
-        return genson_call_str('gaussian', self.mean, self.stdev,
-                               draws=self.draws, random_seed=self.random_seed)
+    def __genson_children__(self):
+        return (self.mean, self.stdev)
+
+    def __genson_batch__(self, context, batch):
+        z = batch.stream(self, lambda random, size:
+                         random.standard_normal(size))
+        return resolve_batch(self.mean, context, batch) + \
+            resolve_batch(self.stdev, context, batch) * z
+
+    def skip(self, n):
+        skip_draws(self.random.standard_normal, n)
+
+    def __genson_call__(self):
+        return ('gaussian', (self.mean, self.stdev),
+                self.seed_kwargs(self.draws))
+
+    def __genson_write__(self, writer, depth=0):
+        writer.write_call(*self.__genson_call__() + (depth,))
 
 
 registry['gaussian'] = GaussianRandomGenerator
 
 
 class UniformRandomGenerator(ParameterGenerator):
+    __slots__ = ('min', 'max')
 
     def __init__(self, min, max, draws=1, random_seed=None):
         ParameterGenerator.__init__(self, draws=draws, random_seed=random_seed)
@@ -146,14 +415,30 @@ class UniformRandomGenerator(ParameterGenerator):
         return self.random.uniform(resolve(self.min, context),
                                    resolve(self.max, context))
 
-    def __genson_repr__(self, pretty_print=False, depth=0):
-        return genson_call_str('uniform', self.min, self.max,
-                               draws=self.draws, random_seed=self.random_seed)
+    def __genson_children__(self):
+        return (self.min, self.max)
+
+    def __genson_batch__(self, context, batch):
+        u = batch.stream(self, lambda random, size:
+                         random.random_sample(size))
+        low = resolve_batch(self.min, context, batch)
+        high = resolve_batch(self.max, context, batch)
+        return low + (high - low) * u
+
+    def skip(self, n):
+        skip_draws(self.random.random_sample, n)
+
+    def __genson_call__(self):
+        return 'uniform', (self.min, self.max), self.seed_kwargs(self.draws)
+
+    def __genson_write__(self, writer, depth=0):
+        writer.write_call(*self.__genson_call__() + (depth,))
 
 registry['uniform'] = UniformRandomGenerator
 
 
 class ChoiceRandomGenerator(ParameterGenerator):
+    __slots__ = ('vals',)
 
     def __init__(self, vals, draws=1, random_seed=None):
         ParameterGenerator.__init__(self, draws=draws, random_seed=random_seed)
@@ -162,9 +447,179 @@ class ChoiceRandomGenerator(ParameterGenerator):
     def __genson_eval__(self, context):
         return self.vals[self.random.randint(len(self.vals))]
 
-    def __genson_repr__(self, pretty_print=False, depth=0):
-        return genson_call_str('choice', *self.vals,
-                               draws=self.draws, random_seed=self.random_seed)
+    def __genson_children__(self):
+        return tuple(self.vals)
+
+    def __genson_batch__(self, context, batch):
+        index = batch.stream(self, lambda random, size:
+                             random.randint(len(self.vals), size=size))
+        return take(self.vals, index)
+
+    def skip(self, n):
+        skip_draws(lambda size: self.random.randint(len(self.vals), size=size),
+                   n)
+
+    def __genson_call__(self):
+        return 'choice', (self.vals,), self.seed_kwargs(self.draws)
+
+    def __genson_write__(self, writer, depth=0):
+        writer.write_call(*self.__genson_call__() + (depth,))
 
 
 registry['choice'] = ChoiceRandomGenerator
+
+
+class Design:
+    """ The joint design of the design generators of one kind in a document:
+        each takes one coordinate of the points, at the row given by the
+        counter of the first (the leader), so that they move together
+    """
+    def __init__(self, leader):
+        self.leader = leader
+        self.generators = [leader]
+        self.points = None
+
+    def join(self, generator):
+        if generator.size != self.leader.size:
+            raise ValueError("The %s generators of a document must have the "
+                             "same draws" % generator.name)
+        generator.design = self
+        generator.dimension = len(self.generators)
+        self.generators.append(generator)
+        self.points = None
+
+    def get_points(self):
+        if self.points is None:
+            self.points = self.leader.make_points(self.leader.size,
+                                                  len(self.generators))
+        return self.points
+
+
+class DesignGenerator(ParameterGenerator):
+    """ A coordinate of a space filling design between low and high, which
+        covers the space more evenly than independent random draws
+    """
+    stochastic = False
+    # whether a new design is drawn when the generator is reseeded
+    randomized = False
+
+    __slots__ = ('low', 'high', 'size', 'design', 'dimension', 'index')
+
+    def __init__(self, low, high, draws=16, random_seed=None):
+        self.low = low
+        self.high = high
+        self.size = draws
+        self.design = Design(self)
+        self.dimension = 0
+        ParameterGenerator.__init__(self, draws=draws, random_seed=random_seed)
+
+    def get_counter(self):
+        return self.design.leader.index
+
+    def set_counter(self, counter):
+        self.index = counter
+
+    counter = property(get_counter, set_counter)
+
+    def seed(self, new_seed=None):
+        ParameterGenerator.seed(self, new_seed)
+        if self.randomized and self.design.leader is self:
+            self.design.points = None
+
+    def __genson_eval__(self, context):
+        u = self.design.get_points()[self.counter, self.dimension]
+        low = resolve(self.low, context)
+        return low + (resolve(self.high, context) - low) * float(u)
+
+    def __genson_batch__(self, context, batch):
+        u = self.design.get_points()[batch.counter(self.design.leader),
+                                     self.dimension]
+        low = resolve_batch(self.low, context, batch)
+        return low + (resolve_batch(self.high, context, batch) - low) * u
+
+    def __genson_children__(self):
+        return (self.low, self.high)
+
+    def __genson_call__(self):
+        return self.name, (self.low, self.high), self.seed_kwargs(self.size)
+
+    def __genson_write__(self, writer, depth=0):
+        writer.write_call(*self.__genson_call__() + (depth,))
+
+
+class SobolGenerator(DesignGenerator):
+    name = 'sobol'
+    __slots__ = ()
+
+    def make_points(self, n, dims):
+        return sobol_points(n, dims)
+
+registry['sobol'] = SobolGenerator
+
+
+class HaltonGenerator(DesignGenerator):
+    name = 'halton'
+    __slots__ = ()
+
+    def make_points(self, n, dims):
+        return halton_points(n, dims)
+
+registry['halton'] = HaltonGenerator
+
+
+class LatinHypercubeGenerator(DesignGenerator):
+    name = 'lhs'
+    randomized = True
+    __slots__ = ()
+
+    def make_points(self, n, dims):
+        return lhs_points(n, dims, self.fresh_stream())
+
+registry['lhs'] = LatinHypercubeGenerator
+
+
+def link_designs(generators, document):
+    """ Join the design generators of each kind in a generator stack into
+        one design, and return the stack without the generators following
+        the leader of their design.  Design generators elsewhere in the
+        document, such as in expressions or function arguments, have no
+        axis to move along, so they raise a ValueError.
+    """
+    in_stack = set(id(g) for g in generators)
+    for x in walk(document):
+        if isinstance(x, DesignGenerator) and id(x) not in in_stack:
+            raise ValueError("%s generators must be values of a document, "
+                             "not nested in expressions or function "
+                             "arguments" % x.name)
+
+    designs = {}
+    stack = []
+    for g in generators:
+        if isinstance(g, DesignGenerator):
+            if type(g) in designs:
+                designs[type(g)].join(g)
+                continue
+            g.design = designs[type(g)] = Design(g)
+            g.dimension = 0
+        stack.append(g)
+    return stack
+
+
+def label_generators(x, path=''):
+    """ Set the path of every generator within a document, such as
+        'a/b/0' for the first argument of the generator at member b of a
+    """
+    if isinstance(x, ParameterGenerator):
+        x.path = path
+    if path:
+        path += '/'
+
+    if isdict(x):
+        for k, v in x.items():
+            label_generators(v, path + ','.join(k if istuple(k) else (k,)))
+    elif isgensonevaluable(x):
+        for i, v in enumerate(genson_children(x)):
+            label_generators(v, path + str(i))
+    elif isiterable(x):
+        for i, v in enumerate(x):
+            label_generators(v, path + str(i))
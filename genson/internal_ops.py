@@ -1,49 +1,117 @@
+import numbers
+import operator
 from util import resolve, genson_dumps
+from batch import resolve_batch
+
+# operator symbol -> function, bound to each node when it is built
+binary_ops = {'+': operator.add,
+              '-': operator.sub,
+              '*': operator.mul,
+              '/': operator.div,
+              '**': operator.pow}
+
+unary_ops = {'+': operator.pos,
+             '-': operator.neg}
+
+# how tightly each operator binds in the grammar, and its symbol there
+binary_levels = {'**': 7, '*': 4, '/': 3, '+': 2, '-': 1}
+unary_levels = {'-': 6, '+': 5}
+binary_symbols = {'+': ' + ', '-': ' - ', '*': ' * ', '/': ' / ',
+                  '**': ' ^ '}
+# operands other than operations bind tightest
+atom_level = 8
+
+
+def binding(x):
+    if type(x) is GenSONBinaryOp:
+        return binary_levels[x.op]
+    elif type(x) is GenSONUnaryOp:
+        return unary_levels[x.op]
+    elif isinstance(x, numbers.Real) and not isinstance(x, bool) and x < 0:
+        # such as folded constants: the sign binds like unary minus
+        return unary_levels['-']
+    return atom_level
+
+
+def write_operand(writer, x, depth, level):
+    """ Write x, in parentheses if it binds less tightly than level """
+    if binding(x) >= level:
+        writer.dump(x, depth)
+        return
+
+    writer.write('(')
+    if type(x) in (GenSONBinaryOp, GenSONUnaryOp):
+        writer.dump(x, depth)
+    else:
+        # a negative number, written as an operation as (-2) is a tuple
+        writer.write('- ')
+        writer.dump(-x, depth)
+    writer.write(')')
+
+
+class GenSONBinaryOp(object):
+    __slots__ = ('a', 'b', 'op', 'apply')
 
-class GenSONBinaryOp:
     def __init__(self,a,b,op):
         self.a = a
         self.b = b
         self.op = op
+        self.apply = binary_ops[op]
 
     def __genson_eval__(self, context):
+        return self.apply(resolve(self.a, context), resolve(self.b, context))
+
+    def __genson_batch__(self, context, batch):
+        return self.apply(resolve_batch(self.a, context, batch),
+                          resolve_batch(self.b, context, batch))
+
+    def __genson_children__(self):
+        return (self.a, self.b)
+
+    def __genson_write__(self, writer, depth=0):
+        # '^' groups to the right, the other operators to the left
+        level = binary_levels[self.op]
+        right = self.op == '**'
+        write_operand(writer, self.a, depth, level + right)
+        writer.write(binary_symbols[self.op])
+        write_operand(writer, self.b, depth, level + (not right))
 
-        res_a = resolve(self.a, context)
-        res_b = resolve(self.b, context)
-
-        if self.op is '+':
-            return res_a + res_b
-        elif self.op is '-':
-            return res_a - res_b
-        elif self.op is '*':
-            return res_a * res_b
-        elif self.op is '/':
-            return res_a / res_b
-        elif self.op is '**':
-            return res_a / res_b
-    
     def __genson_repr__(self, pretty_print=False, depth=0):
-        return "%s %s %s" % (genson_dumps(self.a), 
-                             self.op, 
-                             genson_dumps(self.b))
+        return genson_dumps(self, pretty_print, depth)
+
+class GenSONUnaryOp(object):
+    __slots__ = ('a', 'op', 'apply')
 
-class GenSONUnaryOp:
     def __init__(self, a, op):
         self.a = a
         self.op = op
+        self.apply = unary_ops[op]
 
     def __genson_eval__(self, context):
+        return self.apply(resolve(self.a, context))
+
+    def __genson_batch__(self, context, batch):
+        return self.apply(resolve_batch(self.a, context, batch))
+
+    def __genson_children__(self):
+        return (self.a,)
+
+    def __genson_write__(self, writer, depth=0):
+        writer.write(self.op + ' ')
+        write_operand(writer, self.a, depth, unary_levels[self.op])
+
+    def __genson_repr__(self, pretty_print=False, depth=0):
+        return genson_dumps(self, pretty_print, depth)
+
+class GenSONOperand(object):
+    __slots__ = ()
 
-        res_a = resolve(self.a, context)
-        if self.op is '+':
-            return res_a
-        if self.op is '-':
-            return -res_a
-    
     def __genson_repr__(self, pretty_print=False, depth=0):
-        return "%s %s" % (self.op, genson_dumps(self.a))
+        # operands that do not write themselves are written with str()
+        if hasattr(type(self), '__genson_write__'):
+            return genson_dumps(self, pretty_print, depth)
+        return str(self)
 
-class GenSONOperand:
     def __add__(self, other):
         return GenSONBinaryOp(self, other, '+')
     def __radd__(self, other):
@@ -64,16 +132,16 @@ class GenSONOperand:
         return GenSONBinaryOp(self, other, '**')
     def __rpow__(self, other):
         return GenSONBinaryOp(other, self, '**')
-    def __neg__(self, other):
+    def __neg__(self):
         return GenSONUnaryOp(self, '-')
-    def __pos__(self, other):
+    def __pos__(self):
         return GenSONUnaryOp(self, '+')
 
 # Expedient trickiness
 def quicky_populate(cls, method_list):
     for m in method_list:
         source = GenSONOperand.__dict__[m]
-        cls.__dict__[m] = source
+        setattr(cls, m, source)
 
 op_list = [  '__add__', '__radd__',
              '__sub__', '__rsub__',
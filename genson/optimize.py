@@ -0,0 +1,172 @@
+import sys
+from util import lazy_import, resolve, isdict, istuple, isiterable, isgensonevaluable, \
+    is_constant
+from internal_ops import GenSONOperand, GenSONBinaryOp, GenSONUnaryOp, \
+    write_operand, atom_level
+from functions import GenSONFunction, ParameterGenerator
+from references import ScopedReference
+
+np = lazy_import('numpy')
+
+# results that folding may store in the plan, as they are never copied
+foldable_types = (type(None), bool, int, long, float, complex, str, unicode)
+
+
+def is_foldable(value):
+    if type(value) in foldable_types:
+        return True
+    # numpy scalars are immutable too, but only exist once numpy is loaded
+    return 'numpy' in sys.modules and isinstance(value, np.generic)
+
+
+def constant_key(x):
+    if isdict(x):
+        return ('dict', tuple(sorted((constant_key(k), constant_key(v))
+                                     for k, v in x.items())))
+    elif istuple(x) or isinstance(x, list):
+        return (type(x).__name__, tuple([constant_key(v) for v in x]))
+    return (type(x).__name__, x)
+
+
+def operands(node):
+    if isinstance(node, GenSONFunction):
+        return list(node.args) + [v for k, v in sorted(node.kwargs.items())]
+    return list(node.__genson_children__())
+
+
+def with_operands(node, values):
+    """ A copy of an expression node with new operands """
+    if isinstance(node, GenSONBinaryOp):
+        return GenSONBinaryOp(values[0], values[1], node.op)
+    elif isinstance(node, GenSONUnaryOp):
+        return GenSONUnaryOp(values[0], node.op)
+
+    nargs = len(node.args)
+    kwargs = dict(zip(sorted(node.kwargs.keys()), values[nargs:]))
+    return GenSONFunction(node.fun, node.name, tuple(values[:nargs]), kwargs,
+                          node.pure)
+
+
+def is_expression(x):
+    return isinstance(x, (GenSONBinaryOp, GenSONUnaryOp, GenSONFunction))
+
+
+def is_pure(x):
+    return not isinstance(x, GenSONFunction) or x.pure
+
+
+class Shared(GenSONOperand):
+    """ A sub-expression occurring several times in a document, evaluated
+        once per sample
+    """
+    __slots__ = ('node', 'key', 'memo')
+
+    def __init__(self, node, key, memo):
+        self.node = node
+        self.key = key
+        self.memo = memo
+
+    def __genson_eval__(self, context):
+        try:
+            return self.memo[self.key]
+        except KeyError:
+            value = self.node.__genson_eval__(context)
+            self.memo[self.key] = value
+            return value
+
+    def __genson_children__(self):
+        return (self.node,)
+
+    def __genson_write__(self, writer, depth=0):
+        # written in the place of each occurrence, where an operation may
+        # need grouping
+        write_operand(writer, self.node, depth, atom_level)
+
+
+class Optimizer:
+    """ Constant folding and common sub-expression elimination for the
+        expressions of a document.
+
+        Expressions (operators and pure registered functions) whose operands
+        are all constant are evaluated once.
+        Expressions occurring more than once, with operands that have the
+        same value within a sample (constants, grid generators and
+        references to the same member), are evaluated once per sample;
+        memo holds their values and is cleared for every sample.  Nothing
+        containing a random generator or an impure function is touched.
+
+        frames is the tuple of schedule frames an expression is evaluated
+        in, or None where that is not known statically.
+    """
+    def __init__(self):
+        self.memo = {}
+        self.counts = {}
+
+    def key(self, x, frames):
+        """ A key identifying the value of x within a sample, or None """
+        if is_expression(x):
+            if not is_pure(x):
+                return None
+            keys = [self.key(v, frames) for v in operands(x)]
+            if None in keys:
+                return None
+            if isinstance(x, GenSONFunction):
+                return ('fun', x.fun, len(x.args),
+                        tuple(sorted(x.kwargs.keys())), tuple(keys))
+            return (x.__class__.__name__, x.op, tuple(keys))
+        elif isinstance(x, ScopedReference):
+            if frames is None:
+                return None
+            return ('ref', frames[x.frame_index(len(frames))], tuple(x.keys))
+        elif isinstance(x, ParameterGenerator):
+            if x.stochastic:
+                return None
+            return ('gen', id(x))
+        elif is_constant(x):
+            return ('const', constant_key(x))
+        return None
+
+    def count(self, x, frames):
+        """ Count the occurrences of the expressions within a member value
+        """
+        if is_expression(x):
+            key = self.key(x, frames)
+            if key is not None:
+                self.counts[key] = self.counts.get(key, 0) + 1
+            for v in operands(x):
+                self.count(v, frames)
+        elif isgensonevaluable(x):
+            return
+        elif isdict(x):
+            for v in x.values():
+                self.count(v, None)
+        elif isiterable(x):
+            for v in x:
+                self.count(v, frames)
+
+    def rewrite(self, x, frames):
+        """ The optimized form of an expression: a constant, a Shared node or
+            an expression node (x itself if nothing changed)
+        """
+        if not is_expression(x):
+            return x
+
+        values = operands(x)
+        new_values = [self.rewrite(v, frames) for v in values]
+        node = x
+        if any(a is not b for a, b in zip(values, new_values)):
+            node = with_operands(x, new_values)
+
+        if is_pure(x) and all(is_constant(v) for v in new_values):
+            try:
+                value = resolve(node, [])
+            except Exception:
+                # leave errors to be raised when sampling, as before
+                value = node
+            if is_foldable(value):
+                return value
+
+        key = self.key(x, frames)
+        if key is not None and self.counts.get(key, 0) > 1:
+            return Shared(node, key, self.memo)
+        return node
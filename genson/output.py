@@ -0,0 +1,244 @@
+import csv
+import json
+import cPickle
+import tempfile
+from util import isdict, istuple, lazy_import
+from batch import BatchState, flatten_columns, make_column, materialize_rows
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+np = lazy_import('numpy')
+
+
+def encode_default(o):
+    # only called for values json cannot encode itself, such as np.int64
+    # (np.float64 is a float subclass and is encoded directly)
+    if isinstance(o, np.generic):
+        return o.item()
+    elif isinstance(o, np.ndarray):
+        return o.tolist()
+    raise TypeError("%r is not JSON serializable" % (o,))
+
+
+def make_encoder():
+    return json.JSONEncoder(separators=(',', ':'), check_circular=False,
+                            default=encode_default)
+
+
+def column_name(path):
+    return '.'.join([str(k) for k in path])
+
+
+def flatten_sample(x, path=(), row=None):
+    """ Flatten a resolved sample into an OrderedDict mapping each leaf key
+        path to its value, like batch.flatten_columns does for columns
+    """
+    if row is None:
+        row = OrderedDict()
+
+    if isdict(x):
+        for k in sorted(x.keys()):
+            flatten_sample(x[k], path + (k,), row)
+    elif istuple(x) or isinstance(x, list):
+        for i, v in enumerate(x):
+            flatten_sample(v, path + (i,), row)
+    else:
+        row[path] = x
+
+    return row
+
+
+def csv_value(v):
+    # repr keeps full precision for floats, which str() rounds in Python 2
+    if isinstance(v, float):
+        return repr(float(v))
+    elif isinstance(v, unicode):
+        return v.encode('utf-8')
+    return v
+
+
+def iter_chunks(samples, chunk_size, vectorized):
+    """ Iterate over lists of samples, or over (batch result, size) pairs
+        from vectorized generation
+    """
+    if vectorized:
+        count = len(samples)
+        for start in xrange(0, count, chunk_size):
+            state = BatchState(samples.generators, start,
+                               min(start + chunk_size, count))
+            yield samples.plan.execute_batch(state), state.size
+        return
+
+    chunk = []
+    for sample in samples:
+        chunk.append(sample)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def encode_column(column, encode):
+    """ JSON encode each value of a column, a whole column at a time for
+        numeric dtypes
+    """
+    if column.dtype == bool:
+        return np.where(column, 'true', 'false').tolist()
+    elif column.dtype.kind in 'iu':
+        return map(str, column.tolist())
+    elif column.dtype.kind == 'f' and np.isfinite(column).all():
+        return map(float.__repr__, column.tolist())
+    return map(encode, column.tolist())
+
+
+def line_template(x, columns, encode):
+    """ A %-format template for the JSON encoding of a batch result, with a
+        %s for each column (which is appended to columns)
+    """
+    if isinstance(x, np.ndarray):
+        columns.append(x)
+        return '%s'
+    elif isdict(x):
+        return '{%s}' % ','.join([
+            '%s:%s' % (encode(k).replace('%', '%%'),
+                       line_template(v, columns, encode))
+            for k, v in x.items()])
+    elif istuple(x) or isinstance(x, list):
+        return '[%s]' % ','.join([line_template(v, columns, encode)
+                                  for v in x])
+    return encode(x).replace('%', '%%')
+
+
+def write_ndjson(chunks, fp, flush):
+    encode = make_encoder().encode
+    for chunk in chunks:
+        if istuple(chunk):
+            result, size = chunk
+            columns = []
+            template = line_template(result, columns, encode) + '\n'
+            encoded = [encode_column(c, encode) for c in columns]
+            if encoded:
+                lines = [template % row for row in zip(*encoded)]
+            else:
+                lines = [template % ()] * size
+        else:
+            lines = [encode(sample) + '\n' for sample in chunk]
+
+        fp.write(''.join(lines))
+        if flush:
+            fp.flush()
+
+
+def is_container(v):
+    return isdict(v) or istuple(v) or isinstance(v, list)
+
+
+def chunk_columns(chunk):
+    """ The columns of a chunk of samples (or of a vectorized chunk), by
+        leaf key path in the order they are first seen; samples without a
+        key path have None in its column
+    """
+    if istuple(chunk):
+        result, size = chunk
+        columns = flatten_columns(result, size)
+        # values holding dicts or sequences (such as choices among dicts)
+        # are flattened sample by sample, as they are without vectorization
+        if not any(column.dtype == object and
+                   any(is_container(v) for v in column)
+                   for column in columns.values()):
+            return columns
+        chunk = materialize_rows(result, size)
+    return flatten_rows(chunk)
+
+
+def flatten_rows(samples):
+    rows = [flatten_sample(sample) for sample in samples]
+    paths = OrderedDict()
+    for row in rows:
+        for path in row:
+            paths[path] = None
+    return OrderedDict([(path, make_column([row.get(path) for row in rows]))
+                        for path in paths])
+
+
+def write_csv(chunks, fp, flush):
+    # the header lists the key paths of every sample, so the rows are
+    # spooled to a temporary file until all of them are known
+    paths = OrderedDict()
+    with tempfile.TemporaryFile() as spool:
+        for chunk in chunks:
+            columns = chunk_columns(chunk)
+            for path in columns:
+                paths.setdefault(path, len(paths))
+            positions = [paths[path] for path in columns]
+            rows = zip(*[column.tolist() for column in columns.values()])
+            cPickle.dump((positions, rows), spool, cPickle.HIGHEST_PROTOCOL)
+
+        writer = csv.writer(fp)
+        writer.writerow([column_name(path) for path in paths])
+        spool.seek(0)
+        while True:
+            try:
+                positions, rows = cPickle.load(spool)
+            except EOFError:
+                break
+            lines = []
+            for row in rows:
+                line = [''] * len(paths)
+                for i, v in zip(positions, row):
+                    line[i] = csv_value(v)
+                lines.append(line)
+            writer.writerows(lines)
+            if flush:
+                fp.flush()
+
+
+def write_npz(chunks, fp):
+    columns = OrderedDict()
+    count = 0
+    for chunk in chunks:
+        chunk = chunk_columns(chunk)
+        size = len(chunk.values()[0]) if chunk else 0
+        for path, column in chunk.items():
+            if path not in columns:
+                # not in the samples before this chunk
+                columns[path] = [make_column([None] * count)] if count else []
+            columns[path].append(column)
+        for path, parts in columns.items():
+            if path not in chunk and size:
+                parts.append(make_column([None] * size))
+        count += size
+
+    np.savez(fp, **dict([(column_name(path), np.concatenate(parts))
+                         for path, parts in columns.items()]))
+
+
+def dump_samples(samples, fp, format='ndjson', chunk_size=10000,
+                 vectorized=False, flush=True):
+    """ Write samples to an open file as newline-delimited JSON, or as
+        columns in CSV ('csv') or NumPy ('npz') format.
+
+        `samples` is a JSONGenerator or any iterable of resolved samples.
+        Samples are encoded chunk_size at a time and each chunk is written
+        with a single write (and flushed, unless flush=False).  With
+        vectorized=True the samples of a JSONGenerator are generated with
+        JSONGenerator.batch, starting from its first sample.  CSV and NPZ
+        columns are named by their key paths joined with '.', e.g. 'c.d',
+        in the order they are first seen; samples without a key path have
+        an empty cell (None in NPZ) in its column.  CSV rows are written
+        once every sample has been generated.
+    """
+    if format not in ('ndjson', 'csv', 'npz'):
+        raise ValueError("Unknown output format: %s" % format)
+
+    chunks = iter_chunks(samples, chunk_size, vectorized)
+    if format == 'ndjson':
+        write_ndjson(chunks, fp, flush)
+    elif format == 'csv':
+        write_csv(chunks, fp, flush)
+    else:
+        write_npz(chunks, fp)
@@ -0,0 +1,31 @@
+from util import set_global_seed, set_rng_mode
+import binary
+
+# the generator each pool worker resolves its chunks from
+worker_generator = None
+
+
+def make_payload(generator):
+    # the binary encoding is smaller than a pickle, and carries no random
+    # streams
+    return binary.encode(generator.genson_dict), generator.incremental
+
+
+def init_worker(payload, global_seed, rng_mode):
+    global worker_generator
+    from genson import JSONGenerator
+    set_global_seed(global_seed)
+    set_rng_mode(rng_mode)
+    data, incremental = payload
+    worker_generator = JSONGenerator(binary.decode(data), incremental)
+
+
+def resolve_chunk(chunk):
+    start, stop = chunk
+    worker_generator.seek(start)
+    return [worker_generator.next() for _ in xrange(stop - start)]
+
+
+def make_chunks(count, chunk_size):
+    return [(start, min(start + chunk_size, count))
+            for start in xrange(0, count, chunk_size)]
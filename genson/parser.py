@@ -51,156 +51,37 @@ value
     null
 """
 
-from pyparsing import *
 from functions import *
-from references import ScopedReference
-import functions
-from warnings import warn
+from rdparser import RecursiveDescentParser
 
-try:
-    from collections import OrderedDict
-except ImportError:
-    print "Python 2.7+ OrderedDict collection not available"
-    try:
-        from ordereddict import OrderedDict
-        warn("Using backported OrderedDict implementation")
-    except ImportError:
-        raise ImportError("Backported OrderedDict implementation "
-                          "not available. To install it: "
-                          "'pip install -vUI ordereddict'")
 
-# a simple helper functions
-def make_genson_function(name, gen_args=[], gen_kwargs={}):
-
-    generator_class = functions.registry.get(name, None)
-    if generator_class is None:
-        raise Exception('Unknown generator class: %s' % name)
-
-    if type(gen_kwargs) is ParseResults:
-        gen_kwargs = gen_kwargs.asList()
-        gen_kwargs = gen_kwargs[0]
-        assert len(gen_kwargs) % 2 == 0
-        gen_kwargs = zip(gen_kwargs[::2], gen_kwargs[1::2])
-
-    gen_kwargs = dict(gen_kwargs)
-
-    g = generator_class(*gen_args, **gen_kwargs)
-
-    return g
-
-def dummy_token(name):
-    """  A allows for more sensible error reporting
+class GENSONParser:
+    """ Parses GenSON documents with one of two interchangeable backends:
+        'pyparsing' (the grammar in grammar.py) or 'recursive', a hand-written
+        recursive descent parser for the same grammar
     """
-    exception_token = NoMatch()
-    exception_token.setName("valid " + name)
-    return exception_token
-
-
-TRUE = Keyword("true").setParseAction( replaceWith(True) )
-FALSE = Keyword("false").setParseAction( replaceWith(False) )
-NULL = Keyword("null").setParseAction( replaceWith(None) )
-
-json_string = dblQuotedString.setParseAction( removeQuotes )
-json_number = Combine( Optional('-') + ( '0' | Word('123456789',nums) ) +
-                    Optional( '.' + Word(nums) ) +
-                    Optional( Word('eE',exact=1) + Word(nums+'+-',nums) ) )
-
-genson_key_tuple = Forward()
-genson_key = (dummy_token("key") | json_string | genson_key_tuple )
-genson_key_tuple << Suppress('(') + delimitedList( genson_key ) + \
-                         Suppress(')')
-genson_key_tuple.setParseAction(lambda x: tuple(x))
-
-genson_dict = Forward()
-genson_value = Forward()
-json_elements = delimitedList( genson_value )
-json_array = Group(Suppress('[') + Optional(json_elements) + Suppress(']') )
-
-genson_value_tuple = Suppress('(') + json_elements + Suppress(')')
-genson_value_tuple.setParseAction(lambda x: tuple(x))
-
-THIS = Keyword("this")
-PARENT = Keyword("parent")
-ROOT = Keyword("root")
-genson_initial_scope = (THIS | PARENT | ROOT)
-genson_unquoted_key = Word(alphanums + '_')
-genson_running_scope = ( PARENT | genson_unquoted_key )
-
-genson_ref =  genson_initial_scope + \
-                   Suppress('.') + \
-                   delimitedList(genson_running_scope, '.')
+    def __init__(self, backend='pyparsing'):
+        if backend not in ('pyparsing', 'recursive'):
+            raise ValueError("Unknown parser backend: %s" % backend)
+        self.backend = backend
+        self.grammar = None
 
-genson_ref.setParseAction(lambda x: ScopedReference(x.asList()))
+    def build_grammar(self):
+        if self.backend == 'recursive':
+            return RecursiveDescentParser()
 
+        # importing the grammar module builds the pyparsing grammar
+        import grammar
+        grammar.genson_object.enablePackrat()
+        return grammar.genson_object
 
-genson_kwargs = Group(delimitedList( Word(alphas + '_') + Suppress("=") + \
-                              genson_value ))
-genson_function =  Word(alphas + '_')("name") + \
-                    Suppress('(') + \
-                    Optional(json_elements)("args") + \
-                    Optional(Suppress(',')) +\
-                    Optional(genson_kwargs)("kwargs") + \
-                    Suppress(')')
-genson_function.setParseAction(lambda x: make_genson_function(x.name,
-                                                              x.args,
-                                                              x.kwargs))
-
-genson_grid_shorthand = Suppress("<") + \
-                       json_elements("args") + \
-                       Suppress(">")
-genson_grid_shorthand.setParseAction(lambda x: make_genson_function("grid",
-                                                                    x.args))
-
-genson_value << (genson_value_tuple | genson_function | \
-                genson_grid_shorthand | \
-                genson_ref | \
-                json_string | json_number | genson_dict | \
-                json_array | TRUE | FALSE | NULL )
-
-
-genson_expression = (dummy_token("value") | operatorPrecedence( genson_value,
-    [
-     (Literal('^'), 2, opAssoc.RIGHT,   lambda x: x[0][0] ** x[0][2]),
-     (Literal('-'), 1, opAssoc.RIGHT,    lambda x: -x[0][0]),
-     (Literal('+'), 1, opAssoc.RIGHT,    lambda x: x[0][0]),
-     (Literal('*'), 2, opAssoc.LEFT,     lambda x: x[0][0] * x[0][2]),
-     (Literal('/'), 2, opAssoc.LEFT,     lambda x: x[0][0] / x[0][2]),
-     (Literal('+'), 2, opAssoc.LEFT,     lambda x: x[0][0] + x[0][2]),
-     (Literal('-'), 2, opAssoc.LEFT,     lambda x: x[0][0] - x[0][2]),
-     ]
-    ) )
-
-member_def = Group( genson_key + Suppress(':') + genson_expression )
-json_members = delimitedList( member_def )
-empty_doc = Suppress('{') + Suppress('}')
-genson_dict << (Dict( Suppress('{') + json_members + Suppress('}') | empty_doc))
-
-genson_object = (genson_dict | json_array | genson_value_tuple)
-
-json_comment = cppStyleComment
-genson_object.ignore( json_comment )
-
-def clean_dict(x):
-    x_list = x.asList()
-    return OrderedDict(x_list)
-
-genson_dict.setParseAction(clean_dict)
-
-def convert_numbers(s,l,toks):
-    n = toks[0]
-    try:
-        return int(n)
-    except ValueError, ve:
-        return float(n)
-
-json_number.setParseAction( convert_numbers )
+    def parse_string(self, genson_string):
+        if self.grammar is None:
+            self.grammar = self.build_grammar()
 
-class GENSONParser:
-    def __init__(self):
-        self.grammar = genson_object
-        self.grammar.enablePackrat()
+        if self.backend == 'recursive':
+            return self.grammar.parse_string(genson_string)
 
-    def parse_string(self, genson_string):
         result = self.grammar.parseString(genson_string)
         return result.asList()[0]
 
@@ -0,0 +1,171 @@
+""" Counter-based random streams, for the 'counter' RNG mode (see
+    util.set_rng_mode).
+
+    Every value is computed from a key (the seed of a generator and its path
+    within the document) and a counter (the index of the sample being
+    resolved and the number of values the generator has drawn for it), with
+    the Philox4x32-10 block function (Salmon et al., "Parallel random
+    numbers: as easy as 1, 2, 3", SC 2011).  Any sample can therefore be
+    resolved on its own, in any order or process, at the cost of the first.
+"""
+import math
+import os
+import zlib
+from util import lazy_import
+
+np = lazy_import('numpy')
+
+PHILOX_M0 = 0xD2511F53
+PHILOX_M1 = 0xCD9E8D57
+PHILOX_W0 = 0x9E3779B9
+PHILOX_W1 = 0xBB67AE85
+MASK32 = 0xFFFFFFFF
+
+# the index of the sample being resolved, set by JSONGenerator, and a
+# token identifying the evaluation, which restarts every stream
+current_sample = 0
+current_evaluation = 0
+
+
+def set_current_sample(index):
+    """ Start evaluating sample number index; called for every
+        evaluation, so that resolving a sample again draws the same values
+    """
+    global current_sample, current_evaluation
+    current_sample = index
+    current_evaluation += 1
+
+
+def philox4x32(counters, key, rounds=10):
+    """ Apply Philox4x32 to an (n, 4) array of 32 bit counter words with a
+        pair of 32 bit key words, giving an (n, 4) array of random words
+    """
+    c0, c1, c2, c3 = [np.asarray(counters[:, i], dtype=np.uint64)
+                      for i in range(4)]
+    k0, k1 = key
+    for i in xrange(rounds):
+        if i:
+            k0 = (k0 + PHILOX_W0) & MASK32
+            k1 = (k1 + PHILOX_W1) & MASK32
+        p0 = c0 * np.uint64(PHILOX_M0)
+        p1 = c2 * np.uint64(PHILOX_M1)
+        c0, c1, c2, c3 = ((p1 >> np.uint64(32)) ^ c1 ^ np.uint64(k0),
+                          p1 & np.uint64(MASK32),
+                          (p0 >> np.uint64(32)) ^ c3 ^ np.uint64(k1),
+                          p0 & np.uint64(MASK32))
+    return np.column_stack([c0, c1, c2, c3])
+
+
+def stream_key(seed, path):
+    """ The Philox key of the stream of the generator at `path` """
+    seed = int(seed) & 0xFFFFFFFFFFFFFFFF
+    return (seed & MASK32,
+            (seed >> 32) ^ (zlib.crc32(path) & MASK32))
+
+
+def to_unit(hi, lo):
+    """ Doubles in [0, 1) from pairs of random words, as NumPy makes them """
+    return ((hi >> np.uint64(5)).astype(np.float64) * 67108864.0 +
+            (lo >> np.uint64(6)).astype(np.float64)) / 9007199254740992.0
+
+
+class CounterStream:
+    """ Stands in for the RandomState of a generator in 'counter' mode, with
+        the methods the generators draw with.  Each draw within a sample
+        takes the next counter, starting from 0 for every evaluation.
+    """
+    def __init__(self, seed, path):
+        if seed is None:
+            seed = int(os.urandom(8).encode('hex'), 16)
+        self.key = stream_key(seed, path)
+        self.rewind()
+
+    def rewind(self):
+        self.evaluation = None
+        self.sample = None
+        self.position = 0
+
+    def blocks(self, size):
+        if self.evaluation != current_evaluation:
+            self.evaluation = current_evaluation
+            self.sample = current_sample
+            self.position = 0
+        positions = np.arange(self.position, self.position + size,
+                              dtype=np.uint64)
+        self.position += size
+        return self.sample_blocks(np.uint64(self.sample), positions)
+
+    def sample_blocks(self, samples, positions):
+        counters = np.empty((len(positions), 4), dtype=np.uint64)
+        counters[:, 0] = samples & np.uint64(MASK32)
+        counters[:, 1] = samples >> np.uint64(32)
+        counters[:, 2] = positions & np.uint64(MASK32)
+        counters[:, 3] = positions >> np.uint64(32)
+        return philox4x32(counters, self.key)
+
+    def at(self, samples):
+        """ The first value of each of an array of samples, for batches """
+        return CounterBatch(self, samples)
+
+    def random_sample(self, size=None):
+        return shaped(uniform_values(self.blocks(count(size))), size)
+
+    def standard_normal(self, size=None):
+        return shaped(normal_values(self.blocks(count(size))), size)
+
+    def uniform(self, low=0.0, high=1.0, size=None):
+        return low + (high - low) * self.random_sample(size)
+
+    def normal(self, loc=0.0, scale=1.0, size=None):
+        return loc + scale * self.standard_normal(size)
+
+    def randint(self, n, size=None):
+        return shaped(integer_values(self.blocks(count(size)), n), size)
+
+
+class CounterBatch:
+    """ The values a CounterStream draws first for each of a set of samples
+    """
+    def __init__(self, stream, samples):
+        self.stream = stream
+        self.samples = np.asarray(samples, dtype=np.uint64)
+
+    def blocks(self):
+        return self.stream.sample_blocks(
+            self.samples, np.zeros(len(self.samples), dtype=np.uint64))
+
+    def random_sample(self, size):
+        return uniform_values(self.blocks())
+
+    def standard_normal(self, size):
+        return normal_values(self.blocks())
+
+    def randint(self, n, size):
+        return integer_values(self.blocks(), n)
+
+
+def count(size):
+    if size is None:
+        return 1
+    return int(np.prod(size))
+
+
+def shaped(values, size):
+    if size is None:
+        return values[0]
+    return values.reshape(size)
+
+
+def uniform_values(blocks):
+    return to_unit(blocks[:, 0], blocks[:, 1])
+
+
+def normal_values(blocks):
+    # Box-Muller, from the two doubles of each block
+    u = 1.0 - to_unit(blocks[:, 0], blocks[:, 1])
+    v = to_unit(blocks[:, 2], blocks[:, 3])
+    return np.sqrt(-2.0 * np.log(u)) * np.cos(2 * math.pi * v)
+
+
+def integer_values(blocks, n):
+    return np.floor(uniform_values(blocks) * n).astype(np.int64)
@@ -0,0 +1,404 @@
+import sys
+import copy
+from util import resolve, isdict, istuple, isgensonevaluable, is_constant, \
+    walk
+from functions import ParameterGenerator
+from references import ScopedReference, check_references
+from schedule import Schedule
+from optimize import Optimizer
+from batch import resolve_batch, splat_batch
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+# leaf types that resolve() hands back untouched; anything of these types can
+# be shared between samples
+scalar_types = (type(None), bool, int, long, float, complex, str, unicode)
+
+
+def splat(return_dict, keys, val, context):
+    """ Assign a resolved value to a tuple of keys, exactly as resolve() does
+    """
+    if istuple(val):
+        if len(keys) != len(val):
+            raise Exception("Invalid splat")
+
+        for (splat_key, splat_val) in zip(keys, val):
+            return_dict[splat_key] = resolve(splat_val, context)
+    else:
+        for splat_key in keys:
+            return_dict[splat_key] = resolve(val, context)
+
+
+def make_copier(value):
+    """ Build a function that copies a resolved value, or return None if the
+        value is immutable and can be shared between samples
+    """
+    if isdict(value):
+        dict_type = type(value)
+        copiers = [(k, make_copier(v)) for k, v in value.items()]
+        copiers = [(k, c) for k, c in copiers if c is not None]
+        if not copiers:
+            return dict_type
+
+        def copy_dict(d):
+            d = dict_type(d)
+            for k, c in copiers:
+                d[k] = c(d[k])
+            return d
+        return copy_dict
+
+    elif istuple(value) or isinstance(value, list):
+        copiers = [make_copier(v) for v in value]
+        if not any(copiers):
+            if istuple(value):
+                return None
+            return list
+
+        copiers = [c or (lambda v: v) for c in copiers]
+        seq_type = type(value)
+
+        def copy_seq(s):
+            return seq_type([c(v) for c, v in zip(copiers, s)])
+        return copy_seq
+
+    elif 'numpy' in sys.modules and \
+            isinstance(value, sys.modules['numpy'].ndarray):
+        return lambda a: a.copy()
+
+    else:
+        return None
+
+
+def read_only(*args, **kwargs):
+    raise TypeError("Samples of incremental generators share their values "
+                    "with other samples and cannot be changed; change a copy "
+                    "(copy.deepcopy) instead")
+
+
+class FrozenDict(dict):
+    """ A dict shared between incremental samples, which cannot be changed
+        (copy.deepcopy gives a plain copy)
+    """
+    __slots__ = ()
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = \
+        update = read_only
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+    def __deepcopy__(self, memo):
+        return dict([(k, copy.deepcopy(v, memo)) for k, v in self.items()])
+
+
+class FrozenList(list):
+    """ A list shared between incremental samples, which cannot be changed
+        (copy.deepcopy gives a plain copy)
+    """
+    __slots__ = ()
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = __iadd__ = \
+        __imul__ = append = extend = insert = pop = remove = reverse = \
+        sort = read_only
+
+    def __reduce__(self):
+        return FrozenList, (list(self),)
+
+    def __deepcopy__(self, memo):
+        return [copy.deepcopy(v, memo) for v in self]
+
+
+def freeze(x):
+    """ A resolved value, with its dicts and lists made read-only """
+    if type(x) in scalar_types:
+        return x
+    elif isdict(x):
+        return FrozenDict([(k, freeze(v)) for k, v in x.items()])
+    elif istuple(x):
+        return type(x)([freeze(v) for v in x])
+    elif isinstance(x, list):
+        return FrozenList([freeze(v) for v in x])
+    elif 'numpy' in sys.modules and \
+            isinstance(x, sys.modules['numpy'].ndarray):
+        x = x.view()
+        x.flags.writeable = False
+    return x
+
+
+class Constant:
+    """ A constant leaf or folded immutable subtree """
+    def __init__(self, value):
+        self.value = value
+
+    def run(self, context):
+        return self.value
+
+
+class ConstantCopy:
+    """ A folded constant subtree containing mutable containers, which is
+        copied (never re-resolved) for every sample
+    """
+    def __init__(self, value, copier):
+        self.value = value
+        self.copier = copier
+
+    def run(self, context):
+        return self.copier(self.value)
+
+
+class Evaluate:
+    """ A dynamic slot: a generator, reference, function or expression """
+    def __init__(self, node):
+        self.node = node
+        self.evaluate = node.__genson_eval__
+
+    def run(self, context):
+        value = self.evaluate(context)
+        if type(value) in scalar_types:
+            return value
+        return resolve(value, context)
+
+
+class DictStep:
+    def __init__(self, members):
+        # members is a list of (key, step, is_splat) triples
+        self.members = members
+
+    def run(self, context):
+        return_dict = {}
+        context.append(return_dict)
+
+        for key, step, is_splat in self.members:
+            val = step.run(context)
+            if is_splat:
+                splat(return_dict, key, val, context)
+            else:
+                return_dict[key] = val
+
+        context.pop()
+        return return_dict
+
+
+class SequenceStep:
+    def __init__(self, steps, seq_type):
+        self.steps = steps
+        self.seq_type = seq_type
+
+    def run(self, context):
+        return self.seq_type([s.run(context) for s in self.steps])
+
+
+class Plan:
+    """ A GenSON document compiled into pre-typed evaluation steps.
+
+        Constant subtrees are resolved once at compile time and shared (or
+        cheaply copied, if they contain mutable containers), so that
+        executing the plan only touches the dynamic slots of the document.
+        Expressions are constant folded and common sub-expressions are
+        evaluated once per sample (see Optimizer).
+        The members of a dict document are evaluated in the order of its
+        Schedule, into dicts created up front; other documents are
+        evaluated in order.  Generator and reference slots are indexed in
+        document order.
+    """
+    def __init__(self, genson_dict):
+        self.genson_dict = genson_dict
+        self.generator_slots = []
+        self.reference_slots = []
+        self.optimizer = Optimizer()
+
+        if isdict(genson_dict):
+            self.schedule = Schedule(genson_dict)
+            frames = self.schedule.frames
+            for m in self.schedule.members:
+                self.optimizer.count(m.value, frames[m.frame])
+
+            steps = []
+            # the member holding each generator slot
+            self.slot_members = []
+            for m in self.schedule.members:
+                steps.append(self.compile(m.value, frames[m.frame]))
+                self.slot_members.extend(
+                    [m.index] * (len(self.generator_slots) -
+                                 len(self.slot_members)))
+
+            self.steps = [(m.frame, m.key, istuple(m.key), steps[m.index])
+                          for m in self.schedule.order]
+            self.incremental = None
+        else:
+            check_references(genson_dict)
+            self.schedule = None
+            self.optimizer.count(genson_dict, None)
+            self.root = self.compile(genson_dict)
+
+    def compile(self, x, frames=None):
+        """ Compile a value evaluated within the given schedule frames (None
+            if they are not known statically)
+        """
+        x = self.optimizer.rewrite(x, frames)
+
+        if is_constant(x):
+            value = resolve(x, [])
+            copier = make_copier(value)
+            if copier is None:
+                return Constant(value)
+            return ConstantCopy(value, copier)
+
+        elif isgensonevaluable(x):
+            if isinstance(x, ParameterGenerator):
+                self.generator_slots.append(x)
+            elif isinstance(x, ScopedReference):
+                self.reference_slots.append(x)
+            return Evaluate(x)
+
+        elif isdict(x):
+            return DictStep([(k, self.compile(v), istuple(k))
+                             for k, v in x.items()])
+
+        elif istuple(x):
+            return SequenceStep([self.compile(v, frames) for v in x], tuple)
+
+        else:
+            return SequenceStep([self.compile(v, frames) for v in x], list)
+
+    def frame_contexts(self, dict_type):
+        """ Create the dicts of a new sample, and the context stack of each
+        """
+        containers = [dict_type() for _ in self.schedule.frames]
+        if dict_type is OrderedDict:
+            # fix the key order to the document order
+            for container, layout in zip(containers, self.schedule.layouts):
+                for key in layout:
+                    container[key] = None
+
+        for parent, key, child in self.schedule.links:
+            containers[parent][key] = containers[child]
+
+        return [[containers[i] for i in frames]
+                for frames in self.schedule.frames]
+
+    def execute(self):
+        self.optimizer.memo.clear()
+        if self.schedule is None:
+            return self.root.run([])
+
+        contexts = self.frame_contexts(dict)
+        self.run_steps(self.steps, contexts)
+        return contexts[0][0]
+
+    def run_steps(self, steps, contexts):
+        for frame, key, is_splat, step in steps:
+            context = contexts[frame]
+            val = step.run(context)
+            if is_splat:
+                splat(context[-1], key, val, context)
+            else:
+                context[-1][key] = val
+
+    def prepare_incremental(self):
+        schedule = self.schedule
+        dependents = dict([(m.index, []) for m in schedule.members])
+        for m in schedule.members:
+            for d in m.depends:
+                dependents[d].append(m.index)
+
+        def affected(seeds):
+            # the seed members and every member depending on them
+            found = set(seeds)
+            stack = list(seeds)
+            while stack:
+                for j in dependents[stack.pop()]:
+                    if j not in found:
+                        found.add(j)
+                        stack.append(j)
+            return found
+
+        volatile = [m.index for m in schedule.members
+                    if any(getattr(node, 'stochastic', False)
+                           for node in walk(m.value))]
+        grid_slots = [(g, affected([i]))
+                      for g, i in zip(self.generator_slots, self.slot_members)
+                      if not g.stochastic]
+
+        steps = dict([(m.index, step)
+                      for m, step in zip(schedule.order, self.steps)])
+        position = dict([(m.index, i) for i, m in enumerate(schedule.order)])
+        self.children = dict([(f, []) for f in xrange(len(schedule.frames))])
+        for parent, key, child in schedule.links:
+            self.children[parent].append((key, child))
+
+        self.incremental = (affected(volatile), grid_slots, steps, position)
+        self.last_contexts = None
+        self.last_counters = None
+
+    def execute_incremental(self):
+        """ Like execute(), but re-evaluating only the members affected
+            since the previous call: those holding random generators, those
+            holding grid generators whose counter moved, and the members
+            referring to them.
+
+            Every other member value is shared with the previous sample.
+            The dicts of the document's frames are new for every sample,
+            but the dicts and lists within member values are read-only
+            (see FrozenDict and FrozenList), so that changing a sample
+            cannot affect later ones.  Impure functions are re-evaluated
+            like random generators.
+        """
+        if self.schedule is None:
+            return self.execute()
+        if self.incremental is None:
+            self.prepare_incremental()
+        self.optimizer.memo.clear()
+
+        volatile, grid_slots, steps, position = self.incremental
+        counters = [g.counter for g, members in grid_slots]
+
+        if self.last_contexts is None:
+            # the frames are kept between samples, and copied to return them
+            contexts = self.frame_contexts(dict)
+            dirty = [m.index for m in self.schedule.order]
+        else:
+            contexts = self.last_contexts
+            dirty = set(volatile)
+            for (g, members), counter, last in zip(grid_slots, counters,
+                                                   self.last_counters):
+                if counter != last:
+                    dirty.update(members)
+            dirty = sorted(dirty, key=position.get)
+
+        self.run_steps([steps[i] for i in dirty], contexts)
+        for i in dirty:
+            m = self.schedule.members[i]
+            container = contexts[m.frame][-1]
+            for key in (m.key if istuple(m.key) else (m.key,)):
+                container[key] = freeze(container[key])
+
+        self.last_contexts = contexts
+        self.last_counters = counters
+        return self.copy_frame([context[-1] for context in contexts], 0)
+
+    def copy_frame(self, containers, f):
+        """ A copy of the dict of frame f and of the frames within it """
+        d = dict(containers[f])
+        for key, child in self.children[f]:
+            d[key] = self.copy_frame(containers, child)
+        return d
+
+    def execute_batch(self, batch):
+        """ Evaluate the document for a BatchState, in the same order as
+            execute()
+        """
+        if self.schedule is None:
+            return resolve_batch(self.genson_dict, [], batch)
+
+        contexts = self.frame_contexts(OrderedDict)
+        for m in self.schedule.order:
+            context = contexts[m.frame]
+            val = resolve_batch(m.value, context, batch)
+            if istuple(m.key):
+                splat_batch(context[-1], m.key, val, batch)
+            else:
+                context[-1][m.key] = val
+
+        return contexts[0][0]
@@ -0,0 +1,138 @@
+""" Opt-in instrumentation of sampling (see JSONGenerator.enable_profiling)
+"""
+import time
+from util import walk
+from functions import ParameterGenerator, function_caches
+from cache import get_parse_cache
+
+
+class TimedStep:
+    """ A plan step recording its calls and evaluation time """
+    def __init__(self, step, stats):
+        self.step = step
+        self.stats = stats
+
+    def run(self, context):
+        start = time.time()
+        value = self.step.run(context)
+        self.stats[0] += 1
+        self.stats[1] += time.time() - start
+        return value
+
+
+class CountingStream:
+    """ Stands in for the random stream of a generator, counting the calls
+        drawing from it
+    """
+    def __init__(self, stream, counts, path):
+        self.stream = stream
+        self.counts = counts
+        self.path = path
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        attr = getattr(self.stream, name)
+        if not callable(attr) or name in ('get_state', 'set_state',
+                                          'rewind'):
+            return attr
+
+        def draw(*args, **kwargs):
+            self.counts[self.path] = self.counts.get(self.path, 0) + 1
+            return attr(*args, **kwargs)
+        return draw
+
+
+class Profile:
+    """ Evaluation statistics of a JSONGenerator: the calls and time spent
+        in each member of the document (by key path), the draws from the
+        random stream of each generator (by its path, see
+        label_generators), the time spent parsing and the parse and
+        function cache statistics.
+
+        Only serial sampling (next(), evaluate() and iteration) is timed.
+    """
+    def __init__(self, parse_seconds=None):
+        self.parse_seconds = parse_seconds
+        self.samples = 0
+        self.sample_seconds = 0.0
+        self.members = {}       # key path -> [calls, seconds]
+        self.draws = {}         # generator path -> draws
+        self.generators = []
+
+    def instrument(self, plan, genson_dict):
+        """ Time the steps of a plan, and count the draws of the random
+            generators of its document
+        """
+        if plan.schedule is None:
+            plan.root = TimedStep(plan.root, self.members.setdefault(
+                '', [0, 0.0]))
+        else:
+            names = [plan.schedule.member_name(m) for m in plan.schedule.order]
+            plan.steps = [(frame, key, is_splat,
+                           TimedStep(step, self.members.setdefault(
+                               name, [0, 0.0])))
+                          for (frame, key, is_splat, step), name
+                          in zip(plan.steps, names)]
+            plan.incremental = None
+
+        self.generators = [g for g in walk(genson_dict)
+                           if isinstance(g, ParameterGenerator) and
+                           g.stochastic]
+
+    def sample(self, evaluate):
+        for g in self.generators:
+            # generators reseeded since the last sample have a new stream
+            if not isinstance(g.random, CountingStream):
+                g.random = CountingStream(g.random, self.draws, g.path)
+
+        start = time.time()
+        value = evaluate()
+        self.sample_seconds += time.time() - start
+        self.samples += 1
+        return value
+
+    def report(self):
+        """ The statistics as a dict, with the members taking the most time
+            first
+        """
+        members = [{'path': path, 'calls': calls, 'seconds': seconds}
+                   for path, (calls, seconds) in self.members.items()]
+        members.sort(key=lambda m: m['seconds'], reverse=True)
+
+        cache = get_parse_cache()
+        if cache is not None:
+            cache = {'hits': cache.hits, 'disk_hits': cache.disk_hits,
+                     'misses': cache.misses}
+        return {'samples': self.samples,
+                'sample_seconds': self.sample_seconds,
+                'parse_seconds': self.parse_seconds,
+                'parse_cache': cache,
+                'members': members,
+                'draws': dict(self.draws),
+                'functions': dict([(name, f.info())
+                                   for name, f in function_caches.items()])}
+
+    def format_report(self, top=20):
+        """ The report as text, listing the top members by time """
+        report = self.report()
+        lines = ["%d samples in %.3f s" % (report['samples'],
+                                           report['sample_seconds'])]
+        if report['parse_seconds'] is not None:
+            lines.append("parsed in %.3f s" % report['parse_seconds'])
+        if report['parse_cache'] is not None:
+            lines.append("parse cache: %(hits)d hits, %(disk_hits)d disk "
+                         "hits, %(misses)d misses" % report['parse_cache'])
+
+        lines.append("%10s %10s  %s" % ("seconds", "calls", "member"))
+        for m in report['members'][:top]:
+            lines.append("%10.4f %10d  %s" % (m['seconds'], m['calls'],
+                                              m['path']))
+        if report['draws']:
+            lines.append("%10s  %s" % ("draws", "generator"))
+            for path, draws in sorted(report['draws'].items()):
+                lines.append("%10d  %s" % (draws, path))
+        for name, info in sorted(report['functions'].items()):
+            lines.append("function %s: %d hits, %d misses"
+                         % (name, info['hits'], info['misses']))
+        return "\n".join(lines)
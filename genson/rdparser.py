@@ -0,0 +1,312 @@
+""" A hand-written recursive descent parser for GenSON.
+
+    This accepts the same language as the pyparsing grammar in parser.py
+    (see genson_bnf there) and builds identical documents, including its
+    operator precedence levels: '^' (right associative), unary '-', unary '+',
+    then the left associative binary '*', '/', '+' and '-', each binding
+    tighter than the next.  As with pyparsing, anything after the first
+    complete object is ignored.
+"""
+import re
+import operator
+from functions import registry_call
+from references import ScopedReference
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+IGNORED = re.compile(r'(?:\s+|//(?:\\\n|[^\n])*|/\*(?:[^*]|\*(?!/))*\*/)*')
+STRING = re.compile(r'"(?:[^"\n\r\\]|(?:"")|(?:\\(?:[^x]|x[0-9a-fA-F]+)))*"')
+NUMBER = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][0-9+-][0-9]*)?')
+NAME = re.compile(r'[A-Za-z_]+')
+KEY_WORD = re.compile(r'[A-Za-z0-9_]+')
+IDENT_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz'
+                        'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$')
+
+CONSTANTS = {'true': True, 'false': False, 'null': None}
+SCOPES = ('this', 'parent', 'root')
+
+# (operator, kind, function) from the tightest binding level to the loosest
+LEVELS = [('^', 'right', operator.pow),
+          ('-', 'unary', operator.neg),
+          ('+', 'unary', operator.pos),
+          ('*', 'left', operator.mul),
+          ('/', 'left', operator.div),
+          ('+', 'left', operator.add),
+          ('-', 'left', operator.sub)]
+
+
+class GenSONSyntaxError(Exception):
+    def __init__(self, text, pos, expected):
+        self.pos = pos
+        self.lineno = text.count('\n', 0, pos) + 1
+        self.col = pos - text.rfind('\n', 0, pos)
+        Exception.__init__(self, "Expected %s (at char %d), (line:%d, col:%d)"
+                           % (expected, pos, self.lineno, self.col))
+
+
+class NoMatch(Exception):
+    pass
+
+
+class RecursiveDescentParser:
+    def parse_string(self, genson_string):
+        self.text = genson_string
+        self.pos = 0
+        self.furthest = (0, 'a GenSON object')
+
+        try:
+            return self.parse_object()
+        except NoMatch:
+            pos, expected = self.furthest
+            raise GenSONSyntaxError(self.text, pos, expected)
+
+    # -- scanning helpers
+
+    def fail(self, expected):
+        if self.pos >= self.furthest[0]:
+            self.furthest = (self.pos, expected)
+        raise NoMatch()
+
+    def skip(self):
+        self.pos = IGNORED.match(self.text, self.pos).end()
+
+    def peek(self):
+        self.skip()
+        return self.text[self.pos:self.pos + 1]
+
+    def expect(self, literal):
+        if self.peek() != literal:
+            self.fail('"%s"' % literal)
+        self.pos += 1
+
+    def accept(self, literal):
+        if self.peek() == literal:
+            self.pos += 1
+            return True
+        return False
+
+    def match(self, pattern, expected):
+        self.skip()
+        m = pattern.match(self.text, self.pos)
+        if m is None:
+            self.fail(expected)
+        self.pos = m.end()
+        return m.group()
+
+    def keyword(self, word):
+        end = self.pos + len(word)
+        return self.text.startswith(word, self.pos) and \
+            self.text[end:end + 1] not in IDENT_CHARS
+
+    def attempt(self, parse):
+        """ Run a parse method, restoring the position if it fails """
+        start = self.pos
+        try:
+            return True, parse()
+        except NoMatch:
+            self.pos = start
+            return False, None
+
+    def delimited(self, parse):
+        """ One or more items separated by commas, stopping before a comma
+            that is not followed by another item
+        """
+        items = [parse()]
+        while True:
+            start = self.pos
+            if not self.accept(','):
+                return items
+            matched, item = self.attempt(parse)
+            if not matched:
+                self.pos = start
+                return items
+            items.append(item)
+
+    # -- grammar
+
+    def parse_object(self):
+        c = self.peek()
+        if c == '{':
+            return self.parse_dict()
+        elif c == '[':
+            return self.parse_array()
+        elif c == '(':
+            return self.parse_value_tuple()
+        self.fail('a GenSON object')
+
+    def parse_dict(self):
+        self.expect('{')
+        if self.accept('}'):
+            return OrderedDict()
+        members = self.delimited(self.parse_member)
+        self.expect('}')
+        return OrderedDict(members)
+
+    def parse_member(self):
+        key = self.parse_key()
+        self.expect(':')
+        return (key, self.parse_expression())
+
+    def parse_key(self):
+        if self.peek() == '(':
+            self.pos += 1
+            keys = self.delimited(self.parse_key)
+            self.expect(')')
+            return tuple(keys)
+        return self.parse_quoted()
+
+    def parse_array(self):
+        self.expect('[')
+        if self.accept(']'):
+            return []
+        elements = self.delimited(self.parse_value)
+        self.expect(']')
+        return elements
+
+    def parse_value_tuple(self):
+        self.expect('(')
+        elements = self.delimited(self.parse_value)
+        self.expect(')')
+        return tuple(elements)
+
+    def parse_quoted(self):
+        return self.match(STRING, 'string enclosed in double quotes')[1:-1]
+
+    def parse_number(self):
+        n = self.match(NUMBER, 'a number')
+        try:
+            return int(n)
+        except ValueError:
+            return float(n)
+
+    def parse_value(self):
+        c = self.peek()
+        if c == '(':
+            return self.parse_value_tuple()
+        elif c == '<':
+            return self.parse_grid()
+        elif c == '"':
+            return self.parse_quoted()
+        elif c == '-' or c.isdigit():
+            return self.parse_number()
+        elif c == '{':
+            return self.parse_dict()
+        elif c == '[':
+            return self.parse_array()
+        elif c and c in IDENT_CHARS:
+            return self.parse_word()
+        self.fail('a value')
+
+    def parse_word(self):
+        start = self.pos
+        m = NAME.match(self.text, self.pos)
+        if m is not None:
+            self.pos = m.end()
+            if self.peek() == '(':
+                return self.parse_call(m.group())
+
+        self.pos = start
+        for scope in SCOPES:
+            if self.keyword(scope):
+                return self.parse_reference(scope)
+        for word, value in CONSTANTS.items():
+            if self.keyword(word):
+                self.pos += len(word)
+                return value
+        self.fail('a value')
+
+    def parse_call(self, name):
+        self.expect('(')
+        args = []
+        if self.peek() != ')':
+            matched, elements = self.attempt(
+                lambda: self.delimited(self.parse_value))
+            if matched:
+                args = elements
+        self.accept(',')
+
+        kwargs = []
+        if self.peek() != ')':
+            matched, pairs = self.attempt(
+                lambda: self.delimited(self.parse_kwarg))
+            if matched:
+                kwargs = pairs
+        self.expect(')')
+        return registry_call(name, args, kwargs)
+
+    def parse_kwarg(self):
+        name = self.match(NAME, 'a keyword argument')
+        self.expect('=')
+        return (name, self.parse_value())
+
+    def parse_reference(self, scope):
+        self.pos += len(scope)
+        scope_list = [scope]
+        self.expect('.')
+        scope_list.append(self.match(KEY_WORD, 'a reference key'))
+        while True:
+            start = self.pos
+            if not self.accept('.'):
+                break
+            matched, key = self.attempt(
+                lambda: self.match(KEY_WORD, 'a reference key'))
+            if not matched:
+                self.pos = start
+                break
+            scope_list.append(key)
+        return ScopedReference(scope_list)
+
+    def parse_grid(self):
+        self.expect('<')
+        elements = self.delimited(self.parse_value)
+        self.expect('>')
+        return registry_call('grid', elements)
+
+    # -- expressions
+
+    def parse_expression(self, level=len(LEVELS) - 1):
+        if level < 0:
+            return self.parse_operand()
+
+        op, kind, fun = LEVELS[level]
+        if kind == 'unary':
+            if self.peek() == op:
+                start = self.pos
+                self.pos += 1
+                matched, operand = self.attempt(
+                    lambda: self.parse_expression(level))
+                if matched:
+                    return fun(operand)
+                self.pos = start
+            return self.parse_expression(level - 1)
+
+        result = self.parse_expression(level - 1)
+        while self.peek() == op:
+            start = self.pos
+            self.pos += 1
+            if kind == 'right':
+                matched, operand = self.attempt(
+                    lambda: self.parse_expression(level))
+            else:
+                matched, operand = self.attempt(
+                    lambda: self.parse_expression(level - 1))
+            if not matched:
+                self.pos = start
+                break
+            result = fun(result, operand)
+            if kind == 'right':
+                break
+        return result
+
+    def parse_operand(self):
+        matched, value = self.attempt(self.parse_value)
+        if matched:
+            return value
+
+        self.expect('(')
+        value = self.parse_expression()
+        self.expect(')')
+        return value
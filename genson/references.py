@@ -1,60 +1,144 @@
 from internal_ops import GenSONOperand
-from util import resolve, isdict, genson_dumps
-import copy
+from util import isdict, istuple, isiterable, isgensonevaluable, \
+    genson_children
 
-def resolve_scoped_reference(ref, context):
-    """ Given a reference scope in list format (e.g. ['this', 'key1', 'key2']),
-        and a context stack (list of nested dictionary references), resolve
-        the reference and return the value
-    """
-
-
-    if len(context) == 0:
-        # TODO: better
-        raise Exception("Invalid reference")
-
-    # pop an element off of the scope list
-    element_to_resolve = ref.pop(0)
-
-    if( element_to_resolve == 'root'):
-        return resolve_scoped_reference(ref, [context[0]])
 
-    if( element_to_resolve == 'parent'):
-        return resolve_scoped_reference(ref, context[0:-1])
+class GenSONReferenceError(Exception):
+    pass
 
-    if( element_to_resolve == 'this'):
-        return resolve_scoped_reference(ref, context)
-
-    current_context = context[-1]
 
+def normalize_scope(scope_list):
+    """ Reduce a reference scope in list format (e.g. ['this', 'parent',
+        'key1', 'key2']) to (from_root, up, keys): the frame it starts from,
+        either the root or `up` frames above the current one, and the keys
+        to look up from there
+    """
+    from_root = False
+    up = 0
+    keys = []
+
+    for element in scope_list:
+        if element == 'root':
+            from_root, up, keys = True, 0, []
+        elif element == 'parent':
+            if keys:
+                keys.pop()
+            elif from_root:
+                raise GenSONReferenceError("Invalid reference: %s refers "
+                                           "above the root"
+                                           % ".".join(scope_list))
+            else:
+                up += 1
+        elif element != 'this':
+            keys.append(element)
+
+    if not scope_list or scope_list[-1] in ('this', 'parent', 'root'):
+        raise GenSONReferenceError("Invalid reference: %s does not end with "
+                                   "a key" % ".".join(scope_list))
+
+    return from_root, up, keys
+
+
+def splat_members(d):
+    """ The members a dict will have once resolved, mapped to their
+        unresolved values
+    """
+    members = {}
+    for k, v in d.items():
+        if istuple(k):
+            if istuple(v) and len(v) == len(k):
+                members.update(zip(k, v))
+            else:
+                members.update([(splat_key, v) for splat_key in k])
+        else:
+            members[k] = v
+    return members
+
+
+def check_references(x, frames=None):
+    """ Check every reference in a document against the members defined
+        before it, following the order in which resolve() builds each dict.
+
+        frames holds, for each dict being built, its members defined so far.
+        References into values only known at sample time (such as a member
+        holding a generator) are checked as far as possible here, and fully
+        when they are evaluated.
+    """
+    if frames is None:
+        frames = []
+
+    if isinstance(x, ScopedReference):
+        x.check(frames)
+    elif isgensonevaluable(x):
+        for child in genson_children(x):
+            check_references(child, frames)
+    elif isdict(x):
+        members = {}
+        frames.append(members)
+        for k, v in x.items():
+            check_references(v, frames)
+            members.update(splat_members({k: v}))
+        frames.pop()
+    elif isiterable(x):
+        for v in x:
+            check_references(v, frames)
 
-    if not isdict(current_context):
-        raise Exception("Invalid reference")
 
-    if not element_to_resolve in current_context:
-        # TODO: make better
-        raise Exception("Unknown key: %s" % element_to_resolve)
+class ScopedReference (GenSONOperand):
+    __slots__ = ('scope_list', 'from_root', 'up', 'keys')
 
-    resolved_element = current_context[element_to_resolve]
+    def __init__(self, scope_list):
+        self.scope_list = scope_list
+        self.from_root, self.up, self.keys = normalize_scope(scope_list)
+
+    def frame_index(self, depth):
+        if self.from_root:
+            index = 0
+        else:
+            index = depth - 1 - self.up
+
+        if depth == 0 or index < 0:
+            raise GenSONReferenceError("Invalid reference: %s refers above "
+                                       "the root" % self)
+        return index
+
+    def check(self, frames):
+        value = frames[self.frame_index(len(frames))]
+        for key in self.keys:
+            if isgensonevaluable(value):
+                return
+            if not isdict(value):
+                raise GenSONReferenceError("Invalid reference: %s does not "
+                                           "refer to an object member" % self)
+            if key not in value:
+                raise GenSONReferenceError(
+                    "Unknown key: %s in %s (references can only refer to "
+                    "members defined earlier in the document)" % (key, self))
+            value = value[key]
+            if isdict(value):
+                value = splat_members(value)
 
-    if len(ref) != 0:
-        context.append(resolved_element)
-        return resolve_scoped_reference(ref, context)
+    def __genson_eval__(self, context):
+        value = context[self.frame_index(len(context))]
+        try:
+            for key in self.keys:
+                value = value[key]
+        except (KeyError, TypeError, IndexError):
+            raise GenSONReferenceError("Unknown key: %s in %s" % (key, self))
+        return value
 
-    return resolved_element
+    def __genson_batch__(self, context, batch):
+        return self.__genson_eval__(context)
 
+    def __genson_children__(self):
+        return ()
 
-class ScopedReference (GenSONOperand):
-    def __init__(self, scope_list):
-        self.scope_list = scope_list
+    def __genson_write__(self, writer, depth=0):
+        writer.write(".".join(self.scope_list))
 
-    def __genson_eval__(self, context):
-        return resolve_scoped_reference( copy.deepcopy(self.scope_list),
-                                         copy.copy(context) )
-    
-    def __genson_repr__(self, pretty_print=False, depth=0):
+    def __str__(self):
         return ".".join(self.scope_list)
 
 def ref(ref_str):
     "A helper to convert a genson ref string into a SopeReference object"
-    return ScopedReference(ref_str.split('.'))
\ No newline at end of file
+    return ScopedReference(ref_str.split('.'))
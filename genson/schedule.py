@@ -0,0 +1,171 @@
+import heapq
+from util import isdict, istuple, isiterable, isgensonevaluable, \
+    genson_children, is_constant
+from references import ScopedReference, GenSONReferenceError, splat_members
+
+
+class Member:
+    """ A unit of evaluation: one member of one of the nested dicts of a
+        document, whose value is not itself expanded into a frame
+    """
+    def __init__(self, index, frame, key, value):
+        self.index = index
+        self.frame = frame
+        self.key = key
+        self.value = value
+        self.depends = set()
+
+
+def collect_references(x, depth, frames, found):
+    """ Find the references within a member value that refer to the frames
+        of the enclosing document (depth of them).  References to dicts
+        nested within the value itself are checked against the in-order
+        rule, as resolve() builds those dicts member by member.
+    """
+    if isinstance(x, ScopedReference):
+        index = x.frame_index(depth + len(frames))
+        if index < depth:
+            found.append((x, index))
+        else:
+            x.check([None] * depth + frames)
+    elif isgensonevaluable(x):
+        for child in genson_children(x):
+            collect_references(child, depth, frames, found)
+    elif isdict(x):
+        members = {}
+        frames.append(members)
+        for k, v in x.items():
+            collect_references(v, depth, frames, found)
+            members.update(splat_members({k: v}))
+        frames.pop()
+    elif isiterable(x):
+        for v in x:
+            collect_references(v, depth, frames, found)
+
+
+def check_keys(value, keys, ref):
+    """ Check the keys of a reference that continue into a member value """
+    for key in keys:
+        if isgensonevaluable(value):
+            return
+        if not isdict(value):
+            raise GenSONReferenceError("Invalid reference: %s does not refer "
+                                       "to an object member" % ref)
+        value = splat_members(value)
+        if key not in value:
+            raise GenSONReferenceError("Unknown key: %s in %s" % (key, ref))
+        value = value[key]
+
+
+class Schedule:
+    """ A static evaluation order for the members of a document's nested
+        dicts, following the dependencies between them.
+
+        The root dict and each dict nested within it at any depth through
+        dict members (not within lists, tuples or splat keys, and unless it
+        is constant) become frames, and every other member value is
+        evaluated as one unit.  A member depends on the members its
+        references refer to, so references may point forwards; the members
+        are ordered topologically (in document order where possible) and
+        reference cycles are reported when the schedule is built.
+    """
+    def __init__(self, genson_dict):
+        self.frames = []    # for each frame, the frame numbers from the root
+        self.names = []     # for each frame, its key path from the root
+        self.layouts = []   # for each frame, its keys in document order
+        self.lookups = []   # for each frame, key -> (kind, n, value), where
+                            # kind is 'frame' or 'member'
+        self.links = []     # (parent frame, key, child frame)
+        self.members = []
+
+        self.add_frame(genson_dict, (), ())
+        for member in self.members:
+            self.add_dependencies(member)
+        self.order = self.sort()
+
+    def add_frame(self, d, frames, names):
+        n = len(self.frames)
+        frames = frames + (n,)
+        lookup = {}
+        layout = []
+        self.frames.append(frames)
+        self.names.append(names)
+        self.layouts.append(layout)
+        self.lookups.append(lookup)
+
+        for k, v in d.items():
+            if isdict(v) and not istuple(k) and not is_constant(v):
+                child = self.add_frame(v, frames, names + (k,))
+                self.links.append((n, k, child))
+                lookup[k] = ('frame', child, v)
+                layout.append(k)
+            else:
+                member = Member(len(self.members), n, k, v)
+                self.members.append(member)
+                for key, value in splat_members({k: v}).items():
+                    lookup[key] = ('member', member.index, value)
+                layout.extend(k if istuple(k) else (k,))
+        return n
+
+    def member_name(self, member):
+        return ".".join([str(k) for k in
+                         self.names[member.frame] + (member.key,)])
+
+    def subtree_members(self, frame):
+        return [m.index for m in self.members
+                if frame in self.frames[m.frame]]
+
+    def add_dependencies(self, member):
+        found = []
+        frames = self.frames[member.frame]
+        collect_references(member.value, len(frames), [], found)
+
+        for ref, index in found:
+            node = ('frame', frames[index], None)
+            for i, key in enumerate(ref.keys):
+                kind, n, value = node
+                if kind == 'member':
+                    check_keys(value, ref.keys[i:], ref)
+                    break
+                if key not in self.lookups[n]:
+                    raise GenSONReferenceError("Unknown key: %s in %s"
+                                               % (key, ref))
+                node = self.lookups[n][key]
+
+            kind, n, value = node
+            if kind == 'member':
+                member.depends.add(n)
+            else:
+                targets = self.subtree_members(n)
+                if member.index in targets:
+                    raise GenSONReferenceError(
+                        "Reference cycle: %s refers to an object containing "
+                        "it" % ref)
+                member.depends.update(targets)
+
+    def sort(self):
+        dependents = dict([(m.index, []) for m in self.members])
+        waiting = {}
+        for m in self.members:
+            waiting[m.index] = len(m.depends)
+            for d in m.depends:
+                dependents[d].append(m.index)
+
+        ready = [i for i, count in waiting.items() if count == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            i = heapq.heappop(ready)
+            order.append(self.members[i])
+            for j in dependents[i]:
+                waiting[j] -= 1
+                if waiting[j] == 0:
+                    heapq.heappush(ready, j)
+
+        if len(order) < len(self.members):
+            done = set([m.index for m in order])
+            cycle = [self.member_name(m) for m in self.members
+                     if m.index not in done]
+            raise GenSONReferenceError("Reference cycle between members: %s"
+                                       % ", ".join(cycle))
+        return order
@@ -0,0 +1,313 @@
+""" Adaptive search over the generators of a document: instead of
+    enumerating the cross product, ask for samples, evaluate them and tell
+    their scores, so that later samples concentrate where scores are good.
+"""
+import math
+from util import resolve, isdict, istuple, is_constant, lazy_import
+from functions import GridGenerator, ChoiceRandomGenerator, \
+    UniformRandomGenerator, GaussianRandomGenerator, DesignGenerator
+from internal_ops import GenSONOperand
+from plan import Plan
+
+np = lazy_import('numpy')
+
+
+def constant_arg(g, x):
+    if not is_constant(x):
+        raise ValueError("Cannot search over %s: its arguments must be "
+                         "constant" % g.__genson_repr__())
+    return resolve(x, [])
+
+
+class Dimension:
+    """ One generator of a document, as a search dimension.  Coordinates
+        along categorical dimensions are indices into the options, and
+        along continuous ones the values themselves.
+    """
+    def __init__(self, g):
+        self.generator = g
+        self.options = None
+        self.low = self.high = None
+
+        if isinstance(g, GridGenerator):
+            self.options = g.values
+        elif isinstance(g, ChoiceRandomGenerator):
+            self.options = g.vals
+        elif isinstance(g, UniformRandomGenerator):
+            self.low = constant_arg(g, g.min)
+            self.high = constant_arg(g, g.max)
+        elif isinstance(g, DesignGenerator):
+            self.low = constant_arg(g, g.low)
+            self.high = constant_arg(g, g.high)
+        elif isinstance(g, GaussianRandomGenerator):
+            self.mean = constant_arg(g, g.mean)
+            self.stdev = constant_arg(g, g.stdev)
+        else:
+            raise ValueError("Cannot search over %s" % g.__genson_repr__())
+
+    @property
+    def categorical(self):
+        return self.options is not None
+
+    @property
+    def scale(self):
+        if self.low is not None:
+            return float(self.high - self.low)
+        return float(self.stdev)
+
+    def value(self, coord):
+        if self.categorical:
+            return self.options[coord]
+        return coord
+
+    def prior(self, random, size):
+        if self.categorical:
+            return random.randint(len(self.options), size=size)
+        elif self.low is not None:
+            return random.uniform(self.low, self.high, size)
+        return random.normal(self.mean, self.stdev, size)
+
+    def outside(self, x):
+        if self.low is not None:
+            return (x < min(self.low, self.high)) | \
+                (x > max(self.low, self.high))
+        return np.zeros(len(x), dtype=bool)
+
+    def log_density(self, x, points, n):
+        """ The log density at x of a Parzen estimator fitted to points,
+            mixed with the prior, after n observations in all (which set
+            the kernel bandwidths, as in propose)
+        """
+        if self.categorical:
+            counts = np.bincount(points, minlength=len(self.options))
+            return np.log((counts[x] + 1.0) /
+                          (len(points) + len(self.options)))
+
+        bandwidths = self.bandwidths(points, n)
+        z = (x[:, None] - points[None, :]) / bandwidths
+        kernels = np.exp(-0.5 * z ** 2) / (bandwidths * math.sqrt(2 * math.pi))
+        if self.low is not None:
+            prior = 1.0 / abs(self.scale)
+        else:
+            prior = np.exp(-0.5 * ((x - self.mean) / self.stdev) ** 2) / \
+                (self.stdev * math.sqrt(2 * math.pi))
+        return np.log((kernels.sum(axis=1) + prior) / (len(points) + 1))
+
+    def bandwidths(self, points, n):
+        """ The width of the kernel at each point: the distance to its
+            furthest neighbour (or bound), within limits that narrow as
+            observations accumulate
+        """
+        scale = abs(self.scale)
+        order = np.argsort(points)
+        ordered = points[order]
+        if self.low is not None:
+            ends = [min(self.low, self.high)], [max(self.low, self.high)]
+        else:
+            ends = [ordered[0] - scale], [ordered[-1] + scale]
+        padded = np.concatenate([ends[0], ordered, ends[1]])
+        widths = np.empty(len(points))
+        widths[order] = np.maximum(ordered - padded[:-2],
+                                   padded[2:] - ordered)
+        return np.clip(widths, scale / min(100, n + 1), scale)
+
+    def propose(self, random, points, n, size):
+        """ Draw candidates around the points of a Parzen estimator """
+        if self.categorical:
+            counts = np.bincount(points, minlength=len(self.options)) + 1.0
+            return random.choice(len(self.options), size=size,
+                                 p=counts / counts.sum())
+        picks = random.randint(len(points), size=size)
+        candidates = points[picks] + random.normal(
+            0, 1, size) * self.bandwidths(points, n)[picks]
+        # the prior takes part in the mixture, as in log_density, and
+        # replaces candidates outside the bounds
+        from_prior = (random.random_sample(size) < 1.0 / (len(points) + 1)) | \
+            self.outside(candidates)
+        candidates[from_prior] = self.prior(random, size)[from_prior]
+        return candidates
+
+
+class Coordinate(GenSONOperand):
+    """ Stands in for a generator in the plan of a Search, evaluating to
+        the value of the sample being resolved
+    """
+    __slots__ = ('value',)
+
+    # never folded into the plan
+    stochastic = True
+
+    def __init__(self):
+        self.value = None
+
+    def __genson_eval__(self, context):
+        return self.value
+
+
+class Search:
+    """ Ask/tell search over the generators of a JSONGenerator: each
+        generator in its cross product (grid, choice, uniform, gaussian or
+        a design generator, with constant arguments) is one dimension.
+
+        ask(n) returns n (sample, coords) pairs, where sample is the
+        resolved document and coords holds one coordinate per dimension;
+        tell(coords, score) records the score of an evaluated sample.
+        With sampler='model', once n_startup scores are known, coordinates
+        are chosen by a tree-structured Parzen estimator: the best gamma
+        fraction of the scores and the rest are modelled separately (one
+        dimension at a time), and of n_candidates proposals the one most
+        likely under the good model relative to the bad is taken.
+        sampler='random' draws every coordinate from the generators.
+    """
+    def __init__(self, generator, sampler='model', maximize=False,
+                 n_startup=20, gamma=0.1, n_candidates=24, seed=None):
+        if sampler not in ('model', 'random'):
+            raise ValueError("Unknown sampler: %s" % sampler)
+
+        self.genson_dict = generator.genson_dict
+        self.dimensions = []
+        for g in generator.generators:
+            if isinstance(g, DesignGenerator):
+                self.dimensions.extend([Dimension(d)
+                                        for d in g.design.generators])
+            else:
+                self.dimensions.append(Dimension(g))
+
+        self.sampler = sampler
+        self.maximize = maximize
+        self.n_startup = n_startup
+        self.gamma = gamma
+        self.n_candidates = n_candidates
+        self.random = np.random.RandomState(seed)
+        self.history = []   # (coords, score) pairs, in the order told
+
+        # the document is compiled once, with a Coordinate in the place of
+        # each generator
+        self.coordinates = [Coordinate() for d in self.dimensions]
+        self.plan = Plan(substitute(
+            self.genson_dict, dict([(id(d.generator), c) for d, c in
+                                    zip(self.dimensions, self.coordinates)])))
+
+    def ask(self, n=1):
+        return [(self.sample(coords), coords)
+                for coords in [self.suggest() for _ in xrange(n)]]
+
+    def tell(self, coords, score):
+        self.history.append((tuple(coords), score))
+
+    def best(self):
+        """ The (coords, score) pair with the best score told so far """
+        if not self.history:
+            return None
+        pick = max if self.maximize else min
+        return pick(self.history, key=lambda h: h[1])
+
+    def sample(self, coords):
+        """ Resolve the document with each generator replaced by the value
+            at its coordinate
+        """
+        for d, coordinate, c in zip(self.dimensions, self.coordinates,
+                                    coords):
+            coordinate.value = d.value(c)
+        return self.plan.execute()
+
+    def suggest(self):
+        if self.sampler == 'random' or len(self.history) < self.n_startup:
+            return tuple([d.prior(self.random, 1)[0].item()
+                          for d in self.dimensions])
+
+        ranked = sorted(self.history, key=lambda h: h[1],
+                        reverse=self.maximize)
+        n_good = max(1, int(math.ceil(self.gamma * len(ranked))))
+        coords = np.array([c for c, score in ranked], dtype=object)
+
+        suggestion = []
+        for i, d in enumerate(self.dimensions):
+            dtype = np.int64 if d.categorical else np.float64
+            good = coords[:n_good, i].astype(dtype)
+            bad = coords[n_good:, i].astype(dtype)
+            candidates = d.propose(self.random, good, len(ranked),
+                                   self.n_candidates)
+            score = d.log_density(candidates, good, len(ranked))
+            if len(bad):
+                score = score - d.log_density(candidates, bad, len(ranked))
+            suggestion.append(candidates[np.argmax(score)].item())
+        return tuple(suggestion)
+
+
+def substitute(x, values):
+    """ A copy of a document with the generators found in values (by id)
+        replaced by their values
+    """
+    if id(x) in values:
+        return values[id(x)]
+    elif isdict(x):
+        return type(x)([(k, substitute(v, values)) for k, v in x.items()])
+    elif istuple(x) or isinstance(x, list):
+        return type(x)([substitute(v, values) for v in x])
+    return x
+
+
+class SuccessiveHalving:
+    """ Early stopping for a Search, where samples can be evaluated with a
+        budget (such as training epochs).
+
+        n samples are asked from the search and evaluated with min_budget;
+        the best 1 / eta of them are evaluated again with eta times the
+        budget, and so on, up to max_budget.  ask() returns the
+        (sample, coords, budget) triples still to be evaluated at the
+        current budget (empty once the schedule is finished), and
+        tell(coords, score) records their scores (samples with the same
+        coords take them in turn).  The search is told the last score of
+        each sample as it is stopped.
+    """
+    def __init__(self, search, n, min_budget=1, max_budget=None, eta=3):
+        self.search = search
+        self.eta = eta
+        self.budget = min_budget
+        self.max_budget = max_budget
+        self.finished = False
+        self.start_rung(search.ask(n))
+
+    def start_rung(self, rung):
+        self.rung = rung
+        # scores by position in the rung, and the positions still to be
+        # scored for each coords
+        self.scores = {}
+        self.pending = {}
+        for i, (sample, coords) in enumerate(rung):
+            self.pending.setdefault(tuple(coords), []).append(i)
+
+    def ask(self):
+        if not self.finished and len(self.scores) == len(self.rung):
+            self.promote()
+        if self.finished:
+            return []
+        return [(sample, coords, self.budget)
+                for i, (sample, coords) in enumerate(self.rung)
+                if i not in self.scores]
+
+    def tell(self, coords, score):
+        positions = self.pending.get(tuple(coords))
+        if not positions:
+            raise ValueError("No sample at %s is waiting for a score"
+                             % (tuple(coords),))
+        self.scores[positions.pop(0)] = score
+
+    def promote(self):
+        ranked = sorted(xrange(len(self.rung)), key=self.scores.get,
+                        reverse=self.search.maximize)
+        keep = len(ranked) // self.eta
+        budget = self.budget * self.eta
+        if keep < 1 or (self.max_budget is not None and
+                        budget > self.max_budget):
+            keep = 0
+            self.finished = True
+
+        for i in ranked[keep:]:
+            self.search.tell(self.rung[i][1], self.scores[i])
+        self.start_rung([self.rung[i] for i in ranked[:keep]])
+        self.budget = budget
+
+    def best(self):
+        return self.search.best()
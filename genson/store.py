@@ -0,0 +1,438 @@
+""" A columnar file of resolved samples, memory-mapped for reading (see
+    write_store and open_store).
+
+    Each leaf key path of the samples (as in dump_samples, e.g. ('c', 'd'))
+    is a column, and the header records the kind of each dict, list and
+    tuple (empty ones included) by key path, so that samples are rebuilt
+    as they were written.  Columns of booleans, integers or floats are
+    stored as fixed-width arrays, read in place without copying.  Other
+    columns store a slot per sample into a side heap holding each distinct
+    value once: UTF-8 text for columns of strings, JSON text otherwise.
+    Every column also stores an index, the sample numbers in the order of
+    their values, so that finding the samples with a given value takes a
+    binary search.
+
+    The file is the magic bytes "GSNS", a version byte, the length of a
+    JSON header describing the columns, and the arrays, each starting at a
+    multiple of 64 bytes.
+"""
+import json
+import mmap
+import struct
+from util import lazy_import, isdict, istuple
+from batch import flatten_columns, make_column, materialize_rows
+from output import iter_chunks, make_encoder, column_name
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+np = lazy_import('numpy')
+
+MAGIC = 'GSNS'
+VERSION = 1
+ALIGNMENT = 64
+
+prefix = struct.Struct('<4sB3xQ')
+
+fixed_kinds = {'b': ('bool', '|b1'), 'i': ('int', '<i8'),
+               'u': ('int', '<i8'), 'f': ('float', '<f8')}
+
+
+def is_number(v):
+    return isinstance(v, (int, long, float, np.number)) and \
+        not isinstance(v, (bool, np.bool_))
+
+
+class ColumnBuilder:
+    """ The values of one column, gathered chunk by chunk: numeric arrays
+        while every chunk has the same kind of number, and then heap slots
+    """
+    def __init__(self):
+        self.kind = None
+        self.parts = []
+        self.slot_of = {}
+        self.distinct = []
+
+    def add(self, column):
+        if column.dtype == object and all(is_number(v) for v in column):
+            # a mix of integers and floats
+            column = column.astype(np.float64)
+        kind = fixed_kinds.get(column.dtype.kind, ('heap',))[0]
+        if self.kind is None:
+            self.kind = kind
+        elif kind != self.kind and self.kind != 'heap':
+            if set([kind, self.kind]) == set(['int', 'float']):
+                self.kind = 'float'
+            else:
+                parts = self.parts
+                self.parts = []
+                self.kind = 'heap'
+                for part in parts:
+                    self.add_values(part.tolist())
+
+        if self.kind == 'heap':
+            self.add_values(column.tolist())
+        else:
+            self.parts.append(column)
+
+    def add_values(self, values):
+        slots = np.empty(len(values), dtype='<i8')
+        for i, v in enumerate(values):
+            try:
+                key = (type(v), v)
+                slot = self.slot_of.get(key)
+            except TypeError:
+                # unhashable values, such as lists
+                key = (type(v), json.dumps(v, sort_keys=True,
+                                           default=repr))
+                slot = self.slot_of.get(key)
+            if slot is None:
+                slot = self.slot_of[key] = len(self.distinct)
+                self.distinct.append(v)
+            slots[i] = slot
+        self.parts.append(slots)
+
+    def arrays(self):
+        """ The column description and its arrays, by name """
+        if self.kind != 'heap':
+            dtype = dict(fixed_kinds.values())[self.kind]
+            data = np.concatenate(self.parts).astype(dtype)
+            index = np.argsort(data, kind='mergesort')
+            return {'kind': self.kind, 'dtype': dtype}, \
+                {'data': data, 'index': index}
+
+        if all(isinstance(v, basestring) for v in self.distinct):
+            kind = 'string'
+            encoded = [v.encode('utf-8') if isinstance(v, unicode) else v
+                       for v in self.distinct]
+        else:
+            kind = 'json'
+            encode = make_encoder().encode
+            encoded = [encode(v) for v in self.distinct]
+
+        slots = np.concatenate(self.parts)
+        offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+        # the rank of each distinct value, in the order of its text
+        order = sorted(xrange(len(encoded)), key=encoded.__getitem__)
+        ranks = np.empty(len(encoded), dtype='<i8')
+        ranks[order] = np.arange(len(encoded))
+        index = np.argsort(ranks[slots], kind='mergesort')
+        heap = np.frombuffer(''.join(encoded), dtype='|u1')
+        return {'kind': kind}, {'slots': slots, 'offsets': offsets,
+                                'heap': heap, 'index': index}
+
+
+def aligned(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_store(samples, filename, chunk_size=10000, vectorized=False):
+    """ Write every sample of a JSONGenerator (or any iterable of resolved
+        samples) to a store file, generating them chunk_size at a time (with
+        JSONGenerator.batch if vectorized).  All samples must have the same
+        leaf key paths.
+    """
+    builders = OrderedDict()
+    containers = None
+    count = 0
+    for chunk in iter_chunks(samples, chunk_size, vectorized):
+        if isinstance(chunk, tuple):
+            size = chunk[1]
+            structure = batch_columns(*chunk)
+        else:
+            size = len(chunk)
+            structure = sample_columns(chunk)
+        if structure is not None and containers is None:
+            containers = structure[0]
+            for path in structure[1]:
+                builders[path] = ColumnBuilder()
+        if structure is None or structure[0] != containers:
+            raise ValueError("The samples do not all have the same key "
+                             "paths")
+        for path, column in structure[1].items():
+            builders[path].add(column)
+        count += size
+
+    descriptions = []
+    blocks = []
+    offset = 0
+    for path, builder in builders.items():
+        description, arrays = builder.arrays()
+        description['path'] = list(path)
+        for name, array in sorted(arrays.items()):
+            description[name] = [offset, array.dtype.str, len(array)]
+            blocks.append((offset, array))
+            offset = aligned(offset + array.nbytes)
+        descriptions.append(description)
+
+    header = json.dumps({'count': count, 'columns': descriptions,
+                         'containers': [[list(path), kind] for path, kind
+                                        in containers or ()]})
+    start = aligned(prefix.size + len(header))
+    with open(filename, 'wb') as f:
+        f.write(prefix.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for block_offset, array in blocks:
+            f.seek(start + block_offset)
+            array.tofile(f)
+        f.truncate(start + offset)
+
+
+def container_kind(x):
+    if isdict(x):
+        return 'dict'
+    elif istuple(x):
+        return 'tuple'
+    elif isinstance(x, list):
+        return 'list'
+    return None
+
+
+def flatten_structure(x, path=(), row=None, containers=None):
+    """ Flatten a resolved sample like output.flatten_sample, also listing
+        the (key path, kind) of each of its dicts, lists and tuples
+    """
+    if row is None:
+        row = OrderedDict()
+        containers = []
+
+    kind = container_kind(x)
+    if kind is None:
+        row[path] = x
+        return row, containers
+
+    containers.append((path, kind))
+    if kind == 'dict':
+        for k in sorted(x.keys()):
+            flatten_structure(x[k], path + (k,), row, containers)
+    else:
+        for i, v in enumerate(x):
+            flatten_structure(v, path + (i,), row, containers)
+    return row, containers
+
+
+def sample_columns(samples):
+    """ The containers and columns of a list of resolved samples, or None
+        if they do not have the same structure
+    """
+    rows = [flatten_structure(sample) for sample in samples]
+    first, containers = rows[0]
+    paths = first.keys()
+    if any(c != containers or row.keys() != paths for row, c in rows):
+        return None
+    return containers, OrderedDict([(path, make_column([row[path]
+                                                        for row, c in rows]))
+                                    for path in paths])
+
+
+def batch_containers(x, path=(), containers=None):
+    if containers is None:
+        containers = []
+    kind = container_kind(x)
+    if kind is not None:
+        containers.append((path, kind))
+        if kind == 'dict':
+            for k in sorted(x.keys()):
+                batch_containers(x[k], path + (k,), containers)
+        else:
+            for i, v in enumerate(x):
+                batch_containers(v, path + (i,), containers)
+    return containers
+
+
+def batch_columns(result, size):
+    """ The containers and columns of a batch result, as sample_columns
+        finds them
+    """
+    columns = flatten_columns(result, size)
+    if any(column.dtype == object and
+           any(container_kind(v) is not None for v in column)
+           for column in columns.values()):
+        # such as choices among dicts, flattened sample by sample
+        return sample_columns(materialize_rows(result, size))
+    return batch_containers(result), columns
+
+
+def open_store(filename):
+    return SampleStore(filename)
+
+
+class Column:
+    """ One column of a SampleStore """
+    def __init__(self, description, arrays):
+        self.path = to_path(description['path'])
+        self.kind = description['kind']
+        self.index = arrays['index']
+        if self.kind in ('string', 'json'):
+            self.slots = arrays['slots']
+            self.offsets = arrays['offsets']
+            self.heap = arrays['heap']
+        else:
+            self.data = arrays['data']
+
+    def text(self, slot):
+        return self.heap[self.offsets[slot]:self.offsets[slot + 1]].tostring()
+
+    def decode(self, slot):
+        text = self.text(slot)
+        if self.kind == 'json':
+            return json.loads(text)
+        return text
+
+    def encode(self, value):
+        # a value in the form values are ordered by in the index
+        if self.kind == 'string':
+            if not isinstance(value, basestring):
+                return None
+            return value.encode('utf-8') if isinstance(value, unicode) \
+                else value
+        elif self.kind == 'json':
+            return make_encoder().encode(value)
+        return value
+
+    def sort_key(self, i):
+        if self.kind in ('string', 'json'):
+            return self.text(self.slots[i])
+        return self.data[i]
+
+    def value(self, i):
+        if self.kind in ('string', 'json'):
+            return self.decode(self.slots[i])
+        return self.data[i].item()
+
+    def values(self):
+        if self.kind in ('string', 'json'):
+            distinct = np.empty(len(self.offsets) - 1, dtype=object)
+            for slot in xrange(len(distinct)):
+                distinct[slot] = self.decode(slot)
+            return distinct[self.slots]
+        return self.data
+
+    def bisect(self, value, right):
+        """ The position in the index of the first sample whose value is
+            not less than (or with right, greater than) value
+        """
+        low, high = 0, len(self.index)
+        while low < high:
+            middle = (low + high) // 2
+            key = self.sort_key(self.index[middle])
+            if key < value or (right and key == value):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def between(self, low, high):
+        return np.sort(self.index[self.bisect(self.encode(low), False):
+                                  self.bisect(self.encode(high), False)])
+
+    def equal(self, value):
+        value = self.encode(value)
+        if value is None:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(self.index[self.bisect(value, False):
+                                  self.bisect(value, True)])
+
+
+class SampleStore:
+    """ The samples of a store file (see write_store), memory-mapped.
+
+        len(store) is the number of samples and store[i] the i-th sample.
+        column(path) returns the values of a column as a NumPy array,
+        which for numeric columns is read directly from the file.
+        where(path, value) and between(path, low, high) return the numbers
+        of the samples whose value at path is equal to value, or at least
+        low and less than high (numeric and string columns).  Paths are
+        tuples of keys and sequence indices, or these joined with '.'.
+    """
+    def __init__(self, filename):
+        # the arrays keep the map open for as long as they are used
+        with open(filename, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_size = prefix.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError("%s is not a sample store" % filename)
+        if version > VERSION:
+            raise ValueError("Unsupported store version %d (at most %d)"
+                             % (version, VERSION))
+        header = json.loads(self.map[prefix.size:prefix.size + header_size])
+        start = aligned(prefix.size + header_size)
+
+        self.count = header['count']
+        self.columns = OrderedDict()
+        for description in header['columns']:
+            arrays = {}
+            for name in ('data', 'index', 'slots', 'offsets', 'heap'):
+                if name in description:
+                    offset, dtype, size = description[name]
+                    arrays[name] = np.frombuffer(self.map, dtype, size,
+                                                 start + offset)
+            column = Column(description, arrays)
+            self.columns[column.path] = column
+
+        self.names = dict([(column_name(path), path)
+                           for path in self.columns])
+
+        # the entries of each container, as (key, container path or None,
+        # column or None) triples, to rebuild samples from
+        self.containers = OrderedDict()
+        for path, kind in header['containers']:
+            self.containers[to_path(path)] = (kind, [])
+        for path in self.containers.keys() + self.columns.keys():
+            if path:
+                entries = self.containers[path[:-1]][1]
+                entries.append((path[-1], path in self.containers and path,
+                                self.columns.get(path)))
+        for kind, entries in self.containers.values():
+            entries.sort(key=lambda entry: entry[0])
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def paths(self):
+        return self.columns.keys()
+
+    def find(self, path):
+        if isinstance(path, basestring):
+            path = self.names.get(path, path)
+        try:
+            return self.columns[tuple(path)]
+        except KeyError:
+            raise KeyError("No column %s" % (path,))
+
+    def column(self, path):
+        return self.find(path).values()
+
+    def where(self, path, value):
+        return self.find(path).equal(value)
+
+    def between(self, path, low, high):
+        return self.find(path).between(low, high)
+
+    def __getitem__(self, i):
+        if not -self.count <= i < self.count:
+            raise IndexError("sample index out of range")
+        i %= self.count
+        if () in self.columns:
+            return self.columns[()].value(i)
+        return self.build((), i)
+
+    def build(self, path, i):
+        kind, entries = self.containers[path]
+        values = [(key, self.build(child, i) if child else column.value(i))
+                  for key, child, column in entries]
+        if kind == 'dict':
+            return dict(values)
+        elif kind == 'tuple':
+            return tuple([v for key, v in values])
+        return [v for key, v in values]
+
+
+def to_path(path):
+    # JSON gives back unicode keys
+    return tuple([k.encode('utf-8') if isinstance(k, unicode) else k
+                  for k in path])
@@ -0,0 +1,148 @@
+import re
+
+OPEN = '{[('
+CLOSE = '}])'
+
+# characters that matter inside a document, and outside of one
+SPECIAL = re.compile(r'["{}\[\]()/]')
+NON_SPACE = re.compile(r'\S')
+STRING_SPECIAL = re.compile(r'["\\]')
+LINE_COMMENT_SPECIAL = re.compile(r'[\\\n]')
+BLOCK_COMMENT_SPECIAL = re.compile(r'\*')
+
+
+class DocumentSplitter:
+    """ Splits a stream of concatenated (or newline-delimited) GenSON
+        documents into the text of each top-level document, reading the
+        stream in chunks.  Strings and comments are skipped, so brackets
+        inside them do not count.
+    """
+    def __init__(self, io, chunk_size=65536):
+        self.io = io
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        # the current document is ''.join(pieces) + buf[start:pos]
+        self.start = None
+        self.pieces = []
+
+    def __iter__(self):
+        while True:
+            text = self.next_document()
+            if text is None:
+                return
+            yield text
+
+    def fill(self):
+        """ Read another chunk, keeping only the unscanned part of the buffer
+        """
+        chunk = self.io.read(self.chunk_size)
+        if not chunk:
+            return False
+
+        if self.start is not None:
+            self.pieces.append(self.buf[self.start:self.pos])
+            self.start = 0
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def char(self, offset=0):
+        """ The character `offset` past the scan position, or '' at the end
+            of the stream
+        """
+        while self.pos + offset >= len(self.buf):
+            if not self.fill():
+                return ''
+        return self.buf[self.pos + offset]
+
+    def find(self, pattern):
+        """ Move to the next match of pattern and return the character there,
+            or '' at the end of the stream
+        """
+        while True:
+            m = pattern.search(self.buf, self.pos)
+            if m is not None:
+                self.pos = m.start()
+                return self.buf[self.pos]
+            self.pos = len(self.buf)
+            if not self.fill():
+                return ''
+
+    def next_document(self):
+        self.start = None
+        self.pieces = []
+        depth = 0
+
+        while True:
+            c = self.find(SPECIAL if depth else NON_SPACE)
+            if c == '':
+                if depth:
+                    raise ValueError("Unterminated GenSON document at the "
+                                     "end of the stream")
+                return None
+
+            if c == '/' and self.char(1) in ('/', '*'):
+                self.skip_comment()
+                continue
+
+            if depth == 0:
+                if c not in OPEN:
+                    raise ValueError("Unexpected %r between GenSON documents"
+                                     % c)
+                self.start = self.pos
+
+            if c == '"':
+                self.skip_string()
+                continue
+            elif c in OPEN:
+                depth += 1
+            elif c in CLOSE:
+                depth -= 1
+
+            self.pos += 1
+            if depth == 0:
+                return ''.join(self.pieces) + self.buf[self.start:self.pos]
+
+    def skip_string(self):
+        self.pos += 1
+        while True:
+            c = self.find(STRING_SPECIAL)
+            if c == '':
+                return
+            elif c == '\\':
+                self.char(1)
+                self.pos += 2
+            else:
+                self.pos += 1
+                return
+
+    def skip_comment(self):
+        if self.char(1) == '/':
+            self.pos += 2
+            while True:
+                c = self.find(LINE_COMMENT_SPECIAL)
+                if c == '\\':
+                    # a backslash continues the comment onto the next line
+                    self.pos += 2 if self.char(1) == '\n' else 1
+                elif c == '\n':
+                    self.pos += 1
+                    return
+                else:
+                    return
+        else:
+            self.pos += 2
+            while True:
+                c = self.find(BLOCK_COMMENT_SPECIAL)
+                if c == '':
+                    return
+                self.pos += 1
+                if self.char() == '/':
+                    self.pos += 1
+                    return
+
+
+def split_documents(io, chunk_size=65536):
+    """ Iterate over the text of each top-level GenSON document in a stream
+    """
+    return iter(DocumentSplitter(io, chunk_size))
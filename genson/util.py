@@ -1,5 +1,13 @@
 # import references
+import re
+import sys
 import copy
+import importlib
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
 
 default_random_seed = None
 
@@ -11,6 +19,40 @@ def get_global_seed():
     global default_random_seed
     return default_random_seed
 
+rng_mode = 'legacy'
+
+def set_rng_mode(mode):
+    """ Choose how random generators draw: 'legacy' gives each generator
+        one sequential RandomState stream, as in earlier versions, while
+        'counter' computes each value from the sample index (see philox).
+        Set the mode before loading documents.
+    """
+    global rng_mode
+    if mode not in ('legacy', 'counter'):
+        raise ValueError("Unknown RNG mode: %s" % mode)
+    rng_mode = mode
+
+def get_rng_mode():
+    return rng_mode
+
+class LazyModule:
+    """ Stands in for a module that is only imported on first attribute
+        access, so that `import genson` stays cheap
+    """
+    def __init__(self, name):
+        self.module_name = name
+        self.module = None
+
+    def __getattr__(self, attr):
+        if self.module is None:
+            self.module = importlib.import_module(self.module_name)
+        return getattr(self.module, attr)
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
 def isdict(x):
     return isinstance(x, dict)
 def istuple(x):
@@ -72,40 +114,251 @@ def resolve(x, context = []):
         return x
 
 
-def genson_dumps(o, pretty_print=False, depth=0):
-    
-    if isgensondumpable(o):
-        return o.__genson_repr__(pretty_print, depth)
-    
-    elif isdict(o):
-        
-        element_strs = []
-        for k,v in o.items():
-            if isiterable(k):
-                element_strs.append('(%s) : %s' % \
-                                    (",".join(['"%s"' % x for x in k]),
-                                    genson_dumps(v, pretty_print, depth+1)))
-            else:
-                element_strs.append('"%s" : %s' % \
-                                    (k, genson_dumps(v, pretty_print, depth+1)))
-        
-        return_str = ''
-        if pretty_print:
-            tabs = '\t' * depth
-            return_str += '{\n' + tabs + '\t'
-            return_str += (",\n" + tabs + "\t").join(element_strs)
-            
-            return_str += '\n' + tabs + '}'
+def is_constant(x):
+    """ True if x contains no GenSON evaluable objects anywhere within it
+    """
+    if isgensonevaluable(x):
+        return False
+    elif isdict(x):
+        for v in x.values():
+            if not is_constant(v):
+                return False
+        return True
+    elif isiterable(x):
+        for v in x:
+            if not is_constant(v):
+                return False
+        return True
+    else:
+        return True
+
+
+def genson_children(x):
+    """ The values nested directly within x, including the operands and
+        arguments of GenSON objects
+    """
+    if isgensonevaluable(x):
+        children = getattr(x, '__genson_children__', None)
+        if children:
+            return children()
+        return ()
+    elif isdict(x):
+        return x.values()
+    elif isiterable(x):
+        return x
+    else:
+        return ()
+
+
+def walk(x):
+    """ Iterate depth-first over x and every value nested within it """
+    stack = [x]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(list(genson_children(node))))
+
+
+# the text of a string enclosed in double quotes, as the grammar reads it
+# (without processing escapes, so any such string reads back unchanged)
+QUOTABLE = re.compile(r'(?:[^"\n\r\\]|(?:"")|(?:\\(?:[^x]|x[0-9a-fA-F]+)))*\Z')
+
+genson_constants = {True: 'true', False: 'false', None: 'null'}
+
+
+class GenSONWriter:
+    """ Writes documents as GenSON text, passing it piece by piece to
+        `write` (such as the write method of a file, or the append method
+        of a list of pieces), so that no intermediate strings are built.
+        The text reads back into an equal document.
+
+        GenSON objects write themselves with __genson_write__(writer,
+        depth); objects only providing __genson_repr__(pretty_print,
+        depth) are written as the text it returns.
+    """
+    def __init__(self, write, pretty_print=False):
+        self.write = write
+        self.pretty_print = pretty_print
+
+    def dump(self, o, depth=0):
+        try:
+            writer = writers[type(o)]
+        except KeyError:
+            writer = find_writer(o)
+        writer(o, self, depth)
+
+    def write_elements(self, elements, depth):
+        dump = self.dump
+        first = True
+        for x in elements:
+            if not first:
+                self.write(',')
+            first = False
+            dump(x, depth)
+
+    def write_call(self, name, args, kwargs, depth=0):
+        """ Write a generator or function call; keyword arguments are
+            (name, value) pairs
+        """
+        write = self.write
+        write(name + '(')
+        self.write_elements(args, depth)
+        separator = ',' if args else ''
+        for k, v in kwargs:
+            write(separator + k + '=')
+            self.dump(v, depth)
+            separator = ','
+        write(')')
+
+    def write_key(self, k):
+        if type(k) is str or isinstance(k, basestring):
+            write_string(k, self)
+        elif istuple(k):
+            self.write('(')
+            for i, x in enumerate(k):
+                if i:
+                    self.write(',')
+                self.write_key(x)
+            self.write(')')
+        else:
+            write_string(str(k), self)
+
+
+# The functions writing each type, called with (value, writer, depth): these
+# are found by the exact type of a value, and GenSON types are added on first
+# use
+
+def write_dict(o, writer, depth):
+    write = writer.write
+    if not o:
+        write('{}')
+        return
+
+    if writer.pretty_print:
+        separator = ',\n' + '\t' * (depth + 1)
+        write('{\n' + '\t' * (depth + 1))
+    else:
+        separator = ','
+        write('{')
+    dump = writer.dump
+    first = True
+    for k, v in o.items():
+        if not first:
+            write(separator)
+        first = False
+        if type(k) is str:
+            write_string(k, writer)
         else:
-            return_str = "{%s}" % ",".join(element_strs)
-        return return_str
-        
+            writer.write_key(k)
+        write(' : ')
+        dump(v, depth + 1)
+    if writer.pretty_print:
+        write('\n' + '\t' * depth)
+    write('}')
+
+
+def write_list(o, writer, depth):
+    writer.write('[')
+    writer.write_elements(o, depth)
+    writer.write(']')
+
+
+def write_tuple(o, writer, depth):
+    writer.write('(')
+    writer.write_elements(o, depth)
+    writer.write(')')
+
+
+def write_string(o, writer, depth=0):
+    # only strings with quotes, backslashes or line breaks need checking
+    if ('"' in o or '\\' in o or '\n' in o or '\r' in o) and \
+            not QUOTABLE.match(o):
+        raise ValueError("Cannot write %r as a GenSON string" % (o,))
+    writer.write('"' + o + '"')
+
+
+def write_constant(o, writer, depth):
+    writer.write(genson_constants[o])
+
+
+def write_number(o, writer, depth):
+    writer.write(str(o))
+
+
+def write_float(o, writer, depth):
+    # repr keeps full precision, which str() rounds
+    text = repr(float(o))
+    if text in ('inf', '-inf', 'nan'):
+        raise ValueError("Cannot write %s as a GenSON number" % text)
+    writer.write(text)
+
+
+def write_repr(o, writer, depth):
+    writer.write(o.__genson_repr__(writer.pretty_print, depth))
+
+
+def write_item(o, writer, depth):
+    # numpy scalars
+    writer.dump(o.item(), depth)
+
+
+def write_str(o, writer, depth):
+    writer.write(str(o))
+
+
+writers = {dict: write_dict,
+           OrderedDict: write_dict,
+           list: write_list,
+           tuple: write_tuple,
+           str: write_string,
+           unicode: write_string,
+           bool: write_constant,
+           type(None): write_constant,
+           int: write_number,
+           long: write_number,
+           float: write_float}
+
+
+def find_writer(o):
+    """ The function writing o, added to writers for the type of o """
+    # looked up on the type, as pyparsing results have every attribute
+    if hasattr(type(o), '__genson_write__'):
+        writer = type(o).__genson_write__.im_func
+    elif isgensondumpable(o):
+        writer = write_repr
+    elif isdict(o):
+        writer = write_dict
     elif istuple(o):
-        return tuple([genson_dumps(x,pretty_print,depth) for x in o])
+        writer = write_tuple
+    elif isinstance(o, float):
+        writer = write_float
+    elif isinstance(o, basestring):
+        writer = write_string
     elif isiterable(o):
-        return [genson_dumps(x,pretty_print,depth) for x in o]
+        writer = write_list
+    elif 'numpy' in sys.modules and \
+            isinstance(o, sys.modules['numpy'].generic):
+        writer = write_item
     else:
-        return str(o)
+        writer = write_str
+
+    # instances of old-style classes all have the same type
+    if type(o) is o.__class__:
+        writers[type(o)] = writer
+    return writer
+
+
+def genson_dump(o, fp, pretty_print=False):
+    """ Write o as GenSON text to the file-like object fp """
+    GenSONWriter(fp.write, pretty_print).dump(o)
+
+
+def genson_dumps(o, pretty_print=False, depth=0):
+    """ o as GenSON text """
+    pieces = []
+    GenSONWriter(pieces.append, pretty_print).dump(o, depth)
+    return ''.join(pieces)
+
 
 def kwargs_consumed(f):
     def wrapper(self, *args, **kwargs):
@@ -0,0 +1,52 @@
+from nose.tools import assert_equal, assert_raises
+import numpy as np
+import genson
+
+gson = """
+{
+    "a": <1, 2, 3>,
+    "b": gaussian(0, 2, draws=4, random_seed=42),
+    "c": { "d": uniform(parent.b, 10, draws=3, random_seed=1), "e": "s" },
+    "f": 2.2 * sin(this.a) + this.b,
+    "g": choice(["x", "y", "z"], draws=2, random_seed=5),
+    ("h", "i"): <(1, "q"), (2, "r")>,
+    "j": [1, <true, false>]
+}
+"""
+
+
+def test_batch_matches_iteration():
+    serial = list(genson.loads(gson))
+    gen = genson.loads(gson)
+    assert_equal(gen.batch(len(gen) + 10, as_dicts=True), serial)
+    assert_equal(gen.batch(50, start=100, as_dicts=True), serial[100:150])
+    assert_equal(gen.next(), serial[0])
+
+
+def test_batch_columns():
+    serial = list(genson.loads(gson))
+    columns = genson.loads(gson).batch(20)
+    assert_equal(columns.keys(),
+                 [('a',), ('b',), ('c', 'd'), ('c', 'e'), ('f',), ('g',),
+                  ('h',), ('i',), ('j', 0), ('j', 1)])
+    assert_equal(columns[('b',)].dtype, np.float64)
+    assert_equal(list(columns[('c', 'd')]), [s['c']['d'] for s in serial[:20]])
+    assert_equal(list(columns[('i',)]), [s['i'] for s in serial[:20]])
+
+
+def test_unsupported_generator_values():
+    gen = genson.loads('{"a": <1, uniform(0, 1)>}')
+    assert_raises(ValueError, gen.batch, 2)
+
+
+def test_list_values():
+    # on the pyparsing backend, parsed lists are resolved to lists
+    doc = ('{"a": choice([[1, 2], [3]], draws=3, random_seed=2), '
+           '"b": <[4], ["x", [5]]>}')
+    for backend in ['pyparsing', 'recursive']:
+        serial = list(genson.loads(doc, backend=backend))
+        gen = genson.loads(doc, backend=backend)
+        assert_equal(gen.batch(6, as_dicts=True), serial)
+        columns = gen.batch(6)
+        assert_equal(list(columns[('a',)]), [s['a'] for s in serial])
+        assert_equal(type(columns[('b',)][0]), list)
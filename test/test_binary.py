@@ -0,0 +1,56 @@
+from nose.tools import assert_equal, assert_raises, assert_true
+from collections import OrderedDict
+import genson
+from genson import binary
+
+gson = """
+{
+    "a": <1, 2, 3>,
+    "b": gaussian(0, 1, draws=4, random_seed=42),
+    "c": { "e": uniform(-1.5, 1, draws=3), "d": 2 * sin(parent.a) + this.e },
+    ("f", "g"): (1, (2, 3)),
+    "i": [null, true, false, "x", -7, 12345678901234567890123],
+    "j": - (this.a - 1) ^ 2 / root.a,
+    "k": choice(["p", "q"], random_seed=3),
+    "l": sobol(0, 1, draws=4),
+    "m": grid(4, 5, draws=1)
+}
+"""
+
+
+def test_round_trip():
+    genson.set_global_seed(5)
+    try:
+        gen = genson.loads(gson)
+        data = genson.to_bytes(gen)
+        copy = genson.from_bytes(data)
+        assert_equal(genson.dumps(copy), genson.dumps(gen))
+        assert_equal(copy.genson_dict.keys(), gen.genson_dict.keys())
+        assert_equal(list(copy), list(genson.loads(gson)))
+        assert_equal(genson.to_bytes(copy), data)
+    finally:
+        genson.set_global_seed(None)
+
+
+def test_values():
+    doc = OrderedDict([("z", {"b": 1, "a": u"\xe9"}), ("y", 0.1)])
+    assert_equal(binary.decode(binary.encode(doc)), doc)
+    assert_equal(type(binary.decode(binary.encode(doc))["z"]), dict)
+    assert_equal(binary.decode(binary.encode([-2 ** 70, 2 ** 63, -1, 300])),
+                 [-2 ** 70, 2 ** 63, -1, 300])
+
+
+def test_compact():
+    # repeated strings and references are stored once
+    members = ['"m%d": {"a": root.x, "b": "value"}' % i for i in xrange(100)]
+    doc = '{"x": 1, %s}' % ", ".join(members)
+    assert_true(len(genson.to_bytes(genson.loads(doc))) < len(doc) / 2)
+
+
+def test_invalid():
+    data = genson.to_bytes(genson.loads(gson))
+    assert_raises(ValueError, genson.from_bytes, "not a document")
+    assert_raises(ValueError, genson.from_bytes, data[:-3])
+    assert_raises(ValueError, genson.from_bytes,
+                  data[:4] + chr(binary.VERSION + 1) + data[5:])
+    assert_raises(TypeError, genson.to_bytes, {"a": object()})
@@ -0,0 +1,80 @@
+from nose.tools import assert_equal, assert_raises, assert_true
+import numpy as np
+import genson
+from genson.philox import philox4x32
+
+doc = ('{"a": uniform(0, 1, draws=3), "b": gaussian(0, 1, draws=2), '
+       '"c": <1, 2>, "d": choice([1, 2, 3]) + gaussian(0, 1)}')
+
+
+def in_counter_mode(f):
+    def wrapper():
+        genson.set_rng_mode('counter')
+        genson.set_global_seed(42)
+        try:
+            f()
+        finally:
+            genson.set_rng_mode('legacy')
+            genson.set_global_seed(None)
+    wrapper.__name__ = f.__name__
+    return wrapper
+
+
+def test_philox_known_answers():
+    # from the Random123 distribution
+    counters = np.array([[0, 0, 0, 0], [0xffffffff] * 4,
+                         [0x243f6a88, 0x85a308d3, 0x13198a2e, 0x03707344]],
+                        dtype=np.uint64)
+    keys = [(0, 0), (0xffffffff, 0xffffffff), (0xa4093822, 0x299f31d0)]
+    expected = [[0x6627e8d5, 0xe169c58d, 0xbc57ac4c, 0x9b00dbd8],
+                [0x408f276d, 0x41c83b0e, 0xa20bc7c6, 0x6d5451fd],
+                [0xd16cfe09, 0x94fdcceb, 0x5001e420, 0x24126ea1]]
+    for counter, key, words in zip(counters, keys, expected):
+        assert_equal(list(philox4x32(counter[None, :], key)[0]), words)
+
+
+@in_counter_mode
+def test_random_access():
+    samples = list(genson.loads(doc))
+    assert_equal(len(samples), 12)
+    gen = genson.loads(doc)
+    for i in [7, 3, 11, 0]:
+        assert_equal(gen.sample_at(i), samples[i])
+    assert_equal(list(genson.loads(doc).shard(1, 3)), samples[1::3])
+
+    batch = genson.loads(doc).batch(12, as_dicts=True)
+    for sample, row in zip(samples, batch):
+        assert_true(np.allclose([sample[k] for k in "abcd"],
+                                [row[k] for k in "abcd"]))
+
+
+@in_counter_mode
+def test_streams():
+    first = list(genson.loads(doc))
+    assert_equal(list(genson.loads(doc)), first)
+    # generators with the same seed draw different values
+    sample = genson.loads('{"a": uniform(0, 1), "b": uniform(0, 1)}').next()
+    assert_true(sample["a"] != sample["b"])
+
+    genson.set_global_seed(43)
+    assert_true(list(genson.loads(doc)) != first)
+
+
+def test_modes():
+    assert_raises(ValueError, genson.set_rng_mode, 'philox')
+    assert_equal(genson.get_rng_mode(), 'legacy')
+
+
+@in_counter_mode
+def test_repeatable():
+    gen = genson.loads(doc)
+    assert_equal([gen[1] for _ in xrange(3)], [gen[1]] * 3)
+    gen.reset()
+    assert_equal(list(gen), list(gen))
+
+    genson.set_global_seed(3)
+    gen = genson.loads('{"b": uniform(0, 1)}')
+    first = list(gen)
+    assert_equal(list(gen), first)
+    gen.reset()
+    assert_equal(gen.next(), first[0])
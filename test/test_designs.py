@@ -0,0 +1,64 @@
+from nose.tools import assert_equal, assert_raises
+import numpy as np
+import genson
+
+
+def strata(values, low, high, n):
+    return sorted(np.floor((np.array(values) - low) / (high - low) * n))
+
+
+def test_joint_design():
+    gen = genson.loads('{"a": sobol(0, 8, draws=8), "b": <1, 2>, '
+                       '"c": {"d": sobol(-1, 1, draws=8)}}')
+    assert_equal(len(gen), 16)
+    samples = list(gen)
+    assert_equal([s["a"] for s in samples[:8]], [s["a"] for s in samples[8:]])
+    for key, low, high in [("a", 0, 8), ("d", -1, 1)]:
+        values = [s.get(key, s["c"].get(key)) for s in samples[:8]]
+        assert_equal(strata(values, low, high, 8), range(8))
+    # the points of a two dimensional Sobol net: one in each 2 x 4 cell
+    cells = set((int(s["a"] / 4), int((s["c"]["d"] + 1) * 2))
+                for s in samples[:8])
+    assert_equal(len(cells), 8)
+
+
+def test_halton():
+    gen = genson.loads('{"a": halton(0, 1, draws=4), '
+                       '"b": halton(0, 9, draws=4)}')
+    assert_equal([(s["a"], s["b"]) for s in gen],
+                 [(0.5, 3.0), (0.25, 6.0), (0.75, 1.0), (0.125, 4.0)])
+
+
+def test_latin_hypercube():
+    doc = ('{"a": lhs(0, 1, draws=10, random_seed=3), '
+           '"b": lhs(10, 20, draws=10), "c": <1, 2>}')
+    samples = list(genson.loads(doc))
+    assert_equal(strata([s["a"] for s in samples[:10]], 0, 1, 10), range(10))
+    assert_equal(strata([s["b"] for s in samples[:10]], 10, 20, 10),
+                 range(10))
+    assert_equal(list(genson.loads(doc)), samples)
+
+
+def test_other_evaluations():
+    doc = ('{"a": sobol(0, 1, draws=4), "b": <1, 2>, '
+           '"c": this.a + this.b}')
+    samples = list(genson.loads(doc))
+    assert_equal(list(genson.loads(doc, incremental=True)), samples)
+    assert_equal(genson.loads(doc).batch(8, as_dicts=True), samples)
+    assert_equal(genson.loads(doc).sample_at(6), samples[6])
+
+    doc = '{"a": lhs(0, 1, draws=4, random_seed=1), "b": lhs(2, 3, draws=4)}'
+    assert_equal(list(genson.loads(genson.dumps(genson.loads(doc)))),
+                 list(genson.loads(doc)))
+
+
+def test_nested_design():
+    for doc in ['{"a": sobol(0, 1, draws=4) + 1}',
+                '{"a": halton(0, 1, draws=4), "b": {"c": lhs(0, 1) * 2}}',
+                '{"a": choice([sobol(0, 1), 2])}']:
+        assert_raises(ValueError, genson.loads, doc)
+
+
+def test_mismatched_draws():
+    assert_raises(ValueError, genson.loads,
+                  '{"a": sobol(0, 1, draws=4), "b": sobol(0, 1, draws=8)}')
@@ -0,0 +1,123 @@
+from nose.tools import assert_equal, assert_raises
+from StringIO import StringIO
+import json
+import csv
+import numpy as np
+import genson
+from genson.output import flatten_sample, column_name
+
+gson = """
+{
+    "a": <1, 2, 3>,
+    "b": gaussian(0, 2, draws=2, random_seed=42),
+    "c": { "d": parent.a * 2, "e": sin(parent.a), "f": "s" },
+    "g": [choice([1, 2], random_seed=3), <true, false>]
+}
+"""
+
+
+def test_ndjson():
+    expected = list(genson.loads(gson))
+    for vectorized in [False, True]:
+        out = StringIO()
+        genson.dump_samples(genson.loads(gson), out, chunk_size=4,
+                            vectorized=vectorized)
+        lines = out.getvalue().splitlines()
+        assert_equal([json.loads(line) for line in lines], expected)
+
+
+def test_numpy_scalars():
+    out = StringIO()
+    genson.dump_samples([{"i": np.int64(3), "b": np.bool_(True),
+                          "f": np.float64(0.1)}], out)
+    assert_equal(json.loads(out.getvalue()), {"i": 3, "b": True, "f": 0.1})
+
+
+def test_csv():
+    expected = list(genson.loads(gson))
+    for vectorized in [False, True]:
+        out = StringIO()
+        genson.dump_samples(genson.loads(gson), out, format='csv',
+                            chunk_size=5, vectorized=vectorized)
+        rows = list(csv.reader(StringIO(out.getvalue())))
+        assert_equal(rows[0], ['a', 'b', 'c.d', 'c.e', 'c.f', 'g.0', 'g.1'])
+        assert_equal(len(rows), len(expected) + 1)
+        assert_equal([float(r[1]) for r in rows[1:]],
+                     [s['b'] for s in expected])
+
+
+def test_npz():
+    expected = list(genson.loads(gson))
+    for vectorized in [False, True]:
+        out = StringIO()
+        genson.dump_samples(genson.loads(gson), out, format='npz',
+                            chunk_size=4, vectorized=vectorized)
+        out.seek(0)
+        data = np.load(out)
+        assert_equal(data['c.e'].dtype, np.float64)
+        assert_equal(list(data['c.e']), [s['c']['e'] for s in expected])
+        assert_equal(list(data['g.1']), [s['g'][1] for s in expected])
+
+
+def test_column_order():
+    # the vectorized columns are in the order of the serial ones
+    doc = '{"z": <1, 2>, "b": {"y": 3, "a": [<4, 5>, 6]}, "m": "s"}'
+    outputs = []
+    for vectorized in [False, True]:
+        out = StringIO()
+        genson.dump_samples(genson.loads(doc), out, format='csv',
+                            vectorized=vectorized)
+        outputs.append(out.getvalue())
+    assert_equal(outputs[0], outputs[1])
+    assert_equal(outputs[0].splitlines()[0], 'b.a.0,b.a.1,b.y,m,z')
+
+
+def test_missing_keys():
+    doc = '{"a": <1, 2, 3>, "b": choice([{"x": 1}, {"y": "s", "z": [2]}], ' \
+        'draws=3, random_seed=1)}'
+    expected = list(genson.loads(doc))
+    paths = []
+    for s in expected:
+        for path in flatten_sample(s):
+            if column_name(path) not in paths:
+                paths.append(column_name(path))
+
+    for vectorized in [False, True]:
+        out = StringIO()
+        genson.dump_samples(genson.loads(doc), out, format='csv',
+                            chunk_size=2, vectorized=vectorized)
+        rows = list(csv.reader(StringIO(out.getvalue())))
+        assert_equal(rows[0], paths)
+        for row, s in zip(rows[1:], expected):
+            assert_equal(row[paths.index('b.x')],
+                         str(s['b'].get('x', '')))
+
+        out = StringIO()
+        genson.dump_samples(genson.loads(doc), out, format='npz',
+                            chunk_size=2, vectorized=vectorized)
+        out.seek(0)
+        data = np.load(out, allow_pickle=True)
+        assert_equal(sorted(data.keys()), sorted(paths))
+        assert_equal(list(data['b.y']),
+                     [s['b'].get('y') for s in expected])
+
+
+def test_unknown_format():
+    assert_raises(ValueError, genson.dump_samples, [], StringIO(), 'xml')
+
+
+def test_list_values():
+    doc = ('{"a": choice([[1, 2], [3]], draws=3, random_seed=2), '
+           '"b": <["x", [4]], ["y", [5]]>}')
+    for format in ['ndjson', 'csv']:
+        outputs = []
+        for vectorized in [False, True]:
+            out = StringIO()
+            genson.dump_samples(genson.loads(doc), out, format=format,
+                                chunk_size=4, vectorized=vectorized)
+            outputs.append(out.getvalue())
+        if format == 'ndjson':
+            assert_equal([json.loads(line) for line in outputs[1].splitlines()],
+                         list(genson.loads(doc)))
+        else:
+            assert_equal(outputs[1], outputs[0])
@@ -1,37 +1,113 @@
+from StringIO import StringIO
+from nose.tools import assert_equal, assert_raises
 import genson
+from genson.functions import ParameterGenerator
+from genson.internal_ops import GenSONOperand
+
+gson = """
+      {
+          "test0": 4,
+          "test1" : <0,1,2>,
+          "test2" : { "nested": gaussian(0,1,draws=1) },
+          "test3" : <"a", "b", uniform(0,1)>,
+          ("test4", "test5") : (0, 1),
+          ("test6", "test7") : 1,
+          ("test8","test9") : <("d", "e"), ("f", "g")>,
+          "testA": {"another_nested" : root.test5,
+                    "parent_test" : parent.test5},
+          "testB": this.test5,
+          "testC": this.test2.nested,
+          "test_with_underscores": 4,
+          "testD": this.test_with_underscores,
+          "testE": sin(4),
+          "testF": sin(this.testE),
+          "testG": 10,
+          "testExpr": 2.2*this.testG + (10 / sin(this.testA.another_nested)),
+          "testZ": 10
+      }
+      """
+
+
+def assert_round_trip(doc, backend='pyparsing'):
+    # seeding before loading also seeds the generators nested in values
+    genson.set_global_seed(0)
+    gen = genson.loads(doc, backend=backend)
+    expected = list(gen)
+    for pretty_print in (False, True):
+        text = genson.dumps(gen, pretty_print)
+        copy = genson.loads(text, backend=backend)
+        assert_equal(genson.dumps(copy, pretty_print), text)
+        assert_equal(list(copy), expected)
+    genson.set_global_seed(None)
+
 
 def test_dumps():
-    gson = """
-          {
-              "test0": 4,
-              "test1" : <0,1,2>,
-              "test2" : { "nested": gaussian(0,1,draws=1) },
-              "test3" : <"a", "b", uniform(0,1)>,
-              ("test4", "test5") : (0, 1),
-              ("test6", "test7") : 1,
-              ("test8","test9") : <("d", "e"), ("f", "g")>,
-              "testA": {"another_nested" : root.test5,
-                        "parent_test" : parent.test5},
-              "testB": this.test5,
-              "testC": this.test2.nested,
-              "test_with_underscores": 4,
-              "testD": this.test_with_underscores,
-              "testE": sin(4),
-              "testF": sin(this.testE),
-              "testG": 10,
-              "testExpr": 2.2*this.testG + (10 / sin(this.testA.another_nested)),
-              "testZ": 10
-          }
-          """
-    
     gen = genson.loads(gson)
-    
-    print genson.dumps(gen)
-    print genson.dumps(gen, pretty_print=True)
-    
-    # TODO: obviously, more needed here
+    text = genson.dumps(gen)
+    assert_equal(genson.dumps(genson.loads(text)), text)
+    assert_round_trip(gson)
+    assert_round_trip(gson, backend='recursive')
+
+
+def test_values():
+    assert_round_trip('{"s": "x y", "l": [1, "a", [2.5, 3]], "n": null, '
+                      '"t": true, "f": false, "e": {}, "p": (1), '
+                      '"x": 1e-07, "y": 0.1, "g": grid(1, 2, draws=1), '
+                      '"c": choice([1, "a"], random_seed=2)}')
+    assert_equal(genson.dumps({"a": [1, (2, "b")], "c": None}),
+                 '{"a" : [1,(2,"b")],"c" : null}')
+
+
+def test_precedence():
+    doc = ('{"a": <1, 2>, "b": (this.a - 1) - (2 - this.a), '
+           '"c": 2 / (this.a * 3) * this.a, "d": - (this.a + 1) ^ 2, '
+           '"e": (- this.a) ^ (2 ^ this.a), "f": this.a ^ 2 ^ 3, '
+           '"g": this.a - (- this.a), "h": + (- this.a), '
+           '"i": (0 - 2) ^ this.a, "j": (this.a - 3) * (0 - 2.5) ^ 2}')
+    assert_round_trip(doc)
+    assert_round_trip(doc, backend='recursive')
+    assert_equal(genson.dumps(genson.loads('{"a": 1, "b": (this.a + 2) * 3}')),
+                 '{"a" : 1,"b" : (this.a + 2) * 3}')
+
+
+def test_dump():
+    gen = genson.loads(gson)
+    for pretty_print in (False, True):
+        out = StringIO()
+        genson.dump(gen, out, pretty_print)
+        assert_equal(out.getvalue(), genson.dumps(gen, pretty_print))
+
+
+def test_unwritable():
+    assert_raises(ValueError, genson.dumps, {"a": 'say "hi"'})
+    assert_raises(ValueError, genson.dumps, {"a": float('nan')})
+
+
+class ConstantGenerator(ParameterGenerator):
+    # only written with __genson_repr__, as generators defined outside
+    # genson were before __genson_write__
+    def __genson_eval__(self, context):
+        return 1
+
+    def __genson_repr__(self, pretty_print=False, depth=0):
+        return 'constant()'
+
+
+def test_repr_generator():
+    assert_equal(genson.dumps({"a": ConstantGenerator(), "b": [2]}),
+                 '{"a" : constant(),"b" : [2]}')
+    assert_raises(TypeError, genson.to_bytes, {"a": ConstantGenerator()})
+
+
+class NamedOperand(GenSONOperand):
+    def __genson_eval__(self, context):
+        return 2
+
+    def __str__(self):
+        return 'named()'
 
-if __name__ == "__main__":
-    
-    test_dumps()
 
+def test_str_operand():
+    assert_equal(genson.dumps({"a": NamedOperand(), "b": 1 + NamedOperand()}),
+                 '{"a" : named(),"b" : 1 + named()}')
+    assert_equal(NamedOperand().__genson_repr__(), 'named()')
@@ -0,0 +1,66 @@
+from nose.tools import assert_equal, assert_raises, assert_not_equal
+import numpy as np
+import genson
+
+calls = []
+
+
+def slow_square(x):
+    calls.append(x)
+    return x * x
+
+
+def test_cached_function():
+    genson.register_function('slow_square', slow_square, cache_size=2)
+    del calls[:]
+    gen = genson.loads('{"x": <1, 2>, "y": <1, 2, 3>, '
+                       '"z": slow_square(this.x)}')
+    assert_equal([s["z"] for s in gen], [1, 4, 1, 4, 1, 4])
+    assert_equal(calls, [1, 2])
+    assert_equal(genson.function_cache_info('slow_square'),
+                 {'hits': 4, 'misses': 2, 'cache_size': 2, 'size': 2})
+
+
+def test_lru_eviction():
+    genson.register_function('slow_square', slow_square, cache_size=2)
+    del calls[:]
+    gen = genson.loads('{"x": <1, 2, 1, 3, 2, 1>, "z": slow_square(this.x)}')
+    list(gen)
+    assert_equal(calls, [1, 2, 3, 2, 1])
+
+
+def test_cache_keys():
+    genson.register_function('record', lambda x: calls.append(x),
+                             cache_size=10)
+    del calls[:]
+    record = genson.registry['record']
+    for x in [1, 1.0, True, np.float64(1), np.arange(3), np.arange(3.0),
+              [1, 2], (1, 2), np.arange(3)]:
+        genson.resolve(record(x), [])
+    assert_equal(len(calls), 8)
+
+
+def test_impure_function():
+    state = [0]
+
+    def tick():
+        state[0] += 1
+        return state[0]
+
+    genson.register_function('tick', tick, pure=False)
+    gen = genson.loads('{"a": tick() + 1, "b": tick() + 1, "c": <1, 2>}',
+                       incremental=True)
+    assert_equal(list(gen), [{"a": 2, "b": 3, "c": 1},
+                             {"a": 4, "b": 5, "c": 2}])
+    assert_raises(ValueError, genson.register_function, 'tick', tick,
+                  pure=False, cache_size=10)
+
+
+def test_reregistered_function():
+    genson.register_function('slow_square', slow_square)
+    list(genson.loads('{"x": <1, 2>, "z": slow_square(this.x)}'))
+    genson.register_function('slow_square', slow_square, cache_size=10)
+    gen = genson.loads('{"x": <1, 2>, "z": slow_square(this.x)}')
+    list(gen)
+    list(gen)
+    assert_equal(genson.function_cache_info('slow_square')['hits'], 2)
@@ -0,0 +1,47 @@
+import copy
+import cPickle as pickle
+from nose.tools import assert_equal, assert_true, assert_false, \
+    assert_raises
+import genson
+
+gson = """
+{
+    "a": <1, 2, 3>,
+    "config": { "layers": [64, 64], "name": "net", "opts": {"x": [1, 2]} },
+    "b": { "c": <"p", "q">, "d": parent.a * 10, "e": {"f": parent.c} },
+    "g": gaussian(0, 1, random_seed=3),
+    "h": this.b.d + this.g,
+    "i": this.j,
+    "j": <true, false>
+}
+"""
+
+
+def test_matches_full_evaluation():
+    expected = list(genson.loads(gson))
+    gen = genson.loads(gson, incremental=True)
+    assert_equal(list(gen), expected)
+    assert_equal(list(gen), expected)
+    assert_equal([gen[i] for i in [5, 0, 11, 3]],
+                 [expected[i] for i in [5, 0, 11, 3]])
+
+
+def test_mutation():
+    expected = list(genson.loads(gson))
+    gen = genson.loads(gson, incremental=True)
+    first = gen.next()
+    # member values are shared and read-only, the dicts of frames are new
+    assert_raises(TypeError, first['config']['layers'].append, 128)
+    assert_raises(TypeError, first['config']['opts'].__setitem__, 'x', 0)
+    first['b']['e']['f'] = 'r'
+    del first['i']
+    second = gen.next()
+    assert_equal(second, expected[1])
+    assert_true(first['config'] is second['config'])
+    assert_false(first['b'] is second['b'])
+    assert_equal((first['b']['d'], second['b']['d']), (10, 20))
+
+    copied = copy.deepcopy(second)
+    copied['config']['layers'].append(128)
+    assert_equal(type(copied['config']), dict)
+    assert_equal(pickle.loads(pickle.dumps(second, 2)), second)
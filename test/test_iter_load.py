@@ -0,0 +1,42 @@
+from nose.tools import assert_equal, assert_raises
+from StringIO import StringIO
+import genson
+
+docs = [
+    '{"a": <1, 2>}',
+    '{"b": "a } string with \\" brackets ]", "c": [1, (2, 3)]}',
+    '// a comment with a }\n{"d": 1 /* and ] another */}',
+    '[1, {"e": gaussian(0, 1, random_seed=1)}]',
+    '{"f": """"}',
+]
+
+
+def check_split(separator, chunk_size):
+    stream = StringIO(separator.join(docs))
+    texts = list(genson.split_documents(stream, chunk_size))
+    assert_equal(len(texts), len(docs))
+    assert_equal(texts[1], docs[1])
+    assert_equal(texts[2], docs[2].split('\n')[1])
+
+
+def test_split():
+    for separator in ['', '\n', ' \n\n ']:
+        for chunk_size in [1, 2, 7, 65536]:
+            yield check_split, separator, chunk_size
+
+
+def test_iter_load():
+    gens = list(genson.iter_load(StringIO('\n'.join(docs)), chunk_size=3))
+    for doc, gen in zip(docs, gens):
+        assert_equal(list(gen), list(genson.loads(doc)))
+
+
+def test_load_reads_whole_file():
+    assert_equal(list(genson.load(StringIO('{"a":\n<1,\n2>}'))),
+                 [{'a': 1}, {'a': 2}])
+
+
+def test_malformed_streams():
+    for stream in ['{"a": 1', '{"a": 1} 5 {"b": 2}', '{"a": "}']:
+        assert_raises(ValueError, list,
+                      genson.split_documents(StringIO(stream), 4))
@@ -0,0 +1,32 @@
+import sys
+import subprocess
+from nose.tools import assert_equal
+
+
+def run(code):
+    script = "import sys\n" + code + \
+        "\nprint ' '.join(sorted(m for m in " \
+        "('multiprocessing', 'numpy', 'pyparsing') if m in sys.modules))"
+    return subprocess.check_output([sys.executable, '-c', script]).strip()
+
+
+def test_import_is_lazy():
+    assert_equal(run("import genson\n"
+                     "genson.dumps({'a': 1})"), '')
+
+
+def test_parallel_iter():
+    assert_equal(run("import genson\n"
+                     "list(genson.parallel_iter('{\"a\": <1, 2>}', "
+                     "workers=1))"), 'multiprocessing pyparsing')
+
+
+def test_loaded_on_first_use():
+    assert_equal(run("import genson\n"
+                     "g = genson.loads('{\"a\": <1, 2>}', backend='recursive')\n"
+                     "list(g)"), '')
+    assert_equal(run("import genson\n"
+                     "list(genson.loads('{\"a\": <1, 2>}'))"), 'pyparsing')
+    assert_equal(run("import genson\n"
+                     "list(genson.loads('{\"a\": uniform(0, 1)}', "
+                     "backend='recursive'))"), 'numpy')
@@ -0,0 +1,28 @@
+from nose.tools import assert_equal, assert_false
+import cPickle as pickle
+import genson
+from genson.util import walk
+
+
+def test_operators():
+    gen = genson.loads('{"a": <2, 3>, "b": this.a ^ 2, "c": 2 ^ this.a, '
+                       '"d": -this.a * 3 - 1, "e": +this.a / 2}')
+    assert_equal(list(gen), [{"a": 2, "b": 4, "c": 4, "d": -7, "e": 1},
+                             {"a": 3, "b": 9, "c": 8, "d": -10, "e": 1}])
+
+
+def test_compact_nodes():
+    tree = genson.GENSONParser().parse_string(
+        '{"a": uniform(0, 1), "b": sin(this.a) * 2 + -this.a, '
+        '"c": <1, 2>, "d": choice([1, 2]), "e": gaussian(0, 1)}')
+    nodes = [n for n in walk(tree) if hasattr(n, '__genson_eval__')]
+    assert_equal(len(nodes), 10)
+    for node in nodes:
+        assert_false(hasattr(node, '__dict__'))
+
+
+def test_pickle():
+    gen = genson.loads('{"a": uniform(0, 1, random_seed=1), '
+                       '"b": this.a ^ 2 + cos(this.a)}')
+    copy = pickle.loads(pickle.dumps(gen, pickle.HIGHEST_PROTOCOL))
+    assert_equal(list(copy), list(gen))
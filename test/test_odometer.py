@@ -0,0 +1,41 @@
+from nose.tools import assert_equal
+import genson
+
+
+def test_many_generators():
+    # one generator per member, more than the recursion limit
+    doc = "{%s}" % ", ".join('"k%d": <%d>' % (i, i) for i in range(2000))
+    gen = genson.loads(doc)
+    samples = list(gen)
+    assert_equal(len(samples), 1)
+    assert_equal(samples[0]["k1999"], 1999)
+
+
+def test_total_count():
+    doc = "{%s}" % ", ".join('"k%d": <%s>' % (i, ", ".join(map(str, range(10))))
+                             for i in range(30))
+    gen = genson.loads(doc)
+    assert_equal(gen.total_count(), 10 ** 30)
+    gen.seek(10 ** 30 - 1)
+    assert_equal(gen.next()["k29"], 9)
+
+
+def test_rewound_streams():
+    gen = genson.loads('{"a": uniform(0, 1, draws=3, random_seed=7), '
+                       '"b": <1, 2, 3>}')
+    samples = list(gen)
+    assert_equal([s["a"] for s in samples[:3]], [s["a"] for s in samples[3:6]])
+    assert_equal(list(gen), samples)
+
+    genson.set_global_seed(5)
+    try:
+        gen = genson.loads('{"a": gaussian(0, 1, draws=2), "b": <1, 2>}')
+        first = [s["a"] for s in gen]
+        genson.set_global_seed(6)
+        gen.reset()
+        second = [s["a"] for s in gen]
+        assert_equal(first[:2], first[2:])
+        assert_equal(second[:2], second[2:])
+        assert_equal(first[0] != second[0], True)
+    finally:
+        genson.set_global_seed(None)
@@ -0,0 +1,40 @@
+from nose.tools import assert_equal, assert_true, assert_not_equal
+import math
+import genson
+from genson.plan import Constant
+
+calls = []
+
+
+def traced(x):
+    calls.append(x)
+    return x * 2
+
+genson.register_function('traced', traced)
+
+
+def test_constant_folding():
+    gen = genson.loads('{"a": 2 * sin(0.5) + traced(3), "b": <1, 2>}')
+    del calls[:]
+    step = dict((key, step) for frame, key, splat, step in gen.plan.steps)
+    assert_true(isinstance(step['a'], Constant))
+    assert_equal(list(gen), [{"a": 2 * math.sin(0.5) + 6, "b": 1},
+                             {"a": 2 * math.sin(0.5) + 6, "b": 2}])
+    assert_equal(calls, [])
+    assert_true('sin(0.5)' in genson.dumps(gen))
+
+
+def test_common_subexpressions():
+    gen = genson.loads('{"x": <1, 2>, "a": traced(this.x) + 1, '
+                       '"b": {"c": traced(root.x) * traced(parent.x)}, '
+                       '"d": traced(this.a)}')
+    del calls[:]
+    assert_equal(list(gen), [{"x": 1, "a": 3, "b": {"c": 4}, "d": 6},
+                             {"x": 2, "a": 5, "b": {"c": 16}, "d": 10}])
+    assert_equal(calls, [1, 3, 2, 5])
+
+
+def test_random_generators_untouched():
+    gen = genson.loads('{"a": gaussian(0, 1) * 2, "b": gaussian(0, 1) * 2}')
+    sample = gen.next()
+    assert_not_equal(sample['a'], sample['b'])
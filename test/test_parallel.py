@@ -0,0 +1,21 @@
+from nose.tools import assert_equal
+import genson
+
+gson = """
+{
+    "a": <1, 2, 3>,
+    "b": gaussian(0, 1, draws=20, random_seed=42),
+    "c": { "e": uniform(0, 1, draws=3), "d": 2 * sin(parent.a) + this.e }
+}
+"""
+
+
+def test_parallel_matches_serial():
+    genson.set_global_seed(7)
+    try:
+        serial = list(genson.loads(gson))
+        assert_equal(list(genson.parallel_iter(gson, workers=3)), serial)
+        assert_equal(list(genson.parallel_iter(genson.loads(gson), workers=2,
+                                               chunk_size=7)), serial)
+    finally:
+        genson.set_global_seed(None)
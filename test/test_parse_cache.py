@@ -0,0 +1,76 @@
+from nose.tools import assert_equal, assert_not_equal
+import shutil
+import tempfile
+import genson
+from genson import functions
+
+gson = """
+{
+    "a": <1, 2, 3>,
+    "b": gaussian(0, 1, draws=2),
+    "c": [uniform(0, 1), sin(this.a)],
+    "d": 2 * sin(this.a)
+}
+"""
+
+
+def with_cache(cache, f):
+    old = genson.get_parse_cache()
+    genson.set_parse_cache(cache)
+    try:
+        return f()
+    finally:
+        genson.set_parse_cache(old)
+
+
+def test_memory_cache():
+    cache = genson.ParseCache(max_size=1)
+
+    def run():
+        genson.set_global_seed(42)
+        try:
+            first = list(genson.loads(gson))
+            second = genson.loads(gson)
+            assert_equal(cache.hits, 1)
+            assert_equal(list(second), first)
+
+            genson.set_global_seed(1)
+            assert_not_equal(list(genson.loads(gson)), first)
+        finally:
+            genson.set_global_seed(None)
+
+        genson.loads('{"other": 1}')
+        assert_equal(cache.entries.keys(), [cache.key('{"other": 1}')])
+
+    with_cache(cache, run)
+
+
+def test_disk_cache():
+    cache_dir = tempfile.mkdtemp()
+    try:
+        genson.set_global_seed(3)
+        first = with_cache(genson.ParseCache(cache_dir=cache_dir),
+                           lambda: list(genson.loads(gson)))
+
+        cache = genson.ParseCache(cache_dir=cache_dir)
+        second = with_cache(cache, lambda: list(genson.loads(gson)))
+        assert_equal(cache.disk_hits, 1)
+        assert_equal(second, first)
+    finally:
+        genson.set_global_seed(None)
+        shutil.rmtree(cache_dir)
+
+
+def test_uncacheable_function():
+    genson.register_function('add_one', lambda x: x + 1)
+    try:
+        cache = genson.ParseCache()
+        doc = '{"a": add_one(1)}'
+        results = with_cache(cache, lambda: [list(genson.loads(doc))
+                                             for _ in range(2)])
+        assert_equal(results, [[{'a': 2}], [{'a': 2}]])
+        assert_equal(cache.hits, 0)
+    finally:
+        # registered functions are global
+        del functions.registry['add_one']
+        del functions.registered_functions['add_one']
@@ -0,0 +1,112 @@
+from nose.tools import assert_equal, assert_raises
+from pyparsing import ParseResults
+import genson
+from genson import GENSONParser
+from genson.util import isdict, istuple, isiterable
+
+backends = ['pyparsing', 'recursive']
+
+valid_docs = [
+    '{}',
+    '[]',
+    '[1, 2.5, -3, 0, 1e5, 2.5E-3, "a", true, false, null]',
+    '(1, "b", [2, 3])',
+    '{"a": 1, "b": {"c": [1, {"d": null}]}, "e": ([1], 2)}',
+    '{"a": 1, "a": 2, "b": 3}',
+    '{ ("a", "b"): (0, 1), ("c", ("d", "e")): <(1, 2), (3, 4)> }',
+    '{"a": <1, 2, "x", [3]>, "b": grid(1, 2, draws=1)}',
+    '{"a": gaussian(0, 1, draws=3, random_seed=42), '
+    ' "b": uniform(this.a, 1), "c": choice([1, 2], draws=2)}',
+    '{"a": gaussian(0, 1, ), "b": gaussian(0, 1, draws=2)}',
+    '{"a": 1, "b": {"c": parent.a, "d": root.a, "e": this.c, '
+    ' "f": root.b.c, "g": this.parent.a}}',
+    '{"a": 1 + 2 * 3, "b": 8 / 2 * 2, "c": 5 - 1 + 1, "d": 2 ^ 3 ^ 2, '
+    ' "e": 1 * 2 * 3, "f": 10 - 1 - 2 - 3, "g": 2 * (3 + 4), "h": (4)}',
+    '{"a": -4, "b": - 4, "c": +4, "d": +-4, "e": 3 - -4, "f": -(2 + 1)}',
+    '{"a": 2, "b": -this.a, "c": 2.2 * sin(this.a) + (10 / cos(this.b)), '
+    ' "d": this.a ^ 2, "e": this.a * 3 * 2}',
+    """
+    // a comment
+    {
+        /* a block
+           comment */
+        "a" : 1, // trailing
+        "b" /* inline */ : [ 1 , 2 ]
+    }
+    """,
+    '{"a": "with \\"escapes\\" and ""quotes"""}',
+    '{"a": 1} trailing text is ignored',
+]
+
+invalid_docs = [
+    '',
+    '4',
+    '{ 4, "a": 5 }',
+    '{ "a" :, "b": 5 }',
+    '{ "a": 17 "b": 5 }',
+    '{ "a": 4, }',
+    '{ "a": [1, 2,] }',
+    '{ "a": -+4 }',
+    '{ "a": this }',
+    '{ "a": f2(1) }',
+    '{ "a": [1 + 2] }',
+    '{ "a": () }',
+    '{ "a": <> }',
+]
+
+
+def signature(x):
+    """ A comparable structure for a parsed document """
+    if isinstance(x, ParseResults):
+        x = x.asList()
+
+    if hasattr(x, '__genson_eval__'):
+        names = set(getattr(x, '__dict__', {}))
+        for cls in type(x).__mro__:
+            names.update(cls.__dict__.get('__slots__', ()))
+        attrs = sorted((k, signature(getattr(x, k))) for k in names
+                       if k not in ('random', 'fun') and hasattr(x, k))
+        return (x.__class__.__name__, attrs)
+    elif isdict(x):
+        return ('dict', [(signature(k), signature(v)) for k, v in x.items()])
+    elif istuple(x):
+        return ('tuple', [signature(v) for v in x])
+    elif isiterable(x):
+        return ('list', [signature(v) for v in x])
+    else:
+        return (type(x).__name__, x)
+
+
+def check_conforms(doc):
+    pyparsing_tree, recursive_tree = \
+        [GENSONParser(backend).parse_string(doc) for backend in backends]
+    assert_equal(signature(recursive_tree), signature(pyparsing_tree))
+
+
+def check_rejects(backend, doc):
+    assert_raises(Exception, GENSONParser(backend).parse_string, doc)
+
+
+def test_conformance():
+    for doc in valid_docs:
+        yield check_conforms, doc
+
+
+def test_rejects():
+    for doc in invalid_docs:
+        for backend in backends:
+            yield check_rejects, backend, doc
+
+
+def test_expression_values():
+    for backend in backends:
+        gen = genson.loads(valid_docs[11], backend=backend)
+        assert_equal(gen.next(), {'a': 7, 'b': 2, 'c': 3, 'd': 512,
+                                  'e': 6, 'f': 4, 'g': 14, 'h': (4,)})
+        gen = genson.loads(valid_docs[12], backend=backend)
+        assert_equal(gen.next(), {'a': -4, 'b': -4, 'c': 4, 'd': -4,
+                                  'e': 7, 'f': -3})
+
+
+def test_unknown_backend():
+    assert_raises(ValueError, GENSONParser, 'yacc')
@@ -0,0 +1,53 @@
+from nose.tools import assert_equal, assert_true
+import genson
+from genson.util import resolve
+
+docs = [
+    """
+    {
+        "const": {"nested": [1, 2, {"deep": "x"}], "t": (1, 2)},
+        "a": <1, 2, 3>,
+        "b": gaussian(0, 1, draws=2, random_seed=42),
+        ("c", "d"): <(4, [5]), ({"e": 6}, 7)>,
+        ("f", "g"): [8],
+        "h": {"ref": root.a, "parent_ref": parent.c, "this_ref": this.ref},
+        "i": 2.2 * sin(this.a) + this.b,
+        "j": [uniform(0, 1, random_seed=3), {"k": parent.a}]
+    }
+    """,
+    """
+    [
+        {"b": grid(1, 2),
+         "c": choice([6, 7, 8], draws=3, random_seed=42)},
+        (1, 2)
+    ]
+    """,
+]
+
+
+def resolve_all(gen):
+    results = [resolve(gen.genson_dict)]
+    while gen.advance_generator_stack():
+        results.append(resolve(gen.genson_dict))
+    return results
+
+
+def test_plan_matches_resolve():
+    for doc in docs:
+        yield assert_equal, list(genson.loads(doc)), \
+            resolve_all(genson.loads(doc))
+
+
+def test_plan_slots():
+    gen = genson.loads(docs[0])
+    assert_equal(gen.plan.generator_slots, gen.generators)
+    assert_equal(len(gen.plan.reference_slots), 4)
+
+
+def test_constants_not_aliased():
+    gen = genson.loads('{"a": <1, 2>, "b": {"c": [1, 2]}, "d": (1, 2)}')
+    first = gen.next()
+    first['b']['c'].append(3)
+    second = gen.next()
+    assert_equal(second['b'], {'c': [1, 2]})
+    assert_true(first['d'] is second['d'])
@@ -0,0 +1,74 @@
+from nose.tools import assert_equal, assert_true
+import time
+import cPickle as pickle
+import genson
+from genson.profiling import TimedStep
+
+
+def slow(x):
+    time.sleep(0.002)
+    return x
+
+genson.register_function('slow', slow)
+
+doc = ('{"x": uniform(0, 1, random_seed=1), "y": <1, 2, 3>, '
+       '"m": {"fast": root.y + 1, "slow": slow(root.y) * 2}}')
+
+
+def test_report():
+    gen = genson.loads(doc, profile=True)
+    samples = list(gen)
+    report = gen.profile.report()
+
+    assert_equal(report['samples'], 3)
+    assert_true(report['parse_seconds'] >= 0)
+    assert_equal([m['path'] for m in report['members']][0], 'm.slow')
+    assert_equal(dict((m['path'], m['calls']) for m in report['members']),
+                 {'x': 3, 'y': 3, 'm.fast': 3, 'm.slow': 3})
+    assert_equal(report['draws'], {'x': 3})
+    assert_true('m.slow' in gen.profile.format_report())
+    assert_equal(samples, list(genson.loads(doc)))
+
+
+def test_incremental():
+    gen = genson.loads(doc, incremental=True)
+    profile = gen.enable_profiling()
+    list(gen)
+    calls = dict((m['path'], m['calls']) for m in profile.report()['members'])
+    assert_equal(calls, {'x': 3, 'y': 3, 'm.fast': 3, 'm.slow': 3})
+
+    gen = genson.loads('{"a": <1, 2>, "b": {"c": 5, "d": [this.c]}}',
+                       incremental=True, profile=True)
+    list(gen)
+    calls = dict((m['path'], m['calls'])
+                 for m in gen.profile.report()['members'])
+    assert_equal(calls, {'a': 2, 'b.c': 1, 'b.d': 1})
+
+
+def test_disabled():
+    gen = genson.loads(doc)
+    assert_equal(gen.profile, None)
+    assert_true(not any(isinstance(step, TimedStep)
+                        for frame, key, splat, step in gen.plan.steps))
+
+
+def test_pickle():
+    gen = genson.loads(doc, profile=True)
+    gen.next()
+    copy = pickle.loads(pickle.dumps(gen, pickle.HIGHEST_PROTOCOL))
+    list(copy)
+    assert_equal(copy.profile.report()['samples'], 3)
+
+
+def test_counter_mode():
+    # generators that wrap around are reset while their streams are wrapped
+    genson.set_rng_mode('counter')
+    try:
+        doc = '{"a": uniform(0, 1, draws=2, random_seed=3), "b": <1, 2>}'
+        gen = genson.loads(doc, profile=True)
+        samples = list(gen)
+        assert_equal(samples, list(genson.loads(doc)))
+        assert_equal(gen.profile.report()['draws'], {'a': 4})
+        assert_equal(list(gen), samples)
+    finally:
+        genson.set_rng_mode('legacy')
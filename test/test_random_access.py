@@ -0,0 +1,45 @@
+from nose.tools import assert_equal, assert_raises
+import genson
+
+gson = """
+{
+    "a": <1, 2, 3>,
+    "b": gaussian(0, 1, draws=4, random_seed=42),
+    "c": { "d": choice([5, 6, 7], draws=2, random_seed=1) },
+    "e": uniform(0, this.a, draws=3, random_seed=7)
+}
+"""
+
+
+def test_len():
+    assert_equal(len(genson.loads(gson)), 3 * 4 * 2 * 3)
+    assert_equal(len(genson.loads('{"a": 1}')), 1)
+
+
+def test_sample_at_matches_iteration():
+    serial = list(genson.loads(gson))
+    gen = genson.loads(gson)
+    for i in [17, 0, 71, 5, 36, 35, 2]:
+        assert_equal(gen[i], serial[i])
+    assert_equal(gen[-1], serial[-1])
+    assert_equal(gen[10:20:3], serial[10:20:3])
+
+
+def test_resume_after_seek():
+    serial = list(genson.loads(gson))
+    gen = genson.loads(gson)
+    gen.seek(50)
+    assert_equal(list(gen), serial[50:])
+
+
+def test_out_of_range():
+    gen = genson.loads(gson)
+    assert_raises(IndexError, gen.sample_at, 72)
+    assert_raises(IndexError, gen.sample_at, -73)
+
+
+def test_reset_restarts():
+    gen = genson.loads(gson)
+    first = [gen.next() for _ in range(5)]
+    gen.reset()
+    assert_equal([gen.next() for _ in range(5)], first)
@@ -0,0 +1,66 @@
+from nose.tools import assert_equal, assert_raises
+import genson
+from genson import GenSONReferenceError
+
+gson = """
+{
+    "a": 1,
+    ("b", "c"): (2, {"x": 3}),
+    "d": {
+        "e": parent.a,
+        "f": root.c.x,
+        "g": this.e,
+        "h": this.parent.b,
+        "i": { "j": parent.parent.a + parent.e, "k": [1, parent.e] },
+        "l": this.i.parent.e
+    },
+    "m": <{"n": 4}, {"n": 5}>,
+    "o": this.m.n,
+    "p": [{"q": root.a, "r": this.q}]
+}
+"""
+
+
+def test_resolution():
+    samples = list(genson.loads(gson))
+    assert_equal(len(samples), 2)
+    for s, n in zip(samples, [4, 5]):
+        assert_equal(s['d'], {"e": 1, "f": 3, "g": 1, "h": 2,
+                              "i": {"j": 2, "k": [1, 1]}, "l": 1})
+        assert_equal(s['o'], n)
+        assert_equal(s['p'], [{"q": 1, "r": 1}])
+
+
+def test_forward_references():
+    gen = genson.loads('{"a": this.b * 2, "b": this.c.d + 1, '
+                       '"c": {"d": <1, 2>, "e": root.a}, '
+                       '"f": uniform(this.g, this.g), "g": 3}')
+    assert_equal(list(gen),
+                 [{"a": 4, "b": 2, "c": {"d": 1, "e": 4}, "f": 3.0, "g": 3},
+                  {"a": 6, "b": 3, "c": {"d": 2, "e": 6}, "f": 3.0, "g": 3}])
+    assert_equal(gen.batch(2, as_dicts=True), list(gen))
+
+
+def test_cycles():
+    for doc in ['{"a": this.a}',
+                '{"a": this.b, "b": this.a}',
+                '{"a": this.b, "b": {"c": root.d}, "d": [this.a]}',
+                '{"a": {"b": root.a}}']:
+        assert_raises(GenSONReferenceError, genson.loads, doc)
+
+
+def test_static_errors():
+    for doc in ['{"a": this.c, "b": 1}',
+                '{"a": {"b": root.x}}',
+                '{"a": parent.b}',
+                '{"a": root.parent.b}',
+                '{"a": [1], "b": this.a.c}',
+                '{"a": {"c": 1}, "b": this.a.d}',
+                '{"a": 1, "b": this.parent}',
+                '{"a": [{"b": this.c, "c": 1}]}']:
+        assert_raises(GenSONReferenceError, genson.loads, doc)
+
+
+def test_dynamic_errors():
+    gen = genson.loads('{"a": <1, {"c": 2}>, "b": this.a.c}')
+    assert_raises(GenSONReferenceError, gen.next)
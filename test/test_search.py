@@ -0,0 +1,79 @@
+from nose.tools import assert_equal, assert_true, assert_raises
+import genson
+
+doc = ('{"x": uniform(0, 1), "y": <"a", "b", "c">, '
+       '"z": {"w": gaussian(0, 2), "v": this.w * 2}, "k": choice([1, 2])}')
+
+
+def test_ask():
+    search = genson.Search(genson.loads(doc), seed=0)
+    assert_equal(len(search.dimensions), 4)
+    for sample, coords in search.ask(5):
+        x, y, w, k = coords
+        assert_true(0 <= x <= 1)
+        assert_equal(sample, {"x": x, "y": "abc"[y],
+                              "z": {"w": w, "v": w * 2}, "k": [1, 2][k]})
+
+
+def test_model_search():
+    def loss(sample):
+        return (sample["x"] - 0.3) ** 2 + (sample["z"]["w"] - 1) ** 2 + \
+            (sample["y"] != "b")
+
+    best = {}
+    for sampler in ['model', 'random']:
+        search = genson.Search(genson.loads(doc), sampler=sampler, seed=1)
+        for _ in range(80):
+            [(sample, coords)] = search.ask()
+            search.tell(coords, loss(sample))
+        best[sampler] = search.best()[1]
+    assert_true(best['model'] < 0.02)
+    assert_true(best['model'] < best['random'])
+
+
+def test_successive_halving():
+    search = genson.Search(genson.loads('{"x": uniform(0, 1)}'),
+                           sampler='random', maximize=True, seed=2)
+    schedule = genson.SuccessiveHalving(search, 9, eta=3)
+    runs = []
+    while True:
+        trials = schedule.ask()
+        if not trials:
+            break
+        for sample, coords, budget in trials:
+            runs.append(budget)
+            schedule.tell(coords, sample["x"] * budget)
+
+    assert_equal(runs, [1] * 9 + [3] * 3 + [9])
+    assert_equal(len(search.history), 9)
+    # the survivor is told last, and is the sample with the largest x
+    survivor = search.history[-1]
+    assert_equal(search.best(), survivor)
+    assert_true(all(coords < survivor[0] for coords, score in
+                    search.history[:-1]))
+
+
+def test_repeated_coords():
+    # with only four configurations, samples must share coords
+    search = genson.Search(genson.loads('{"y": <"a", "b">, '
+                                        '"x": choice([1, 2])}'),
+                           sampler='random', seed=0)
+    schedule = genson.SuccessiveHalving(search, 9, eta=3)
+    rounds = []
+    while True:
+        trials = schedule.ask()
+        if not trials:
+            break
+        rounds.append(len(trials))
+        for sample, coords, budget in trials:
+            schedule.tell(coords, sample["x"])
+
+    assert_equal(rounds, [9, 3, 1])
+    assert_true(schedule.finished)
+    assert_equal(len(search.history), 9)
+    assert_raises(ValueError, schedule.tell, (0, 0), 1)
+
+
+def test_unsupported():
+    assert_raises(ValueError, genson.Search,
+                  genson.loads('{"a": <1, 2>, "b": uniform(0, this.a)}'))
@@ -0,0 +1,34 @@
+from nose.tools import assert_equal, assert_raises
+import genson
+
+gson = """
+{
+    "a": <1, 2, 3>,
+    "b": gaussian(0, 1, draws=5, random_seed=42),
+    "c": [<"x", "y">, uniform(0, 1, draws=2, random_seed=3)]
+}
+"""
+
+
+def test_contiguous_shards():
+    serial = list(genson.loads(gson))
+    for n in [1, 4, 7]:
+        gen = genson.loads(gson)
+        sharded = []
+        for k in range(n):
+            sharded.extend(gen.shard(k, n, strategy='contiguous'))
+        yield assert_equal, sharded, serial
+
+
+def test_strided_shards():
+    serial = list(genson.loads(gson))
+    for n in [1, 4, 7]:
+        for k in range(n):
+            shard = list(genson.loads(gson).shard(k, n))
+            yield assert_equal, shard, serial[k::n]
+
+
+def test_bad_shard():
+    gen = genson.loads(gson)
+    assert_raises(ValueError, list, gen.shard(3, 3))
+    assert_raises(ValueError, list, gen.shard(0, 3, strategy='spiral'))
@@ -0,0 +1,108 @@
+from nose.tools import assert_equal, assert_raises
+import os
+import shutil
+import tempfile
+import numpy as np
+import genson
+from genson.output import flatten_sample
+
+gson = """
+{
+    "a": <1, 2, 3>,
+    "b": <"x", "yy", "">,
+    "c": {"d": uniform(0, 1, random_seed=1), "e": <true, false>},
+    "f": [<1, 2.5>, <null, "z">],
+    "g": 10 * this.a
+}
+"""
+
+
+def in_temp_dir(f):
+    path = tempfile.mkdtemp()
+    try:
+        return f(os.path.join(path, 'samples.store'))
+    finally:
+        shutil.rmtree(path)
+
+
+def test_store():
+    def run(filename):
+        samples = list(genson.loads(gson))
+        genson.write_store(genson.loads(gson), filename, chunk_size=7)
+        store = genson.open_store(filename)
+
+        assert_equal(len(store), len(samples))
+        assert_equal([store[i] for i in xrange(len(store))], samples)
+        assert_equal(store[-1], samples[-1])
+        assert_equal(sorted(store.paths),
+                     sorted(flatten_sample(samples[0]).keys()))
+
+        d = store.column('c.d')
+        assert_equal(d.dtype, np.float64)
+        assert_equal(d.tolist(), [s["c"]["d"] for s in samples])
+        assert_equal(store.column(('f', 0)).dtype, np.float64)
+        assert_equal(store.column('b').tolist(), [s["b"] for s in samples])
+
+        for path, value in [('a', 2), ('g', 30), ('b', 'yy'), ('b', ''),
+                            ('c.e', False), (('f', 1), None), ('f.1', 'z'),
+                            ('f.0', 2.5)]:
+            column = store.column(path).tolist()
+            assert_equal(store.where(path, value).tolist(),
+                         [i for i, v in enumerate(column) if v == value])
+        assert_equal(store.where('a', 4).tolist(), [])
+        assert_equal(store.where('b', 1).tolist(), [])
+        assert_equal(store.between('c.d', 0.25, 0.5).tolist(),
+                     [i for i, v in enumerate(d) if 0.25 <= v < 0.5])
+    in_temp_dir(run)
+
+
+def test_vectorized():
+    def run(filename):
+        doc = '{"a": <1, 2, 3>, "b": gaussian(0, 1, random_seed=2)}'
+        genson.write_store(genson.loads(doc), filename, chunk_size=2,
+                           vectorized=True)
+        store = genson.open_store(filename)
+        assert_equal([store[i] for i in xrange(len(store))],
+                     genson.loads(doc).batch(3, as_dicts=True))
+    in_temp_dir(run)
+
+
+def test_mismatched_paths():
+    def run(filename):
+        assert_raises(ValueError, genson.write_store,
+                      [{"a": 1}, {"a": 1, "b": 2}], filename)
+        assert_raises(ValueError, genson.open_store, __file__)
+    in_temp_dir(run)
+
+
+def test_structure():
+    def run(filename):
+        samples = [{"a": i, "e": {}, "l": [], "t": (i, "x"),
+                    "n": {"m": [[], {}, [3, ()]]}} for i in xrange(3)]
+        genson.write_store(samples, filename, chunk_size=2)
+        store = genson.open_store(filename)
+        assert_equal([store[i] for i in xrange(len(store))], samples)
+        assert_equal(type(store[0]["t"]), tuple)
+        assert_equal(type(store[1]["n"]["m"][2][1]), tuple)
+
+        doc = ('{"a": <1, 2>, "e": {}, "l": [], "n": {"m": [[], {}]}, '
+               '"c": choice([{"p": 1}, {"p": 2}], random_seed=4)}')
+        for vectorized in [False, True]:
+            genson.write_store(genson.loads(doc), filename, chunk_size=1,
+                               vectorized=vectorized)
+            store = genson.open_store(filename)
+            assert_equal([store[i] for i in xrange(len(store))],
+                         list(genson.loads(doc)))
+        assert_raises(ValueError, genson.write_store,
+                      [{"a": []}, {"a": {}}], filename)
+    in_temp_dir(run)
+
+
+def test_vectorized_lists():
+    def run(filename):
+        doc = '{"a": choice([[1, "x"], [2, "y"]], draws=3, random_seed=2)}'
+        genson.write_store(genson.loads(doc), filename, vectorized=True)
+        store = genson.open_store(filename)
+        assert_equal([store[i] for i in xrange(len(store))],
+                     list(genson.loads(doc)))
+    in_temp_dir(run)